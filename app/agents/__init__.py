@@ -1,5 +1,5 @@
 # from .handlers import register_exception_handlers
-from .manager import LLMManager
+from .manager import LLMManager, get_llm_manager
 from .providers.base import *
 from .providers.ollama import *
 from .providers.openrouter import *
@@ -0,0 +1,175 @@
+from __future__ import annotations
+import hashlib
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.core import settings
+
+# (kind, langue de réponse, partitions, signature du contexte récupéré)
+BucketKey = Tuple[str, str, Tuple[str, ...], str]
+
+
+def context_signature(search_results: Sequence[Dict[str, Any]]) -> str:
+    """
+    Signature des chunks envoyés au LLM : id + rev (collection de recherche) ou
+    hash du contenu (pages, sans rev). Un chunk ré-indexé change la signature.
+    """
+    parts = []
+    for r in search_results or []:
+        version = r.get("rev")
+        if version is None:
+            version = hashlib.md5(str(r.get("content") or "").encode("utf-8")).hexdigest()
+        parts.append(f"{r.get('id')}:{version}")
+    return hashlib.sha1("|".join(sorted(parts)).encode("utf-8")).hexdigest()
+
+
+def _unit(vector) -> np.ndarray:
+    vec = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+@dataclass
+class _Entry:
+    bucket: BucketKey
+    vector: np.ndarray
+    reply: str
+    doc_ids: Set[str]
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """
+    Cache des réponses LLM des questions sans historique. Une entrée est réutilisée si :
+    - même type (search / training), même langue, mêmes partitions
+    - même contexte récupéré (doc_id / rev des chunks, voir context_signature)
+    - similarité cosinus des embeddings de question >= threshold
+    invalidate_docs() supprime les entrées qui citent un document ré-indexé.
+    """
+    def __init__(self, max_entries: int = 2000, ttl_seconds: Optional[float] = 86400, threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: Dict[BucketKey, Set[int]] = {}
+        self._by_doc: Dict[str, Set[int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def bucket_key(kind: str, lang: str, partitions: Optional[Iterable[str]], search_results: Sequence[Dict[str, Any]]) -> BucketKey:
+        return (kind, lang or "", tuple(sorted(partitions or ())), context_signature(search_results))
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        bucket = self._buckets.get(entry.bucket)
+        if bucket is not None:
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._buckets[entry.bucket]
+        for doc_id in entry.doc_ids:
+            ids = self._by_doc.get(doc_id)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._by_doc[doc_id]
+
+    def lookup(self, bucket: BucketKey, vector) -> Optional[str]:
+        query = _unit(vector)
+        now = time.time()
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._buckets.get(bucket, ())):
+                entry = self._entries[entry_id]
+                if self.ttl_seconds and now - entry.created_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    continue
+                score = float(np.dot(entry.vector, query))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id].reply
+
+    def store(self, bucket: BucketKey, vector, reply: str, search_results: Sequence[Dict[str, Any]]) -> None:
+        doc_ids = {str(r["doc_id"]) for r in search_results or [] if r.get("doc_id")}
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = _Entry(bucket, _unit(vector), reply, doc_ids, time.time())
+            self._buckets.setdefault(bucket, set()).add(entry_id)
+            for doc_id in doc_ids:
+                self._by_doc.setdefault(doc_id, set()).add(entry_id)
+            self.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_docs(self, doc_ids: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for doc_id in doc_ids:
+                for entry_id in list(self._by_doc.get(str(doc_id), ())):
+                    self._remove(entry_id)
+                    removed += 1
+            self.invalidations += removed
+        return removed
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._by_doc.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "stores": self.stores,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_cache: Optional[SemanticAnswerCache] = None
+_cache_lock = threading.Lock()
+
+def get_answer_cache() -> SemanticAnswerCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticAnswerCache(
+                    max_entries=settings.answer_cache_max_entries,
+                    ttl_seconds=settings.answer_cache_ttl_seconds,
+                    threshold=settings.answer_cache_similarity,
+                )
+    return _cache
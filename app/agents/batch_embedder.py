@@ -0,0 +1,232 @@
+from __future__ import annotations
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from app.core import settings
+from app.agents.embedder import (
+    GCP_EMBED_MODEL,
+    OLLAMA_EMBED_MODEL,
+    embed_query_batch,
+    embed_query_batch_gemini,
+)
+from app.agents.embedding_store import EmbeddingStore
+from app.utils.tokens import _count_text_tokens
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Limite partagée des appels au fournisseur d'embeddings, commune à toutes les
+    ingestions concurrentes : nb max d'appels par minute (token bucket) et nb max
+    d'appels en cours. 0 = pas de limite.
+    """
+    def __init__(self, requests_per_minute: float = 0, max_in_flight: int = 0):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, self.rate)  # rafale d'au plus ~1s d'appels
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight > 0 else None
+
+    def _take(self) -> float:
+        """Prend un jeton si disponible, sinon renvoie le temps d'attente."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def __enter__(self):
+        if self.rate > 0:
+            while (wait := self._take()) > 0:
+                time.sleep(wait)
+        if self._in_flight is not None:
+            self._in_flight.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        if self._in_flight is not None:
+            self._in_flight.release()
+        return False
+
+
+@dataclass
+class EmbeddingBackend:
+    """Fournisseur d'embeddings + ses limites par requête (nb d'instances, tokens)."""
+    model: str
+    embed: Callable[[List[str], str], List[List[float]]]  # (textes, task_type) -> vecteurs
+    max_batch_size: int
+    max_batch_tokens: Optional[int] = None
+
+
+class IngestionEmbedder:
+    """
+    Embedding d'ingestion : regroupe tous les textes (chunks, titres) en lots
+    au format du fournisseur, les envoie en parallèle (concurrence bornée,
+    retry + backoff exponentiel) puis remet chaque vecteur à sa position.
+    Les textes identiques ne sont envoyés qu'une fois, et ceux déjà présents
+    dans le store d'embeddings (si configuré) ne sont pas envoyés du tout.
+    """
+    def __init__(
+        self,
+        backend: EmbeddingBackend,
+        *,
+        store: Optional[EmbeddingStore] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        concurrency: int = 4,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+    ):
+        self.backend = backend
+        self.store = store
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def pack(self, texts: Sequence[str]) -> List[List[int]]:
+        """Découpe les indices de `texts` en lots respectant max_batch_size et max_batch_tokens."""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        max_tokens = self.backend.max_batch_tokens
+        for i, text in enumerate(texts):
+            tokens = _count_text_tokens(text)
+            too_many = len(current) >= self.backend.max_batch_size
+            too_long = max_tokens is not None and current and current_tokens + tokens > max_tokens
+            if too_many or too_long:
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_with_retry(self, texts: List[str], task_type: str) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                with self.rate_limiter:
+                    vectors = self.backend.embed(texts, task_type)
+                if len(vectors) != len(texts):
+                    raise RuntimeError(f"{len(vectors)} vecteurs reçus pour {len(texts)} textes")
+                return vectors
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+                delay = delay * (0.5 + random.random() / 2)  # jitter
+                logger.warning(f"Embedding lot de {len(texts)} textes échoué ({e}), tentative {attempt}/{self.max_retries} dans {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed(self, texts: Sequence[str], task_type: str = "RETRIEVAL_DOCUMENT") -> List[List[float]]:
+        if not texts:
+            return []
+        # dédoublonnage : un texte répété (titre partagé, chunk identique) n'est envoyé qu'une fois
+        unique: Dict[str, int] = {}
+        positions: List[int] = []
+        for t in texts:
+            positions.append(unique.setdefault(t, len(unique)))
+        unique_texts = list(unique.keys())
+
+        results: List[Optional[List[float]]] = [None] * len(unique_texts)
+        if self.store is not None:
+            for i, vec in enumerate(self.store.get_many(self.backend.model or "", task_type, unique_texts)):
+                if vec is not None:
+                    results[i] = vec.tolist()
+        missing = [i for i, vec in enumerate(results) if vec is None]
+
+        batches = [[missing[j] for j in batch] for batch in self.pack([unique_texts[i] for i in missing])]
+        logger.info(
+            f"Embedding de {len(missing)} textes ({len(texts)} demandés, {len(unique_texts) - len(missing)} déjà dans le store) "
+            f"en {len(batches)} lots, task={task_type}"
+        )
+
+        def _run(batch: List[int]) -> None:
+            batch_texts = [unique_texts[i] for i in batch]
+            vectors = self._embed_with_retry(batch_texts, task_type)
+            if self.store is not None:
+                try:
+                    self.store.put_many(self.backend.model or "", task_type, batch_texts, vectors)
+                except Exception as e:
+                    # le store n'est qu'une économie : un échec d'écriture ne bloque pas l'ingestion
+                    logger.warning(f"Écriture dans le store d'embeddings échouée : {e}")
+            for i, vec in zip(batch, vectors):
+                results[i] = vec
+
+        if len(batches) <= 1 or self.concurrency == 1:
+            for batch in batches:
+                _run(batch)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches)), thread_name_prefix="ingest-embed") as pool:
+                for fut in [pool.submit(_run, b) for b in batches]:
+                    fut.result()
+        return [results[p] for p in positions]
+
+
+_store: Optional[EmbeddingStore] = None
+_store_lock = threading.Lock()
+
+def get_embedding_store() -> Optional[EmbeddingStore]:
+    """Store d'embeddings partagé du process, None si embedding_store_dir n'est pas configuré."""
+    global _store
+    if not settings.embedding_store_dir:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = EmbeddingStore(settings.embedding_store_dir)
+    return _store
+
+
+_embedders: Dict[str, IngestionEmbedder] = {}
+_embedders_lock = threading.Lock()
+
+def _get_or_create(name: str, factory: Callable[[], IngestionEmbedder]) -> IngestionEmbedder:
+    if name not in _embedders:
+        with _embedders_lock:
+            if name not in _embedders:
+                _embedders[name] = factory()
+    return _embedders[name]
+
+def gemini_ingestion_embedder() -> IngestionEmbedder:
+    return _get_or_create("gemini", lambda: IngestionEmbedder(
+        EmbeddingBackend(
+            model=GCP_EMBED_MODEL,
+            embed=lambda texts, task_type: embed_query_batch_gemini(texts, task_type=task_type),
+            max_batch_size=settings.vertex_embed_batch_size,
+            max_batch_tokens=settings.vertex_embed_batch_tokens,
+        ),
+        store=get_embedding_store(),
+        rate_limiter=RateLimiter(settings.ingestion_embed_requests_per_minute, settings.ingestion_embed_max_in_flight),
+        concurrency=settings.ingestion_embed_concurrency,
+        max_retries=settings.ingestion_embed_max_retries,
+    ))
+
+def ollama_ingestion_embedder() -> IngestionEmbedder:
+    # Ollama n'a pas de task_type : même endpoint pour requêtes et documents
+    return _get_or_create("ollama", lambda: IngestionEmbedder(
+        EmbeddingBackend(
+            model=OLLAMA_EMBED_MODEL,
+            embed=lambda texts, task_type: embed_query_batch(texts),
+            max_batch_size=settings.ollama_embed_batch_size,
+        ),
+        store=get_embedding_store(),
+        rate_limiter=RateLimiter(settings.ingestion_embed_requests_per_minute, settings.ingestion_embed_max_in_flight),
+        concurrency=settings.ingestion_embed_concurrency,
+        max_retries=settings.ingestion_embed_max_retries,
+    ))
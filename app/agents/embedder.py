@@ -3,14 +3,25 @@ from typing import List
 import requests
 import httpx
 from app.core import settings
+from app.base.clients import get_clients
 import os
+import threading
 from google.api_core.exceptions import GoogleAPIError
 import vertexai
 from vertexai.language_models import TextEmbeddingModel
+from app.agents.embedding_cache import EmbeddingCache, SqliteEmbeddingTier
 
 
 # mxbai-embed-large 3s bge-m3 20s
-embedder = OllamaEmbeddings(model="mxbai-embed-large",base_url=f"https://{settings.ollama_host}:{settings.ollama_port}",keep_alive=-1)
+OLLAMA_EMBED_MODEL = "mxbai-embed-large"
+embedder = OllamaEmbeddings(model=OLLAMA_EMBED_MODEL,base_url=f"https://{settings.ollama_host}:{settings.ollama_port}",keep_alive=-1,client_kwargs=get_clients().ollama_client_kwargs())
+
+# cache des embeddings de requêtes (questions répétées sur /search et /training)
+query_embedding_cache = EmbeddingCache(
+    max_entries=settings.embedding_cache_max_entries,
+    ttl_seconds=settings.embedding_cache_ttl_seconds,
+    disk=SqliteEmbeddingTier(settings.embedding_cache_path) if settings.embedding_cache_path else None,
+)
 
 try:
     from vertexai.language_models import TextEmbeddingInput
@@ -24,10 +35,16 @@ GCP_VERTEX_LOCATION = os.getenv("GCP_VERTEX_LOCATION", "us-central1")
 GCP_EMBED_MODEL = os.getenv("GCP_EMBED_MODEL", "text-multilingual-embedding-002")
 _vertex_initialized = False
 _text_embed_model = None
+_vertex_lock = threading.Lock()
 
 def _ensure_vertex_init():
     global _vertex_initialized, _text_embed_model
-    if not _vertex_initialized:
+    if _vertex_initialized:
+        return
+    # appelé depuis plusieurs threads du pool d'embedding : une seule initialisation
+    with _vertex_lock:
+        if _vertex_initialized:
+            return
         if not GCP_PROJECT_ID:
             raise RuntimeError("GCP_PROJECT_ID manquant (env).")
         if not GCP_VERTEX_LOCATION:
@@ -37,6 +54,10 @@ def _ensure_vertex_init():
         _vertex_initialized = True
 
 def generate_embedding_gemini(text: str) -> List[float]:
+    vec = query_embedding_cache.get_or_compute(GCP_EMBED_MODEL, "RETRIEVAL_QUERY", text, _generate_embedding_gemini)
+    return vec.tolist()
+
+def _generate_embedding_gemini(text: str) -> List[float]:
     try:
         _ensure_vertex_init()
         if _HAS_TEXT_EMBEDDING_INPUT:
@@ -67,6 +88,10 @@ def embed_query_batch_gemini(texts: List[str], task_type: str = "RETRIEVAL_DOCUM
         raise Exception(f"Vertex AI error: {e}")
 
 def generate_embedding(text: str) -> list:
+    vec = query_embedding_cache.get_or_compute(OLLAMA_EMBED_MODEL, "query", text, _generate_embedding)
+    return vec.tolist()
+
+def _generate_embedding(text: str) -> list:
     try:
         return embedder.embed_query(text) 
     except (httpx.RequestError, httpx.HTTPStatusError) as e:
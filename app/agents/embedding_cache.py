@@ -0,0 +1,184 @@
+from __future__ import annotations
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+CacheKey = Tuple[str, str, str]  # (model, task_type, texte normalisé)
+
+
+def normalize_query(text: str) -> str:
+    """Normalise une question pour que les variantes triviales (casse, espaces, apostrophes) partagent la même entrée."""
+    t = unicodedata.normalize("NFKC", text or "")
+    t = t.replace("’", "'").replace("\u200b", "")
+    t = re.sub(r"\s+", " ", t).strip()
+    return t.casefold()
+
+
+class SqliteEmbeddingTier:
+    """Tier disque optionnel : une ligne par vecteur (float32 en BLOB), partagé entre redémarrages."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            " key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS query_embeddings_created ON query_embeddings(created_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def _digest(key: CacheKey) -> str:
+        return hashlib.sha1("\x1f".join(key).encode("utf-8")).hexdigest()
+
+    def get(self, key: CacheKey, ttl_seconds: Optional[float]) -> Optional[Tuple[np.ndarray, float]]:
+        """(vecteur, created_at) : l'âge de la ligne suit le vecteur dans le tier mémoire."""
+        digest = self._digest(key)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT dim, vector, created_at FROM query_embeddings WHERE key = ?", (digest,)
+            ).fetchone()
+            if row is None:
+                return None
+            dim, blob, created_at = row
+            if ttl_seconds and time.time() - created_at > ttl_seconds:
+                self._conn.execute("DELETE FROM query_embeddings WHERE key = ?", (digest,))
+                self._conn.commit()
+                return None
+        vec = np.frombuffer(blob, dtype=np.float32)
+        return (vec, created_at) if vec.shape[0] == dim else None
+
+    def put(self, key: CacheKey, vector: np.ndarray, max_entries: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings(key, dim, vector, created_at) VALUES (?, ?, ?, ?)",
+                (self._digest(key), int(vector.shape[0]), vector.tobytes(), time.time()),
+            )
+            # éviction par taille : on garde les max_entries plus récentes
+            self._conn.execute(
+                "DELETE FROM query_embeddings WHERE key IN ("
+                " SELECT key FROM query_embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM query_embeddings")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingCache:
+    """
+    Cache des embeddings de requêtes, clé (model, task_type, texte normalisé).
+    - tier mémoire LRU borné (max_entries) avec TTL
+    - tier disque optionnel (SqliteEmbeddingTier), consulté en cas de miss mémoire
+    Les vecteurs sont stockés en float32.
+    """
+    def __init__(
+        self,
+        max_entries: int = 5000,
+        ttl_seconds: Optional[float] = 86400,
+        disk: Optional[SqliteEmbeddingTier] = None,
+        disk_max_entries: int = 100_000,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk = disk
+        self.disk_max_entries = disk_max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, Tuple[float, np.ndarray]]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(model: str, task_type: str, text: str) -> CacheKey:
+        return (model or "", task_type or "", normalize_query(text))
+
+    def _expired(self, created_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.time() - created_at > self.ttl_seconds
+
+    def _put_memory(self, key: CacheKey, vec: np.ndarray, created_at: float) -> None:
+        self._entries[key] = (created_at, vec)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, model: str, task_type: str, text: str) -> Optional[np.ndarray]:
+        key = self.make_key(model, task_type, text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, vec = entry
+                if not self._expired(created_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vec
+                del self._entries[key]
+                self.expirations += 1
+        if self.disk is not None:
+            row = self.disk.get(key, self.ttl_seconds)
+            if row is not None:
+                vec, created_at = row
+                with self._lock:
+                    self.disk_hits += 1
+                    # date d'origine conservée : un passage par le disque ne prolonge pas le TTL
+                    self._put_memory(key, vec, created_at)
+                return vec
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model: str, task_type: str, text: str, vector) -> np.ndarray:
+        key = self.make_key(model, task_type, text)
+        vec = np.asarray(vector, dtype=np.float32)
+        vec.setflags(write=False)
+        with self._lock:
+            self._put_memory(key, vec, time.time())
+        if self.disk is not None:
+            self.disk.put(key, vec, self.disk_max_entries)
+        return vec
+
+    def get_or_compute(self, model: str, task_type: str, text: str, compute: Callable[[str], object]) -> np.ndarray:
+        vec = self.get(model, task_type, text)
+        if vec is not None:
+            return vec
+        return self.put(model, task_type, text, compute(text))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "disk": self.disk.path if self.disk is not None else None,
+            }
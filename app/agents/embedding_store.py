@@ -0,0 +1,164 @@
+from __future__ import annotations
+import fcntl
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class _Matrix:
+    """Fichier float32 en ajout seul (une ligne par vecteur), lu via np.memmap."""
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self.row_bytes = dim * 4
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size % self.row_bytes:
+            # écriture interrompue : on coupe la ligne partielle
+            with open(path, "r+b") as f:
+                f.truncate(size - size % self.row_bytes)
+            size -= size % self.row_bytes
+        self.rows = size // self.row_bytes
+        self._map: Optional[np.memmap] = None
+        self._mapped_rows = 0
+
+    def append(self, vectors: np.ndarray) -> int:
+        """Ajoute les vecteurs, renvoie l'indice de la première ligne écrite."""
+        with open(self.path, "ab") as f:
+            # verrou fichier : plusieurs workers peuvent partager le même store
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                first = f.seek(0, os.SEEK_END) // self.row_bytes
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        self.rows = first + len(vectors)
+        return first
+
+    def has(self, row: int) -> bool:
+        if row >= self.rows:
+            self.rows = os.path.getsize(self.path) // self.row_bytes
+        return row < self.rows
+
+    def read(self, row: int) -> np.ndarray:
+        if self._map is None or row >= self._mapped_rows:
+            self._map = np.memmap(self.path, dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+            self._mapped_rows = self.rows
+        return np.array(self._map[row])
+
+
+class EmbeddingStore:
+    """
+    Store d'embeddings adressé par contenu : clé (model, task_type, sha256(texte)).
+    - index sqlite (clé -> ligne) dans <directory>/index.sqlite
+    - une matrice float32 par modèle (<directory>/<model>.f32), lue en mmap
+    Partagé par toutes les collections : un re-index ou une reconstruction de
+    collection ne rappelle le fournisseur que pour les textes jamais vus.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS models (model TEXT PRIMARY KEY, dim INTEGER NOT NULL, file TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            " model TEXT NOT NULL, task_type TEXT NOT NULL, digest TEXT NOT NULL, row INTEGER NOT NULL,"
+            " PRIMARY KEY (model, task_type, digest))"
+        )
+        self._conn.commit()
+        self._matrices: Dict[str, _Matrix] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _matrix(self, model: str, dim: Optional[int] = None) -> Optional[_Matrix]:
+        matrix = self._matrices.get(model)
+        if matrix is not None:
+            return matrix
+        row = self._conn.execute("SELECT dim, file FROM models WHERE model = ?", (model,)).fetchone()
+        if row is None:
+            if dim is None:
+                return None
+            file = re.sub(r"[^A-Za-z0-9_.-]", "_", model) + ".f32"
+            self._conn.execute("INSERT OR IGNORE INTO models(model, dim, file) VALUES (?, ?, ?)", (model, dim, file))
+            self._conn.commit()
+            row = self._conn.execute("SELECT dim, file FROM models WHERE model = ?", (model,)).fetchone()
+        matrix = _Matrix(os.path.join(self.directory, row[1]), row[0])
+        self._matrices[model] = matrix
+        return matrix
+
+    def get_many(self, model: str, task_type: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        out: List[Optional[np.ndarray]] = [None] * len(texts)
+        if not texts:
+            return out
+        digests = [text_digest(t) for t in texts]
+        with self._lock:
+            matrix = self._matrix(model)
+            if matrix is not None:
+                found: Dict[str, int] = {}
+                for start in range(0, len(digests), 500):
+                    group = digests[start:start + 500]
+                    placeholders = ",".join("?" * len(group))
+                    for digest, row in self._conn.execute(
+                        f"SELECT digest, row FROM vectors WHERE model = ? AND task_type = ? AND digest IN ({placeholders})",
+                        (model, task_type, *group),
+                    ):
+                        found[digest] = row
+                for i, digest in enumerate(digests):
+                    row = found.get(digest)
+                    if row is not None and matrix.has(row):
+                        out[i] = matrix.read(row)
+            hit = sum(v is not None for v in out)
+            self.hits += hit
+            self.misses += len(texts) - hit
+        return out
+
+    def put_many(self, model: str, task_type: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        if not texts:
+            return
+        arr = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            matrix = self._matrix(model, arr.shape[1])
+            if matrix.dim != arr.shape[1]:
+                raise ValueError(f"Dimension {arr.shape[1]} incompatible avec le store {model} ({matrix.dim})")
+            # la matrice est écrite (fsync) avant l'index : une ligne indexée est toujours lisible
+            first = matrix.append(arr)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors(model, task_type, digest, row) VALUES (?, ?, ?, ?)",
+                [(model, task_type, text_digest(t), first + i) for i, t in enumerate(texts)],
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            models = {
+                model: {"dim": dim, "vectors": count}
+                for model, dim, count in self._conn.execute(
+                    "SELECT m.model, m.dim, COUNT(v.row) FROM models m LEFT JOIN vectors v ON v.model = m.model GROUP BY m.model"
+                )
+            }
+            lookups = self.hits + self.misses
+            return {
+                "directory": self.directory,
+                "models": models,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+            self._matrices.clear()
+
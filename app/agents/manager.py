@@ -1,14 +1,294 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
 from .providers.base import BaseLLMProvider
+from app.core import settings
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class ProviderStats:
+    """Fenêtre glissante des derniers appels d'un provider : latences des succès et issues."""
+    def __init__(self, window: int = 200):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def record(self, ok: bool, latency: float) -> None:
+        self.calls += 1
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+        else:
+            self.errors += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        return (self.outcomes.count(False) / len(self.outcomes)) if self.outcomes else 0.0
+
+
+class CircuitBreaker:
+    """
+    closed -> open après `failures` échecs consécutifs ; open -> half-open après `cooldown`
+    secondes (un seul appel d'essai) ; half-open -> closed au premier succès, open sinon.
+    """
+    def __init__(self, failures: int = 5, cooldown: float = 30.0):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half-open"
+            self._probing = False
+        if self.state == "closed":
+            return True
+        if self.state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self) -> None:
+        """Appel d'essai annulé (hedge perdu, client déconnecté) : un autre appel pourra sonder."""
+        self._probing = False
+
+    def success(self) -> None:
+        self.state = "closed"
+        self.consecutive = 0
+        self._probing = False
+
+    def failure(self) -> None:
+        self.consecutive += 1
+        self._probing = False
+        if self.state == "half-open" or self.consecutive >= self.failures:
+            if self.state != "open":
+                logger.warning(f"Circuit ouvert après {self.consecutive} échec(s)")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class _Slot:
+    def __init__(self, provider: BaseLLMProvider, max_concurrency: int, breaker: CircuitBreaker):
+        self.provider = provider
+        self.name = provider.name()
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.stats = ProviderStats()
+        self.breaker = breaker
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        return self._sem
+
+    @property
+    def saturated(self) -> bool:
+        return self.in_flight >= self.max_concurrency
+
 
 class LLMManager:
-    def __init__(self, providers: list[BaseLLMProvider]):
+    """
+    Routage entre providers LLM :
+    - latences (p50 / p95) et taux d'erreur par provider sur une fenêtre glissante
+    - circuit breaker par provider, limite de requêtes simultanées par provider
+    - hedging : si le premier provider n'a pas répondu après son p95, un second
+      provider est lancé et la première réponse gagne ; en cas d'erreur on bascule
+      immédiatement sur le suivant
+    provider_name force le premier provider essayé ; "auto" (ou None) prend le plus rapide.
+    """
+    def __init__(
+        self,
+        providers: list[BaseLLMProvider],
+        *,
+        hedge: bool = True,
+        hedge_default_delay: float = 10.0,
+        hedge_min_delay: float = 1.0,
+        hedge_max_delay: float = 30.0,
+        min_samples: int = 20,
+        max_concurrency: Optional[Dict[str, int]] = None,
+        default_concurrency: int = 16,
+        breaker_failures: int = 5,
+        breaker_cooldown: float = 30.0,
+    ):
         self.providers = {provider.name(): provider for provider in providers}
+        self.hedge = hedge
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.min_samples = min_samples
+        self._slots: Dict[str, _Slot] = {
+            name: _Slot(
+                provider,
+                max(1, (max_concurrency or {}).get(name, default_concurrency)),
+                CircuitBreaker(breaker_failures, breaker_cooldown),
+            )
+            for name, provider in self.providers.items()
+        }
 
     def get_provider(self, name: str) -> BaseLLMProvider:
         if name not in self.providers:
             raise ValueError(f"Provider '{name}' non reconnu.")
         return self.providers[name]
 
-    async def generate(self, prompt: str, provider_name: str, **kwargs) -> str:
-        provider = self.get_provider(provider_name)
-        return await provider.generate(prompt, **kwargs)
+    def _hedge_delay(self, slot: _Slot) -> float:
+        p95 = slot.stats.percentile(0.95) if len(slot.stats.latencies) >= self.min_samples else None
+        delay = p95 if p95 is not None else self.hedge_default_delay
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, delay))
+
+    def _candidates(self, provider_name: Optional[str]) -> List[_Slot]:
+        """Ordre d'essai : provider demandé d'abord, puis les autres par p50 croissant (inconnus en dernier)."""
+        def rank(slot: _Slot):
+            p50 = slot.stats.percentile(0.5)
+            return (slot.breaker.state != "closed", p50 is None, p50 or 0.0, slot.stats.error_rate)
+        others = sorted((s for n, s in self._slots.items() if n != provider_name), key=rank)
+        if provider_name and provider_name != "auto":
+            return [self._slots[provider_name]] + others
+        return others
+
+    async def _call(self, slot: _Slot, prompt: str, kwargs: dict, probe: bool = False) -> str:
+        settled = False
+        try:
+            async with slot.semaphore():
+                slot.in_flight += 1
+                started = time.monotonic()
+                try:
+                    result = await slot.provider.generate(prompt, **kwargs)
+                except asyncio.CancelledError:
+                    # perdant d'un hedge : ni succès ni échec
+                    raise
+                except Exception:
+                    slot.stats.record(False, time.monotonic() - started)
+                    slot.breaker.failure()
+                    settled = True
+                    raise
+                finally:
+                    slot.in_flight -= 1
+                slot.stats.record(True, time.monotonic() - started)
+                slot.breaker.success()
+                settled = True
+                return result
+        finally:
+            if probe and not settled:
+                # sans cela le circuit resterait half-open sans plus jamais laisser passer d'appel
+                slot.breaker.release_probe()
+
+    async def generate(self, prompt: str, provider_name: Optional[str] = None, **kwargs) -> str:
+        if provider_name and provider_name != "auto":
+            self.get_provider(provider_name)
+        queue = self._candidates(provider_name)
+        pending: Dict[asyncio.Task, _Slot] = {}
+        last_error: Optional[BaseException] = None
+
+        def launch(hedged: bool) -> bool:
+            while queue:
+                slot = queue.pop(0)
+                # un hedge ne fait pas la queue derrière un provider déjà saturé
+                if (hedged and slot.saturated) or not slot.breaker.allow():
+                    continue
+                if hedged:
+                    slot.stats.hedges += 1
+                probe = slot.breaker.state == "half-open"
+                pending[asyncio.ensure_future(self._call(slot, prompt, kwargs, probe))] = slot
+                return True
+            return False
+
+        if not launch(hedged=False):
+            raise RuntimeError("Aucun provider LLM disponible (circuits ouverts).")
+        try:
+            while pending:
+                first_slot = next(iter(pending.values()))
+                timeout = self._hedge_delay(first_slot) if self.hedge and queue else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # pas de réponse avant le p95 : on lance un second provider en parallèle
+                    logger.info(f"Hedge LLM : {first_slot.name} > {timeout:.1f}s")
+                    launch(hedged=True)
+                    continue
+                for task in done:
+                    slot = pending.pop(task)
+                    if task.exception() is None:
+                        slot.stats.wins += 1
+                        return task.result()
+                    last_error = task.exception()
+                    logger.warning(f"Provider {slot.name} en échec : {last_error}")
+                if not pending:
+                    launch(hedged=False)
+            raise last_error or RuntimeError("Aucun provider LLM disponible.")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        out: Dict[str, Dict[str, object]] = {}
+        for name, slot in self._slots.items():
+            p50, p95 = slot.stats.percentile(0.5), slot.stats.percentile(0.95)
+            out[name] = {
+                "state": slot.breaker.state,
+                "in_flight": slot.in_flight,
+                "max_concurrency": slot.max_concurrency,
+                "calls": slot.stats.calls,
+                "errors": slot.stats.errors,
+                "error_rate": round(slot.stats.error_rate, 4),
+                "p50_s": round(p50, 3) if p50 is not None else None,
+                "p95_s": round(p95, 3) if p95 is not None else None,
+                "hedges": slot.stats.hedges,
+                "wins": slot.stats.wins,
+                "hedge_delay_s": round(self._hedge_delay(slot), 3),
+            }
+        return out
+
+
+def _build_providers() -> list[BaseLLMProvider]:
+    from .providers.gemini import GeminiProvider
+    from .providers.ollama import OllamaProvider
+    from .providers.openrouter import OpenRouterProvider
+
+    factories = {
+        "vertex-gemini": lambda: GeminiProvider(model=settings.llm_gemini_model, location=settings.llm_gemini_location),
+        "ollama": lambda: OllamaProvider(model=settings.llm_ollama_model),
+        "openrouter": lambda: OpenRouterProvider(model=settings.llm_openrouter_model, api_key=settings.openrouter_apikey),
+    }
+    providers = []
+    for name in settings.llm_providers:
+        if name not in factories:
+            raise ValueError(f"Provider '{name}' non reconnu.")
+        providers.append(factories[name]())
+    return providers
+
+
+_manager: Optional[LLMManager] = None
+_manager_lock = threading.Lock()
+
+def get_llm_manager() -> LLMManager:
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = LLMManager(
+                    _build_providers(),
+                    hedge=settings.llm_hedge_enabled,
+                    hedge_default_delay=settings.llm_hedge_default_delay_seconds,
+                    hedge_min_delay=settings.llm_hedge_min_delay_seconds,
+                    max_concurrency=settings.llm_provider_concurrency,
+                    breaker_failures=settings.llm_breaker_failures,
+                    breaker_cooldown=settings.llm_breaker_cooldown_seconds,
+                )
+    return _manager
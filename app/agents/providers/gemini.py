@@ -1,9 +1,10 @@
 import asyncio
 from typing import Any, Dict
 
-from google import genai
 from google.genai.types import GenerateContentConfig
 from .base import BaseLLMProvider
+from app.base.clients import get_clients
+from app.base.executor import run_blocking
 import os
 
 
@@ -19,11 +20,8 @@ class GeminiProvider(BaseLLMProvider):
             raise ValueError("L'environnement GCP_PROJECT_ID est requis pour Vertex mode.")
 
       
-        self.client = genai.Client(
-            vertexai=True,
-            project=project,
-            location=location,
-        )
+        # client partagé par (projet, région) : voir app/base/clients.py
+        self.client = get_clients().genai(project, location)
 
     def name(self) -> str:
         return "vertex-gemini"
@@ -75,4 +73,4 @@ class GeminiProvider(BaseLLMProvider):
                 finish = getattr(resp.candidates[0], "finish_reason", None)
             raise RuntimeError(f"Gemini returned no text. finish_reason={finish}, usage={usage}")
 
-        return await asyncio.to_thread(_call)
+        return await run_blocking("llm", _call)
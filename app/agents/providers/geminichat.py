@@ -1,10 +1,16 @@
 import asyncio
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 
-from google import genai
 from app.utils.langue import detect_dominant_lang
+from app.utils.utils import citation_coverage
 from app.utils.tokens import *
 from app.exceptions.exceptions import ValueControlException
+from app.base.clients import get_clients
+from app.base.executor import run_blocking
+from app.core import settings
 from google.genai.types import GenerateContentConfig
 import os
 import logging
@@ -24,6 +30,39 @@ def _lang_name(code: str) -> str:
     return _LANG_NAME.get(code, code)
 
 SimpleMsg = Dict[str, str]  # role,content
+
+_STREAM_END = object()
+# textes les plus longs envoyés à models.count_tokens lors de la calibration
+_CALIBRATION_SAMPLE = 8
+
+# single : un candidat ; scored : N candidats en un appel, le mieux sourcé gagne ;
+# race : N appels parallèles à un candidat, le premier qui répond gagne
+CANDIDATE_STRATEGIES = ("single", "scored", "race")
+
+
+@dataclass
+class AnswerUsage:
+    """Coût d'une réponse : latence et tokens (usage_metadata Gemini)."""
+    strategy: str
+    latency_ms: int = 0
+    first_token_ms: Optional[int] = None  # streaming
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    candidates: int = 1
+    calls: int = 1
+    citation_coverage: Optional[float] = None  # candidat retenu (scored)
+
+    def add(self, resp: Any) -> None:
+        usage = getattr(resp, "usage_metadata", None)
+        if usage is None:
+            return
+        self.prompt_tokens += getattr(usage, "prompt_token_count", None) or 0
+        self.output_tokens += getattr(usage, "candidates_token_count", None) or 0
+        self.total_tokens += getattr(usage, "total_token_count", None) or 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
  
 def _to_genai_message(msg: SimpleMsg) -> Dict[str, Any]:
     role_map = {"user": "user", "assistant": "model"}  
@@ -41,16 +80,8 @@ def _prune_by_tokens(
     *,
     garde_last_n: int = 2,  
 ) -> List[Dict[str, Any]]:
-    if not max_tokens_ctx:
-        return contents
-    total = count_contents_tokens(contents)
-    if total <= max_tokens_ctx:
-        return contents
-    pruned = list(contents)
-    min_len = min(len(pruned), garde_last_n)
-    while len(pruned) > min_len and count_contents_tokens(pruned) > max_tokens_ctx:
-        pruned.pop(0)  
-    return pruned
+    # chaque message est compté une fois (cache), puis retrait en O(n) : voir app/utils/tokens.py
+    return prune_by_tokens(contents, max_tokens_ctx, garde_last_n=garde_last_n)
 
 class GeminiChatStateless:
     """
@@ -62,11 +93,19 @@ class GeminiChatStateless:
         model: str = "gemini-2.5-pro",
         project: str = os.getenv("GCP_PROJECT_ID"),
         location: str = "us-central1",
+        candidate_strategy: Optional[str] = None,
+        candidate_count: Optional[int] = None,
     ):
         if not project:
             raise ValueControlException("GCP_PROJECT_ID requis.")
         self.model = model
-        self.client = genai.Client(vertexai=True, project=project, location=location)
+        self.client = get_clients().genai(project, location)
+        self._calibrated = False
+        self._calibration_lock = threading.Lock()
+        self.candidate_strategy = candidate_strategy or settings.gemini_candidate_strategy
+        if self.candidate_strategy not in CANDIDATE_STRATEGIES:
+            raise ValueControlException(f"Stratégie de candidats inconnue : {self.candidate_strategy}")
+        self.candidate_count = max(1, candidate_count or settings.gemini_candidate_count)
 
     async def chat(
         self,
@@ -112,7 +151,280 @@ class GeminiChatStateless:
                 raise RuntimeError(f"Gemini returned no text. finish_reason={finish}, usage={usage}")
             return text
 
-        return await asyncio.to_thread(_call)
+        return await run_blocking("llm", _call)
+
+    def _rag_request(
+        self,
+        messages: List[SimpleMsg],
+        user_question: str,
+        search_results: List[Dict[str, Any]],
+        *,
+        default_instruction: str,
+        build_prompt: Callable[..., str],
+        temperature: float,
+        max_input_tokens: int,
+        max_history_messages: Optional[int],
+        system_instruction: Optional[str],
+        max_items: int,
+        candidate_count: int,
+        answer_lang: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], GenerateContentConfig]:
+        """contents + config d'un appel RAG (search ou training), communs aux variantes bloquante et streaming."""
+        # langue de réponse (déjà détectée par retrieve() côté route)
+        if not answer_lang:
+            lang_code, conf = detect_dominant_lang(user_question)
+            answer_lang = lang_code if lang_code != "und" else "fr"
+
+        # System instruction
+        sys_instr = (system_instruction or
+                     _extract_last_system(messages) or
+                     default_instruction)
+        
+        sys_with_lang = (
+            sys_instr
+            + f"\n- Réponds dans la langue suivante : {_lang_name(answer_lang)} "
+        )
+
+        # conversion historique, ignore system
+        contents: List[Dict[str, Any]] = []
+        for m in messages or []:
+            if m["role"] == "system":
+                continue
+            contents.append(_to_genai_message(m))
+
+        # Construction du message user : contexte dédoublonné et borné au budget,
+        # une fois la question et le gabarit comptés (app/prompt/context_packer.py)
+        budget = None
+        if max_input_tokens:
+            overhead = token_counter.count_text(build_prompt(user_question=user_question, packed_results_json="[]")) + 3
+            budget = max_input_tokens - overhead
+        packed = PromptFactory.pack_context(
+            search_results,
+            budget_tokens=budget,
+            max_items=max_items,
+        )
+        user_prompt = build_prompt(user_question=user_question, packed_results_json=packed)
+        contents.append({"role": "user", "parts": [{"text": user_prompt}]})
+
+        # Tronque historique
+        contents = _prune_by_count(contents, max_messages=max_history_messages)
+
+        contents = _prune_by_tokens(
+            contents,
+            max_tokens_ctx=max_input_tokens,
+            garde_last_n=2
+        )
+
+        # Appel modèle, avec sys_with_lang
+        cfg = GenerateContentConfig(
+            temperature=temperature,
+            # max_output_tokens=max_output_tokens,
+            candidate_count=candidate_count,
+            system_instruction={"parts": [{"text": sys_with_lang}]},
+        )
+        return contents, cfg
+
+    def _calibrate_tokens(self, contents: List[Dict[str, Any]]) -> None:
+        """
+        Une fois par process (si activé) : recale l'estimation chars/4 sur models.count_tokens.
+        Les appels count_tokens partent dans un thread à part, la réponse en cours n'attend pas.
+        """
+        if not settings.gemini_token_calibration:
+            return
+        with self._calibration_lock:
+            if self._calibrated:
+                return
+            self._calibrated = True
+        texts = [str(p.get("text", "")) for m in contents for p in (m.get("parts") or [])]
+        texts = sorted(texts, key=len, reverse=True)[:_CALIBRATION_SAMPLE]
+
+        def _run() -> None:
+            try:
+                ratio = token_counter.calibrate(
+                    texts,
+                    lambda text: self.client.models.count_tokens(model=self.model, contents=text).total_tokens,
+                )
+                logger.info(f"Calibration tokens Gemini : ratio={ratio:.3f}")
+            except Exception as e:
+                logger.warning(f"Calibration tokens Gemini impossible : {e}")
+
+        threading.Thread(target=_run, name="gemini-calibration", daemon=True).start()
+
+    @staticmethod
+    def _no_text_error(resp: Any) -> RuntimeError:
+        finish = None
+        usage = getattr(resp, "usage_metadata", None)
+        candidates = getattr(resp, "candidates", None)
+        if candidates:
+            finish = getattr(candidates[0], "finish_reason", None)
+        return RuntimeError(f"Gemini returned no text. finish_reason={finish}, usage={usage}")
+
+    def _generate(
+        self,
+        contents: List[Dict[str, Any]],
+        cfg: GenerateContentConfig,
+        search_results: List[Dict[str, Any]],
+        usage: AnswerUsage,
+    ) -> str:
+        resp = self.client.models.generate_content(
+            model=self.model,
+            contents=contents,
+            config=cfg,
+        )
+        # en arrière-plan : les count_tokens ne retardent pas cette réponse
+        self._calibrate_tokens(contents)
+        usage.add(resp)
+        if usage.strategy == "scored":
+            text = self._best_candidate(resp, search_results, usage)
+        else:
+            text = self._extract_text(resp)
+        if not text:
+            raise self._no_text_error(resp)
+        return text
+
+    @classmethod
+    def _best_candidate(cls, resp: Any, search_results: List[Dict[str, Any]], usage: AnswerUsage) -> str:
+        """Candidat qui cite le plus de documents récupérés ; à égalité fin normale (STOP), puis avg_logprobs."""
+        scored = []
+        for c in getattr(resp, "candidates", None) or []:
+            text = cls._candidate_text(c)
+            if not text:
+                continue
+            finish = getattr(c, "finish_reason", None)
+            stopped = getattr(finish, "name", str(finish)) == "STOP"
+            logprobs = getattr(c, "avg_logprobs", None)
+            coverage = citation_coverage(text, search_results)
+            scored.append(((coverage, stopped, logprobs if logprobs is not None else float("-inf")), text))
+        usage.candidates = len(getattr(resp, "candidates", None) or [])
+        if not scored:
+            return ""
+        (coverage, _, _), text = max(scored, key=lambda item: item[0])
+        usage.citation_coverage = round(coverage, 4)
+        return text
+
+    async def _race(
+        self,
+        contents: List[Dict[str, Any]],
+        cfg: GenerateContentConfig,
+        search_results: List[Dict[str, Any]],
+        usage: AnswerUsage,
+    ) -> str:
+        """
+        candidate_count appels parallèles à un candidat, la première réponse non vide gagne.
+        Les appels perdants ne sont pas interrompus côté Vertex : leurs tokens sont journalisés, pas comptés.
+        """
+        def _one() -> Tuple[str, AnswerUsage]:
+            own = AnswerUsage(strategy="race")
+            return self._generate(contents, cfg, search_results, own), own
+
+        def _log_loser(f: asyncio.Future) -> None:
+            if not f.cancelled() and f.exception() is None:
+                logger.info(f"Candidat perdant (race) : {f.result()[1].total_tokens} tokens")
+
+        usage.calls = usage.candidates = self.candidate_count
+        pending = {asyncio.ensure_future(run_blocking("llm", _one)) for _ in range(self.candidate_count)}
+        last_error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        continue
+                    text, own = task.result()
+                    usage.prompt_tokens, usage.output_tokens, usage.total_tokens = own.prompt_tokens, own.output_tokens, own.total_tokens
+                    return text
+            raise last_error or RuntimeError("Gemini returned no text.")
+        finally:
+            for task in pending:
+                task.add_done_callback(_log_loser)
+
+    async def _answer(
+        self,
+        contents: List[Dict[str, Any]],
+        cfg: GenerateContentConfig,
+        search_results: List[Dict[str, Any]],
+        on_usage: Optional[Callable[[AnswerUsage], None]],
+    ) -> str:
+        usage = AnswerUsage(strategy=self.candidate_strategy)
+        started = time.monotonic()
+        if self.candidate_strategy == "race":
+            text = await self._race(contents, cfg, search_results, usage)
+        else:
+            text = await run_blocking("llm", self._generate, contents, cfg, search_results, usage)
+        usage.latency_ms = int((time.monotonic() - started) * 1000)
+        logger.info(f"Réponse Gemini : {usage.to_dict()}")
+        if on_usage is not None:
+            on_usage(usage)
+        return text
+
+    def _rag_candidate_count(self) -> int:
+        return self.candidate_count if self.candidate_strategy == "scored" else 1
+
+    async def _stream(
+        self,
+        contents: List[Dict[str, Any]],
+        cfg: GenerateContentConfig,
+        on_usage: Optional[Callable[[AnswerUsage], None]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        generate_content_stream dans un thread du pool "llm" ; les morceaux de texte
+        remontent par une asyncio.Queue. Si le client se déconnecte, le thread
+        s'arrête au morceau suivant.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        usage = AnswerUsage(strategy="single")
+        last_chunk: List[Any] = []
+        started = time.monotonic()
+
+        def _put(item: Any) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                pass  # boucle fermée
+
+        def _produce() -> None:
+            try:
+                for chunk in self.client.models.generate_content_stream(model=self.model, contents=contents, config=cfg):
+                    if stop.is_set():
+                        break
+                    # usage_metadata cumulé : le dernier morceau porte le total
+                    last_chunk[:] = [chunk]
+                    text = getattr(chunk, "text", None)
+                    if text:
+                        _put(text)
+            except Exception as e:
+                _put(e)
+            finally:
+                _put(_STREAM_END)
+            self._calibrate_tokens(contents)
+
+        producer = asyncio.ensure_future(run_blocking("llm", _produce))
+        emitted = False
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if not emitted:
+                    usage.first_token_ms = int((time.monotonic() - started) * 1000)
+                emitted = True
+                yield item
+            if not emitted:
+                raise RuntimeError("Gemini returned no text (stream).")
+            usage.latency_ms = int((time.monotonic() - started) * 1000)
+            if last_chunk:
+                usage.add(last_chunk[0])
+            logger.info(f"Réponse Gemini (stream) : {usage.to_dict()}")
+            if on_usage is not None:
+                on_usage(usage)
+        finally:
+            stop.set()
+            producer.add_done_callback(lambda f: f.cancelled() or f.exception())
 
     async def chat_with_rag_search(
         self,
@@ -127,71 +439,54 @@ class GeminiChatStateless:
         system_instruction: Optional[str] = None,
         max_items: int = 10,
         max_segments: int = 6, 
-    ) -> str:        
-        def _call() -> str:
-            # langue de réponse 
-            lang_code, conf = detect_dominant_lang(user_question)
-            answer_lang = lang_code if lang_code != "und" else "fr"
-
-            # System instruction
-            sys_instr = (system_instruction or
-                         _extract_last_system(messages) or
-                         SYSTEM_INSTRUCTION)
-            
-            sys_with_lang = (
-                sys_instr
-                + f"\n- Réponds dans la langue suivante : {_lang_name(answer_lang)} "
-            )
-
-            # conversion historique, ignore system
-            contents: List[Dict[str, Any]] = []
-            for m in messages or []:
-                if m["role"] == "system":
-                    continue
-                contents.append(_to_genai_message(m))
-
-            # Construction du message user
-            packed = PromptFactory.pack_results_for_prompt(
-                search_results,
-                max_items=max_items,
-            )
-            user_prompt = PromptFactory.build_user_prompt(user_question=user_question, packed_results_json=packed)
-            contents.append({"role": "user", "parts": [{"text": user_prompt}]})
-
-            # Tronque historique
-            contents = _prune_by_count(contents, max_messages=max_history_messages)
-
-            contents = _prune_by_tokens(
-                contents,
-                max_tokens_ctx=max_input_tokens,
-                garde_last_n=2
-            )
-
-            logger.info(contents)
-
-            # Appel modèle, avec sys_with_lang
-            cfg = GenerateContentConfig(
-                temperature=temperature,
-                # max_output_tokens=max_output_tokens,
-                candidate_count=2,
-                system_instruction={"parts": [{"text": sys_with_lang}]},
-            )
-            resp = self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=cfg,
-            )
-            text = self._extract_text(resp)
-            if not text:
-                finish = None
-                usage = getattr(resp, "usage_metadata", None)
-                candidates = getattr(resp, "candidates", None)
-                if candidates:
-                    finish = getattr(candidates[0], "finish_reason", None)
-                raise RuntimeError(f"Gemini returned no text. finish_reason={finish}, usage={usage}")
-            return text
-
-        return await asyncio.to_thread(_call)
+        answer_lang: Optional[str] = None,
+        on_usage: Optional[Callable[[AnswerUsage], None]] = None,
+    ) -> str:
+        """Réponse selon self.candidate_strategy ; on_usage(AnswerUsage) reçoit latence et tokens."""
+        contents, cfg = self._rag_request(
+            messages, user_question, search_results,
+            default_instruction=SYSTEM_INSTRUCTION,
+            build_prompt=PromptFactory.build_user_prompt,
+            temperature=temperature,
+            max_input_tokens=max_input_tokens,
+            max_history_messages=max_history_messages,
+            system_instruction=system_instruction,
+            max_items=max_items,
+            candidate_count=self._rag_candidate_count(),
+            answer_lang=answer_lang,
+        )
+        logger.info(contents)
+        return await self._answer(contents, cfg, search_results, on_usage)
+
+    async def stream_rag_search(
+        self,
+        messages: List[SimpleMsg],
+        user_question: str,
+        search_results: List[Dict[str, Any]],
+        *,
+        temperature: float = 0.7,
+        max_input_tokens: int = 600,
+        max_history_messages: Optional[int] = 5,
+        system_instruction: Optional[str] = None,
+        max_items: int = 10,
+        answer_lang: Optional[str] = None,
+        on_usage: Optional[Callable[[AnswerUsage], None]] = None,
+    ) -> AsyncIterator[str]:
+        """Variante streaming de chat_with_rag_search (un seul candidat : les morceaux sont envoyés tels quels)."""
+        contents, cfg = self._rag_request(
+            messages, user_question, search_results,
+            default_instruction=SYSTEM_INSTRUCTION,
+            build_prompt=PromptFactory.build_user_prompt,
+            temperature=temperature,
+            max_input_tokens=max_input_tokens,
+            max_history_messages=max_history_messages,
+            system_instruction=system_instruction,
+            max_items=max_items,
+            candidate_count=1,
+            answer_lang=answer_lang,
+        )
+        async for text in self._stream(contents, cfg, on_usage):
+            yield text
     
     async def chat_with_rag_training(
         self,
@@ -205,81 +500,70 @@ class GeminiChatStateless:
         max_history_messages: Optional[int] = 5,
         system_instruction: Optional[str] = None,
         max_items: int = 10,
-    ) -> str:        
-        def _call() -> str:
-            # langue de réponse 
-            lang_code, conf = detect_dominant_lang(user_question)
-            answer_lang = lang_code if lang_code != "und" else "fr"
-
-            # System instruction
-            sys_instr = (system_instruction or
-                         _extract_last_system(messages) or
-                         SYSTEM_TRAINING_INSTRUCTION)
-            
-            sys_with_lang = (
-                sys_instr
-                + f"\n- Réponds dans la langue suivante : {_lang_name(answer_lang)} "
-            )
-
-            # conversion historique, ignore system
-            contents: List[Dict[str, Any]] = []
-            for m in messages or []:
-                if m["role"] == "system":
-                    continue
-                contents.append(_to_genai_message(m))
-
-            # Construction du message user
-            packed = PromptFactory.pack_results_for_prompt(
-                search_results,
-                max_items=max_items,
-            )
-            user_training_prompt = PromptFactory.build_user_training_prompt(user_question=user_question, packed_results_json=packed)
-            contents.append({"role": "user", "parts": [{"text": user_training_prompt}]})
-
-            # Tronque historique
-            contents = _prune_by_count(contents, max_messages=max_history_messages)
-
-            contents = _prune_by_tokens(
-                contents,
-                max_tokens_ctx=max_input_tokens,
-                garde_last_n=2
-            )
-
-            # Appel modèle, avec sys_with_lang
-            cfg = GenerateContentConfig(
-                temperature=temperature,
-                # max_output_tokens=max_output_tokens,
-                candidate_count=2,
-                system_instruction={"parts": [{"text": sys_with_lang}]},
-            )
-            resp = self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=cfg,
-            )
-            text = self._extract_text(resp)
-            if not text:
-                finish = None
-                usage = getattr(resp, "usage_metadata", None)
-                candidates = getattr(resp, "candidates", None)
-                if candidates:
-                    finish = getattr(candidates[0], "finish_reason", None)
-                raise RuntimeError(f"Gemini returned no text. finish_reason={finish}, usage={usage}")
-            return text
-
-        return await asyncio.to_thread(_call)
+        answer_lang: Optional[str] = None,
+        on_usage: Optional[Callable[[AnswerUsage], None]] = None,
+    ) -> str:
+        """Réponse selon self.candidate_strategy ; on_usage(AnswerUsage) reçoit latence et tokens."""
+        contents, cfg = self._rag_request(
+            messages, user_question, search_results,
+            default_instruction=SYSTEM_TRAINING_INSTRUCTION,
+            build_prompt=PromptFactory.build_user_training_prompt,
+            temperature=temperature,
+            max_input_tokens=max_input_tokens,
+            max_history_messages=max_history_messages,
+            system_instruction=system_instruction,
+            max_items=max_items,
+            candidate_count=self._rag_candidate_count(),
+            answer_lang=answer_lang,
+        )
+        return await self._answer(contents, cfg, search_results, on_usage)
+
+    async def stream_rag_training(
+        self,
+        messages: List[SimpleMsg],
+        user_question: str,
+        search_results: List[Dict[str, Any]],
+        *,
+        temperature: float = 0.7,
+        max_input_tokens: int = 3000,
+        max_history_messages: Optional[int] = 5,
+        system_instruction: Optional[str] = None,
+        max_items: int = 10,
+        answer_lang: Optional[str] = None,
+        on_usage: Optional[Callable[[AnswerUsage], None]] = None,
+    ) -> AsyncIterator[str]:
+        """Variante streaming de chat_with_rag_training."""
+        contents, cfg = self._rag_request(
+            messages, user_question, search_results,
+            default_instruction=SYSTEM_TRAINING_INSTRUCTION,
+            build_prompt=PromptFactory.build_user_training_prompt,
+            temperature=temperature,
+            max_input_tokens=max_input_tokens,
+            max_history_messages=max_history_messages,
+            system_instruction=system_instruction,
+            max_items=max_items,
+            candidate_count=1,
+            answer_lang=answer_lang,
+        )
+        async for text in self._stream(contents, cfg, on_usage):
+            yield text
 
     @staticmethod
-    def _extract_text(resp: Any) -> str:
+    def _candidate_text(candidate: Any) -> str:
+        content = getattr(candidate, "content", None)
+        parts = getattr(content, "parts", None) if content else None
+        if not parts:
+            return ""
+        return "".join(getattr(p, "text", "") for p in parts if getattr(p, "text", None)).strip()
+
+    @classmethod
+    def _extract_text(cls, resp: Any) -> str:
         if getattr(resp, "text", None):
             return resp.text.strip()
         for c in getattr(resp, "candidates", []) or []:
-            content = getattr(c, "content", None)
-            parts = getattr(content, "parts", None) if content else None
-            if parts:
-                texts = [getattr(p, "text", "") for p in parts if getattr(p, "text", None)]
-                if texts:
-                    return "".join(texts).strip()
+            text = cls._candidate_text(c)
+            if text:
+                return text
         return ""
 
 def _extract_last_system(messages: List[SimpleMsg]) -> Optional[str]:
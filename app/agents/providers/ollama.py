@@ -2,12 +2,13 @@ from langchain_ollama import ChatOllama
 from langchain_core.messages import HumanMessage
 from .base import BaseLLMProvider
 from app.core import settings
+from app.base.clients import get_clients
 
 class OllamaProvider(BaseLLMProvider):
     def __init__(self, model: str = "llama3.2", host: str = settings.ollama_host, port: int = settings.ollama_port):
         self.model = model
         self.base_url = f"https://{host}:{port}"
-        self.llm = ChatOllama(model=model, base_url=self.base_url)
+        self.llm = ChatOllama(model=model, base_url=self.base_url, client_kwargs=get_clients().ollama_client_kwargs())
 
     def name(self):
         return "ollama"
@@ -1,11 +1,13 @@
 from openai import AsyncOpenAI
 from app.core import settings
+from app.base.clients import get_clients
 from .base import BaseLLMProvider
 class OpenRouterProvider(BaseLLMProvider):
     def __init__(self, model: str, api_key: str):
         self.client = AsyncOpenAI(
             base_url=settings.openrouter_baseurl,
-            api_key=settings.openrouter_apikey
+            api_key=settings.openrouter_apikey,
+            http_client=get_clients().http(),
         )
         self.model = model
 
@@ -12,6 +12,7 @@ import logging
 from collections import defaultdict
 import time
 from app.base.db import get_db
+from app.base.clients import get_clients
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -103,11 +104,11 @@ async def login(payload: LoginIn, request: Request, response: Response, db: Asyn
         if too_many_attempts(ip, payload.username):
             raise HTTPException(status_code=429, detail="Trop de tentatives. Réessayez plus tard.")
         
-        async with httpx.AsyncClient(timeout=10) as client:
-            try:
-                r = await client.post(MWATER_LOGIN_URL, json={"username": payload.username, "password": payload.password})
-            except httpx.RequestError as e:
-                raise HTTPException(502, f"mWater unreachable: {e}")
+        try:
+            # pool keep-alive partagé : pas de nouvelle connexion TLS à chaque login
+            r = await get_clients().http().post(MWATER_LOGIN_URL, json={"username": payload.username, "password": payload.password}, timeout=10)
+        except httpx.RequestError as e:
+            raise HTTPException(502, f"mWater unreachable: {e}")
 
         if r.status_code == 403:
             FAILS[(ip, (payload.username or "").lower())].append(time.time())
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+import functools
+import json
 import logging
+from typing import Any, AsyncIterator, Callable, Optional
 from app.agents.providers.geminichat import GeminiChatStateless
-from app.services.milvus_multilingual_service import MilvusMultilingualService
-from app.utils.langue import detect_dominant_lang, detect_lang_distribution,should_translate_to_fr,translate_to_fr_if_malagasy
+from app.services.milvus_multilingual_service import MilvusMultilingualService, get_milvus_multilingual_service
+from app.services.retrieval_service import Retrieval, retrieve
+from app.utils.langue import translation_cache
 from app.models.chat import ChatRequest, ChatResponse, TrainingResponse
-from app.utils import group_training_metadata
+from app.utils import group_training_metadata, group_search_sources
+from app.agents.answer_cache import get_answer_cache
+from app.core import settings
+from app.core.responses import success_response
 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -13,11 +21,70 @@ router = APIRouter()
 provider = GeminiChatStateless(model="gemini-2.5-flash")
 
 
+async def _retrieve(kind: str, req: ChatRequest, milvus: MilvusMultilingualService) -> Retrieval:
+    if kind == "search":
+        search = functools.partial(milvus.search_by_vector, user=req.user, partitions=req.partitions)
+    else:
+        search = milvus.formation_by_vector
+    return await retrieve(req.question, search)
+
+
+def _answer_cache_key(kind: str, req: ChatRequest, retrieval: Retrieval):
+    """Clé du cache sémantique, None si la réponse ne doit pas être mise en cache (historique, bypass)."""
+    cache = get_answer_cache()
+    if not settings.answer_cache_enabled:
+        return None
+    if req.bypass_cache or any(m.role != "system" for m in req.messages):
+        cache.record_bypass()
+        return None
+    return cache.bucket_key(kind, retrieval.lang.answer_lang, req.partitions, retrieval.results)
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _single(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+async def _sse_reply(sources, tokens: AsyncIterator[str], on_complete: Optional[Callable[[str], None]], usage: Optional[list] = None) -> AsyncIterator[str]:
+    """
+    Flux SSE : `sources` d'abord (dès la fin de la recherche), puis un `token` par
+    morceau reçu du modèle, enfin `done` (avec l'usage de la réponse) ; `error` si
+    le modèle échoue en cours de route.
+    """
+    yield _sse("sources", sources)
+    parts = []
+    try:
+        async for text in tokens:
+            parts.append(text)
+            yield _sse("token", {"text": text})
+    except Exception as e:
+        logger.exception("Streaming de la réponse interrompu")
+        yield _sse("error", {"message": str(e)})
+        return
+    if on_complete is not None:
+        on_complete("".join(parts).strip())
+    yield _sse("done", {"usage": usage[0].to_dict() if usage else None})
+
+
+def _event_stream(body: AsyncIterator[str]) -> StreamingResponse:
+    # X-Accel-Buffering : pas de buffering par nginx devant l'API
+    return StreamingResponse(body, media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @router.post("/search", response_model=ChatResponse)
-async def chat(req: ChatRequest):
+async def chat(req: ChatRequest, milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        translated_q = translate_to_fr_if_malagasy(req.question)
-        search_results = MilvusMultilingualService().search(translated_q, req.user, req.partitions)
+        retrieval = await _retrieve("search", req, milvus)
+        query_vector, search_results = retrieval.query_vector, retrieval.results
+        cache_key = _answer_cache_key("search", req, retrieval)
+        if cache_key is not None:
+            cached = get_answer_cache().lookup(cache_key, query_vector)
+            if cached is not None:
+                return ChatResponse(reply=cached)
+        usage = []
         reply = await provider.chat_with_rag_search(
             messages=[m.model_dump() for m in req.messages],
             user_question=req.question,
@@ -26,8 +93,12 @@ async def chat(req: ChatRequest):
             max_input_tokens=req.max_input_tokens,
             max_output_tokens=req.max_output_tokens,
             max_history_messages=req.max_messages,
+            answer_lang=retrieval.lang.answer_lang,
+            on_usage=usage.append,
         )
-        return ChatResponse(reply=reply)
+        if cache_key is not None:
+            get_answer_cache().store(cache_key, query_vector, reply, search_results)
+        return ChatResponse(reply=reply, usage=usage[0].to_dict() if usage else None)
     except HTTPException as he:
         raise he 
     except Exception as e:
@@ -38,10 +109,17 @@ async def chat(req: ChatRequest):
 
 
 @router.post("/training", response_model=TrainingResponse)
-async def chat(req: ChatRequest):
+async def chat(req: ChatRequest, milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        translated_q = translate_to_fr_if_malagasy(req.question)
-        search_results = MilvusMultilingualService().formation(translated_q)
+        retrieval = await _retrieve("training", req, milvus)
+        query_vector, search_results = retrieval.query_vector, retrieval.results
+        metas = group_training_metadata(search_results, limit_per_media=6)
+        cache_key = _answer_cache_key("training", req, retrieval)
+        if cache_key is not None:
+            cached = get_answer_cache().lookup(cache_key, query_vector)
+            if cached is not None:
+                return TrainingResponse(reply=cached, sources=metas)
+        usage = []
         reply = await provider.chat_with_rag_training(
             messages=[m.model_dump() for m in req.messages],
             user_question=req.question,
@@ -50,11 +128,15 @@ async def chat(req: ChatRequest):
             max_input_tokens=req.max_input_tokens,
             max_output_tokens=req.max_output_tokens,
             max_history_messages=req.max_messages,
+            answer_lang=retrieval.lang.answer_lang,
+            on_usage=usage.append,
         )
-        metas = group_training_metadata(search_results, limit_per_media=6)
+        if cache_key is not None:
+            get_answer_cache().store(cache_key, query_vector, reply, search_results)
         return TrainingResponse(
         reply=reply,
-        sources=metas
+        sources=metas,
+        usage=usage[0].to_dict() if usage else None,
     )
     except HTTPException as he:
         raise he 
@@ -63,3 +145,85 @@ async def chat(req: ChatRequest):
         traceback_str = traceback.format_exc()
         logger.warning(traceback_str)
         raise Exception(str(e))
+
+
+@router.post("/search/stream")
+async def chat_stream(req: ChatRequest, milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
+    try:
+        retrieval = await _retrieve("search", req, milvus)
+        query_vector, search_results = retrieval.query_vector, retrieval.results
+        sources = group_search_sources(search_results)
+        cache_key = _answer_cache_key("search", req, retrieval)
+        cache = get_answer_cache()
+        if cache_key is not None:
+            cached = cache.lookup(cache_key, query_vector)
+            if cached is not None:
+                return _event_stream(_sse_reply(sources, _single(cached), None))
+        usage = []
+        tokens = provider.stream_rag_search(
+            messages=[m.model_dump() for m in req.messages],
+            user_question=req.question,
+            search_results=search_results,
+            temperature=req.temperature,
+            max_input_tokens=req.max_input_tokens,
+            max_history_messages=req.max_messages,
+            answer_lang=retrieval.lang.answer_lang,
+            on_usage=usage.append,
+        )
+        on_complete = (lambda reply: cache.store(cache_key, query_vector, reply, search_results)) if cache_key is not None else None
+        return _event_stream(_sse_reply(sources, tokens, on_complete, usage))
+    except HTTPException as he:
+        raise he 
+    except Exception as e:
+        import traceback
+        traceback_str = traceback.format_exc()
+        logger.warning(traceback_str)
+        raise Exception(str(e))
+
+
+@router.post("/training/stream")
+async def chat_training_stream(req: ChatRequest, milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
+    try:
+        retrieval = await _retrieve("training", req, milvus)
+        query_vector, search_results = retrieval.query_vector, retrieval.results
+        metas = group_training_metadata(search_results, limit_per_media=6)
+        cache_key = _answer_cache_key("training", req, retrieval)
+        cache = get_answer_cache()
+        if cache_key is not None:
+            cached = cache.lookup(cache_key, query_vector)
+            if cached is not None:
+                return _event_stream(_sse_reply(metas, _single(cached), None))
+        usage = []
+        tokens = provider.stream_rag_training(
+            messages=[m.model_dump() for m in req.messages],
+            user_question=req.question,
+            search_results=search_results,
+            temperature=req.temperature,
+            max_input_tokens=req.max_input_tokens,
+            max_history_messages=req.max_messages,
+            answer_lang=retrieval.lang.answer_lang,
+            on_usage=usage.append,
+        )
+        on_complete = (lambda reply: cache.store(cache_key, query_vector, reply, search_results)) if cache_key is not None else None
+        return _event_stream(_sse_reply(metas, tokens, on_complete, usage))
+    except HTTPException as he:
+        raise he 
+    except Exception as e:
+        import traceback
+        traceback_str = traceback.format_exc()
+        logger.warning(traceback_str)
+        raise Exception(str(e))
+
+
+@router.get("/answer_cache")
+def answer_cache_stats():
+    return success_response(data={"enabled": settings.answer_cache_enabled, **get_answer_cache().stats()}, status_code=200)
+
+@router.get("/translation_cache")
+def translation_cache_stats():
+    return success_response(data=translation_cache.stats(), status_code=200)
+
+@router.delete("/answer_cache")
+def clear_answer_cache():
+    get_answer_cache().clear()
+    return success_response(message="answer cache cleared", status_code=200)
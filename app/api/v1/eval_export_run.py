@@ -16,15 +16,17 @@ from fastapi import APIRouter, HTTPException, Query
 
 # === Services Milvus ===
 # mxbai (1024 dims) -> search_collection (docs/consoles/surveys), formation_collection (pages)
-from app.services.milvus_service import MilvusService
+from app.services.milvus_service import MilvusService, get_milvus_service
 # gemini (768 dims) -> search_multilingual_collection, formation_multilingual_collection
-from app.services.milvus_multilingual_service import MilvusMultilingualService
+from app.services.milvus_multilingual_service import MilvusMultilingualService, get_milvus_multilingual_service
 
 # === Embedders ===
 # ⚠️ ADAPTE si besoin (selon où sont tes fonctions)
 from app.agents.embedder import generate_embedding as embed_mxbai
 from app.agents.embedder import generate_embedding_gemini as embed_gemini
 
+from app.services.job_service import JobContext, get_job_manager
+
 # Milvus hybrid
 from pymilvus import AnnSearchRequest
 from pymilvus import WeightedRanker
@@ -53,7 +55,7 @@ def pick_service_and_collection(model: str, corpus: str):
         raise HTTPException(status_code=400, detail="Paramètre 'corpus' invalide (search|formation)")
 
     if model == "mxbai":
-        svc = MilvusService()
+        svc = get_milvus_service()
         if corpus == "search":
             coll = getattr(svc, "collection_name", "search_collection")
         else:
@@ -61,7 +63,7 @@ def pick_service_and_collection(model: str, corpus: str):
         return svc, coll
 
     # model == "gemini"
-    svc = MilvusMultilingualService()
+    svc = get_milvus_multilingual_service()
     if corpus == "search":
         coll = getattr(svc, "collection_name", "search_multilingual_collection")
     else:
@@ -153,20 +155,15 @@ def hybrid_search_eval(
 router = APIRouter(prefix="/eval/export", tags=["eval-export"])
 
 
-@router.post("/runs")
-def export_runs(
-    model: str  = Query(..., regex="^(mxbai|gemini)$"),
-    corpus: str = Query(..., regex="^(search|formation)$"),
-    top_k: int = Query(10, ge=1, le=50),
-    min_score: float = Query(0.0),
-    strict_doc_filter: bool = Query(True, description="Si True, garde uniquement les doc_id présents dans docs_metadata pour le corpus."),
+def run_export_runs(
+    model: str,
+    corpus: str,
+    top_k: int = 10,
+    min_score: float = 0.0,
+    strict_doc_filter: bool = True,
+    on_query=None,
 ) -> Dict[str, Any]:
-    """
-    Génère data/eval/runs_{model}_{corpus}.csv à partir de qrels_queries.csv.
-    - Embedding requête dans l'espace du modèle choisi.
-    - Recherche dans la collection du corpus choisi.
-    - Filtre optionnel strict_doc_filter pour diagnostiquer les mismatches.
-    """
+    """Corps de POST /eval/export/runs ; `on_query(n, total)` est appelé avant chaque requête (progression)."""
     qrels_csv = os.path.join(DATA_DIR, "qrels_queries.csv")
     docs_csv  = os.path.join(DATA_DIR, "docs_metadata.csv")
 
@@ -184,7 +181,9 @@ def export_runs(
 
     out_rows: List[Dict[str, Any]] = []
 
-    for _, row in qrels_df.iterrows():
+    for n, (_, row) in enumerate(qrels_df.iterrows(), start=1):
+        if on_query is not None:
+            on_query(n, len(qrels_df))
         qid   = str(row["query_id"])
         qtext = str(row["query_text"])
 
@@ -231,6 +230,47 @@ def export_runs(
     return {"status": "ok", "count": len(out_rows), "path": out_csv}
 
 
+def export_runs_job(ctx: JobContext) -> Dict[str, Any]:
+    """Job "eval_export_runs" : le CSV n'est écrit qu'à la fin, une reprise recommence donc du début."""
+    def on_query(n, total):
+        ctx.raise_if_cancelled()
+        if n % 20 == 0 or n == total:
+            ctx.set_progress({"queries_done": n, "queries_total": total})
+
+    p = ctx.params
+    # job soumis via /jobs : pas de validation FastAPI, une HTTPException n'aurait pas de sens ici
+    model = str(p.get("model") or "").lower().strip()
+    corpus = str(p.get("corpus") or "").lower().strip()
+    if model not in ("mxbai", "gemini"):
+        raise ValueError(f"Paramètre 'model' invalide : {p.get('model')!r} (mxbai|gemini)")
+    if corpus not in ("search", "formation"):
+        raise ValueError(f"Paramètre 'corpus' invalide : {p.get('corpus')!r} (search|formation)")
+    return run_export_runs(
+        model, corpus, int(p.get("top_k", 10)), float(p.get("min_score", 0.0)),
+        bool(p.get("strict_doc_filter", True)), on_query=on_query,
+    )
+
+get_job_manager().register("eval_export_runs", export_runs_job)
+
+
+@router.post("/runs")
+def export_runs(
+    model: str  = Query(..., regex="^(mxbai|gemini)$"),
+    corpus: str = Query(..., regex="^(search|formation)$"),
+    top_k: int = Query(10, ge=1, le=50),
+    min_score: float = Query(0.0),
+    strict_doc_filter: bool = Query(True, description="Si True, garde uniquement les doc_id présents dans docs_metadata pour le corpus."),
+) -> Dict[str, Any]:
+    """
+    Génère data/eval/runs_{model}_{corpus}.csv à partir de qrels_queries.csv.
+    - Embedding requête dans l'espace du modèle choisi.
+    - Recherche dans la collection du corpus choisi.
+    - Filtre optionnel strict_doc_filter pour diagnostiquer les mismatches.
+    En tâche de fond : POST /jobs {"type": "eval_export_runs", "params": {...}}.
+    """
+    return run_export_runs(model, corpus, top_k, min_score, strict_doc_filter)
+
+
 # ===========================================================
 #                       ENDPOINTS DEBUG
 # ===========================================================
@@ -0,0 +1,74 @@
+from fastapi import APIRouter, HTTPException, Body, Query
+from fastapi.encoders import jsonable_encoder
+from typing import Optional
+import logging
+
+from app.core.responses import success_response
+from app.exceptions.exceptions import BadRequestException, NotFoundException
+from app.services.job_service import FINAL_STATUSES, SUCCEEDED, get_job_manager
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def _public(record: dict) -> dict:
+    record = dict(record)
+    record["id"] = record.pop("_id")
+    return jsonable_encoder(record)
+
+
+@router.post("")
+async def submit_job(payload: dict = Body(...)):
+    """
+    Body: {"type": "ingest" | "sync_all" | "eval_export_runs" | "i18n_translate" | "render_batch", "params": {...}}
+    Renvoie immédiatement le job (202) ; suivi via GET /jobs/{id}.
+    """
+    job_type = payload.get("type")
+    if not job_type:
+        raise BadRequestException("type manquant")
+    record = await get_job_manager().submit(job_type, payload.get("params") or {})
+    return success_response(data=_public(record), message="job soumis", status_code=202)
+
+
+@router.get("")
+async def list_jobs(type: Optional[str] = None, status: Optional[str] = None, limit: int = Query(50, ge=1, le=500)):
+    jobs = await get_job_manager().list(type, status, limit)
+    return success_response(data=[_public(j) for j in jobs], status_code=200)
+
+
+@router.get("/types")
+async def list_job_types():
+    types = get_job_manager().types.values()
+    return success_response(data=[{"type": t.name, "max_concurrency": t.max_concurrency} for t in types], status_code=200)
+
+
+@router.get("/{job_id}")
+async def job_status(job_id: str):
+    record = await get_job_manager().get(job_id)
+    if record is None:
+        raise NotFoundException(f"Job {job_id} introuvable")
+    record.pop("result", None)
+    return success_response(data=_public(record), status_code=200)
+
+
+@router.get("/{job_id}/result")
+async def job_result(job_id: str):
+    record = await get_job_manager().get(job_id)
+    if record is None:
+        raise NotFoundException(f"Job {job_id} introuvable")
+    if record["status"] != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} en statut {record['status']}, pas de résultat")
+    return success_response(data=jsonable_encoder(record["result"]), status_code=200)
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    record = await get_job_manager().get(job_id)
+    if record is None:
+        raise NotFoundException(f"Job {job_id} introuvable")
+    if record["status"] in FINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} déjà terminé ({record['status']})")
+    record = await get_job_manager().cancel(job_id)
+    return success_response(data=_public(record), message="annulation demandée", status_code=202)
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, HTTPException, Body,Query
+from fastapi import APIRouter, HTTPException, Body,Query, Depends
 from app.models import SurveyItem,ConsoleItem
 from app.models import TextInput,QuestionInput, LogItem
-from app.services.milvus_multilingual_service import MilvusMultilingualService
+from app.services.milvus_multilingual_service import MilvusMultilingualService, get_milvus_multilingual_service
+from app.services.sync_service import SYNC_SOURCES, ingest_source, sync_all_job
+from app.services.job_service import JobContext, get_job_manager
+from app.api.v1.jobs_route import _public
+from dataclasses import asdict
 from app.services.hive_service import fetch_consoles_to_create, fetch_logs, fetch_some_surveys,fetch_surveys_to_create,fetch_surveys_to_delete
-from app.agents.embedder import generate_embedding, generate_embedding_gemini
+from app.agents.embedder import generate_embedding, generate_embedding_gemini, query_embedding_cache
+from app.agents.batch_embedder import get_embedding_store
+from app.base.executor import run_blocking
 from app.exceptions.exceptions import *
 from app.core.responses import *
 from app.agents import *
@@ -21,21 +27,15 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-llm_manager = LLMManager([
-    # OllamaProvider(model="llama3.2"),
-    GeminiProvider(
-        model="gemini-2.5-pro",        # "gemini-2.5-flash"        
-        location="europe-west1"
-    ),
-    # OpenRouterProvider(model="mistralai/mixtral-8x7b", api_key="sk-...")
-])
+# providers, hedging et circuit breakers configurés dans settings (llm_*)
+llm_manager = get_llm_manager()
 
 router = APIRouter(prefix="/multilingual", tags=["multilingual"])
 
 @router.get("/initmilvus")
-async def init_milvus():
+async def init_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        MilvusMultilingualService()
+        milvus.ensure_schema()
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -44,12 +44,31 @@ async def init_milvus():
         raise Exception(str(e))
     
     
+@router.get("/milvus/health")
+def milvus_health(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
+    health = milvus.health()
+    status_code = 200 if health.get("status") == "ok" else 503
+    return success_response(data=health, status_code=status_code)
+
+@router.post("/milvus/reconnect")
+def milvus_reconnect(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
+    try:
+        milvus.reconnect()
+        return success_response(data=milvus.health(), message="milvus reconnected", status_code=200)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        import traceback
+        traceback_str = traceback.format_exc()
+        logger.warning(traceback_str)
+        raise Exception(str(e))
+    
 @router.get("/embedded")
 async def embed_gemini(input: Optional[TextInput] = Body(default=None)):
     try:
         if input is None:
             raise BadRequestException("Donnée manquant") 
-        data = generate_embedding_gemini(input.text)
+        data = await run_blocking("embedding", generate_embedding_gemini, input.text)
         return success_response(data=data, status_code=200)
     except HTTPException as he:
         raise he
@@ -60,6 +79,26 @@ async def embed_gemini(input: Optional[TextInput] = Body(default=None)):
         raise Exception(str(e))
 
 
+@router.get("/embedding_cache")
+def embedding_cache_stats():
+    return success_response(data=query_embedding_cache.stats(), status_code=200)
+
+@router.delete("/embedding_cache")
+def clear_embedding_cache():
+    query_embedding_cache.clear()
+    return success_response(message="embedding cache cleared", status_code=200)
+
+@router.get("/embedding_store")
+def embedding_store_stats():
+    store = get_embedding_store()
+    if store is None:
+        return success_response(data={"enabled": False}, status_code=200)
+    return success_response(data={"enabled": True, **store.stats()}, status_code=200)
+
+@router.get("/llm_providers")
+def llm_providers_stats():
+    return success_response(data=llm_manager.stats(), status_code=200)
+
 @router.get("/consoles_to_create")
 def read_consoles():
     try:
@@ -89,10 +128,10 @@ def read_surveys():
         raise Exception(str(e))
 
 @router.post("/clean_collection")
-def read_surveys():
+def read_surveys(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        MilvusMultilingualService()._clean_collection() 
-        MilvusMultilingualService()
+        milvus._clean_collection() 
+        milvus.ensure_schema()
         return success_response(message="collection cleaned successfully",status_code=201)
     except HTTPException as he:
         raise he
@@ -103,10 +142,10 @@ def read_surveys():
         raise Exception(str(e))
 
 @router.post("/clean_formation_collection")
-def read_surveys():
+def read_surveys(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        MilvusMultilingualService()._clean_formation_collection() 
-        MilvusMultilingualService()
+        milvus._clean_formation_collection() 
+        milvus.ensure_schema()
         return success_response(message="formation collection cleaned successfully",status_code=201)
     except HTTPException as he:
         raise he
@@ -117,9 +156,9 @@ def read_surveys():
         raise Exception(str(e))
     
 @router.post("/surveys_milvus")
-def update_surveys_milvus():
+def update_surveys_milvus(full: bool = False, milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService().bulk_insert_surveys_to_milvus()
+        message = milvus.bulk_insert_surveys_to_milvus(incremental=not full)
         return success_response(message=message,status_code=201)
     except HTTPException as he:
         raise he
@@ -130,9 +169,9 @@ def update_surveys_milvus():
         raise Exception(str(e))
 
 @router.post("/consoles_milvus")
-def update_consoles_milvus():
+def update_consoles_milvus(full: bool = False, milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService().bulk_insert_consoles_to_milvus()
+        message = milvus.bulk_insert_consoles_to_milvus(incremental=not full)
         return success_response(message=message,status_code=201)
     except HTTPException as he:
         raise he
@@ -143,9 +182,9 @@ def update_consoles_milvus():
         raise Exception(str(e))
     
 @router.post("/documents_milvus")
-def update_documents_milvus():
+def update_documents_milvus(full: bool = False, milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService().bulk_insert_documents_to_milvus()
+        message = milvus.bulk_insert_documents_to_milvus(incremental=not full)
         return success_response(message=message,status_code=201)
     except HTTPException as he:
         raise he
@@ -156,9 +195,9 @@ def update_documents_milvus():
         raise Exception(str(e))
 
 @router.post("/pages_milvus")
-def update_pages_milvus():
+def update_pages_milvus(full: bool = False, milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService().bulk_insert_pages_to_milvus()
+        message = milvus.bulk_insert_pages_to_milvus(incremental=not full)
         return success_response(message=message,status_code=201)
     except HTTPException as he:
         raise he
@@ -169,10 +208,60 @@ def update_pages_milvus():
         raise Exception(str(e))
         
 
+def ingest_job(ctx: JobContext) -> dict:
+    """
+    Job "ingest" (params: source, full) : checkpoint = dernier doc_id écrit avant le premier lot
+    en échec, la reprise repart de là (les lots en échec sont retentés, en incrémental les suivants
+    déjà écrits sont reconnus comme inchangés).
+    """
+    source = ctx.params.get("source")
+    if source not in SYNC_SOURCES:
+        raise ValueError(f"Source inconnue : {source}")
+
+    def progress(report):
+        ctx.set_progress(asdict(report))
+        if report.last_doc_id:
+            ctx.save_checkpoint({"after_id": report.last_doc_id})
+        ctx.raise_if_cancelled()
+
+    report = ingest_source(
+        source,
+        incremental=not ctx.params.get("full", False),
+        progress=progress,
+        after_id=ctx.checkpoint.get("after_id"),
+    )
+    return asdict(report)
+
+get_job_manager().register("ingest", ingest_job, max_concurrency=2)
+get_job_manager().register("sync_all", sync_all_job)
+
+
+@router.post("/sync_all")
+async def sync_all(sources: Optional[List[str]] = Query(None), full: bool = False):
+    """Soumet un job "sync_all" (toutes les sources en parallèle) à suivre via GET /sync_all/{job_id}."""
+    sources = list(sources or SYNC_SOURCES)
+    unknown = [s for s in sources if s not in SYNC_SOURCES]
+    if unknown:
+        raise BadRequestException(f"Sources inconnues : {unknown}")
+    record = await get_job_manager().submit("sync_all", {"sources": sources, "full": full})
+    return success_response(data=_public(record), message="sync lancé", status_code=202)
+
+@router.get("/sync_all")
+async def list_sync_jobs(limit: int = Query(20, ge=1, le=500)):
+    jobs = await get_job_manager().list("sync_all", None, limit)
+    return success_response(data=[_public(job) for job in jobs], status_code=200)
+
+@router.get("/sync_all/{job_id}")
+async def sync_job_status(job_id: str):
+    record = await get_job_manager().get(job_id)
+    if record is None or record.get("type") != "sync_all":
+        raise NotFoundException(f"Job {job_id} introuvable")
+    return success_response(data=_public(record), status_code=200)
+
 @router.get("/surveys_milvus")
-def read_surveys_milvus():
+def read_surveys_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        rows = MilvusMultilingualService().list_surveys()   
+        rows = milvus.list_surveys()   
         return success_response(data = rows,status_code=200)
     except HTTPException as he:
         raise he
@@ -183,9 +272,9 @@ def read_surveys_milvus():
         raise Exception(str(e))
 
 @router.get("/consoles_milvus") 
-def read_consoles_milvus():
+def read_consoles_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try: 
-        rows = MilvusMultilingualService().list_consoles()   
+        rows = milvus.list_consoles()   
         return success_response(data = rows,status_code=200)
     except HTTPException as he:
         raise he
@@ -196,9 +285,9 @@ def read_consoles_milvus():
         raise Exception(str(e))
 
 @router.get("/documents_milvus") 
-def read_documents_milvus():
+def read_documents_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try: 
-        rows = MilvusMultilingualService().list_documents()   
+        rows = milvus.list_documents()   
         return success_response(data = rows,status_code=200)
     except HTTPException as he:
         raise he  
@@ -209,9 +298,9 @@ def read_documents_milvus():
         raise Exception(str(e))
 
 @router.get("/pages_milvus") 
-def read_pages_milvus():
+def read_pages_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try: 
-        rows = MilvusMultilingualService().list_pages()   
+        rows = milvus.list_pages()   
         return success_response(data = rows,status_code=200)
     except HTTPException as he:
         raise he
@@ -222,9 +311,9 @@ def read_pages_milvus():
         raise Exception(str(e))
 
 @router.delete("/surveys_milvus")
-def delete_surveys_milvus():
+def delete_surveys_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService().delete_surveys_milvus()
+        message = milvus.delete_surveys_milvus()
         return success_response(message=message,status_code=200)
     except HTTPException as he:
         raise he
@@ -235,9 +324,9 @@ def delete_surveys_milvus():
         raise Exception(str(e))
 
 @router.delete("/consoles_milvus")
-def delete_consoles_milvus():
+def delete_consoles_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService().delete_consoles_milvus()
+        message = milvus.delete_consoles_milvus()
         return success_response(message=message,status_code=200)
     except HTTPException as he:
         raise he
@@ -248,9 +337,9 @@ def delete_consoles_milvus():
         raise Exception(str(e))
 
 @router.delete("/documents_milvus")
-def delete_documents_milvus():
+def delete_documents_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService().delete_documents_milvus()
+        message = milvus.delete_documents_milvus()
         return success_response(message=message,status_code=200)
     except HTTPException as he:
         raise he
@@ -261,9 +350,9 @@ def delete_documents_milvus():
         raise Exception(str(e))
 
 @router.delete("/consoles_partition")
-def delete_consoles_partition():
+def delete_consoles_partition(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService()._clean_console_partition()
+        message = milvus._clean_console_partition()
         return success_response(message=message,status_code=200)
     except HTTPException as he:
         raise he
@@ -274,9 +363,9 @@ def delete_consoles_partition():
         raise Exception(str(e))
     
 @router.delete("/documents_partition")
-def delete_documents_partition():
+def delete_documents_partition(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService()._clean_document_partition()
+        message = milvus._clean_document_partition()
         return success_response(message=message,status_code=200)
     except HTTPException as he:
         raise he
@@ -1,22 +1,28 @@
 from fastapi import APIRouter, HTTPException, Query
-from app.models.job import Job
-from app.services.renderer_service import render_page
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from contextlib import aclosing
+from datetime import datetime, timezone
+from app.models.job import BatchRenderRequest, Job
+from app.base.db import get_db
+from app.core import settings
+from app.services.browser_pool import get_browser_pool
+from app.services.job_service import JobContext, get_job_manager
+from app.services.render_cache import get_render_cache
+from app.services.renderer_service import DEFAULT_SELECTOR, content_id, extract_cached, render_many
 from app.exceptions import RenderError
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
-from typing import Optional, Literal
-import hashlib
+from typing import AsyncIterator, Optional, Literal
+import json
+import time
 
 router = APIRouter()
 
-DEFAULT_UA = (
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-)
-
-DEFAULT_SELECTOR = ".resource-guide-content-area, #main_pane_container"
+RENDER_RESULTS_COLLECTION = "render_results"
+# progression d'un job render_batch écrite au plus une fois par intervalle
+_PROGRESS_INTERVAL_SECONDS = 1.0
 
 @router.post("/render/extract")
-def render_and_extract(
+async def render_and_extract(
     job: Job,
     selector: Optional[str] = Query(
         default=None,
@@ -26,99 +32,117 @@ def render_and_extract(
         default="inner_html",
         description="inner_html (défaut) ou inner_text"
     ),
+    render: Optional[Literal["full", "light"]] = Query(
+        default=None,
+        description="full : page complète ; light : images/médias/polices/tiers bloqués, attente \"contenu stable\" (défaut: settings.render_default_mode)"
+    ),
+    refresh: bool = Query(
+        default=False,
+        description="true : ignore le cache des rendus et re-rend la page"
+    ),
 ):
     url = str(job.url)
     sel = selector.strip() if selector else DEFAULT_SELECTOR
     wait_ms = int(job.wait_ms or 0)
     timeout_ms = int(job.timeout_ms or 100000)
     # timeout_ms = int(1000)
+    return await extract_cached(url, sel, mode, wait_ms, timeout_ms, render or settings.render_default_mode, refresh=refresh)
+
+
+@router.get("/render/pool")
+def browser_pool_stats():
+    """Métriques du pool Chromium : file d'attente, pages en cours, recyclages."""
+    return get_browser_pool().stats()
+
+
+@router.get("/render/cache")
+def render_cache_stats():
+    cache = get_render_cache()
+    return {"enabled": cache is not None, **(cache.stats() if cache is not None else {})}
+
+
+@router.delete("/render/cache")
+def clear_render_cache():
+    cache = get_render_cache()
+    if cache is not None:
+        cache.clear()
+    return {"status": "success", "message": "render cache cleared"}
+
+
+def _ndjson(obj) -> str:
+    return json.dumps(jsonable_encoder(obj), ensure_ascii=False) + "\n"
+
+
+def _check_batch(req: BatchRenderRequest) -> str:
+    if len(req.jobs) > settings.render_batch_max_jobs:
+        raise HTTPException(status_code=400, detail=f"Au plus {settings.render_batch_max_jobs} jobs par lot")
+    return req.selector.strip() if req.selector else DEFAULT_SELECTOR
+
+
+@router.post("/render/batch")
+async def render_batch(req: BatchRenderRequest):
+    """
+    Rend plusieurs pages en parallèle (pool Chromium, limites par hôte) et renvoie
+    une ligne NDJSON par page dès qu'elle est prête, dans l'ordre d'arrivée.
+    Pour des centaines d'URL : POST /jobs {"type": "render_batch", "params": <body>},
+    puis GET /render/batch/{job_id}/results.
+    """
+    sel = _check_batch(req)
+
+    async def lines() -> AsyncIterator[str]:
+        async with aclosing(render_many(req.jobs, sel, req.mode, render=req.render or settings.render_default_mode, refresh=req.refresh, concurrency=req.concurrency)) as results:
+            async for result in results:
+                yield _ndjson(result)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+
+async def render_batch_job(ctx: JobContext) -> dict:
+    """
+    Job "render_batch" : chaque page est écrite dans render_results. À la reprise, les pages
+    déjà rendues avec succès sont relues dans render_results (pas de checkpoint par page),
+    celles en échec sont retentées.
+    """
+    req = BatchRenderRequest(**ctx.params)
+    sel = _check_batch(req)
+    collection = get_db()[RENDER_RESULTS_COLLECTION]
+    done = {doc["id"] async for doc in collection.find({"job_id": ctx.job_id, "status": "success"}, {"id": 1})}
+    failed = set()
+    todo = [job for job in req.jobs if content_id(str(job.url)) not in done]
+    last_progress = 0.0
+
+    async with aclosing(render_many(todo, sel, req.mode, render=req.render or settings.render_default_mode, refresh=req.refresh, concurrency=req.concurrency)) as results:
+        async for result in results:
+            await collection.replace_one(
+                {"_id": f"{ctx.job_id}:{result['id']}"},
+                {**result, "job_id": ctx.job_id, "rendered_at": datetime.now(timezone.utc)},
+                upsert=True,
+            )
+            if result.get("status") == "success":
+                done.add(result["id"])
+                failed.discard(result["id"])
+            else:
+                failed.add(result["id"])
+            if time.monotonic() - last_progress >= _PROGRESS_INTERVAL_SECONDS:
+                last_progress = time.monotonic()
+                ctx.set_progress({"done": len(done), "total": len(req.jobs), "failed": len(failed)})
+            ctx.raise_if_cancelled()
+
+    ctx.set_progress({"done": len(done), "total": len(req.jobs), "failed": len(failed)})
+    return {"total": len(req.jobs), "rendered": len(done), "failed": len(failed), "collection": RENDER_RESULTS_COLLECTION}
+
+get_job_manager().register("render_batch", render_batch_job)
+
+
+@router.get("/render/batch/{job_id}/results")
+async def render_batch_results(job_id: str, status: Optional[Literal["success", "fail"]] = None):
+    """Résultats d'un job render_batch en NDJSON (une ligne par page)."""
+    query = {"job_id": job_id}
+    if status:
+        query["status"] = status
+
+    async def lines() -> AsyncIterator[str]:
+        async for doc in get_db()[RENDER_RESULTS_COLLECTION].find(query, {"_id": 0}):
+            yield _ndjson(doc)
 
-    try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True, args=["--no-sandbox"])
-            context = browser.new_context(user_agent=DEFAULT_UA, viewport={"width": 1366, "height": 900})
-            page = context.new_page()
-
-            try:
-                page.goto(url, timeout=timeout_ms, wait_until="domcontentloaded")
-            except PWTimeoutError:
-                browser.close()
-                raise HTTPException(status_code=504, detail={
-                    "status": "fail", "message": f"Timeout during navigation to {url}", "step": "goto"
-                })
-
-            try:
-                page.wait_for_selector(sel, state="attached", timeout=15000)
-            except PWTimeoutError:
-                browser.close()
-                raise HTTPException(status_code=504, detail={
-                    "status": "fail", "message": f"Selector not found: {sel}", "step": "wait_for_selector"
-                })
-
-            readiness_js = r"""
-(p) => {
-  const el = document.querySelector(p.sel);
-  if (!el) return false;
-  const text = el.innerText || "";
-  const html = el.innerHTML || "";
-  const hasLoadingText = /loading\.\.\./i.test(text);
-  const hasSpinner = html.includes("<svg") && html.toLowerCase().includes("animate");
-  if (hasLoadingText || hasSpinner) return false;
-  const hasBlocks = el.querySelector("h1,h2,h3,p,article,section") !== null;
-  const hasLinks = el.querySelectorAll("a").length >= 3;
-  const htmlLongEnough = html.replace(/\s+/g, "").length > 2000;
-  return hasBlocks || hasLinks || htmlLongEnough;
-}
-"""
-            try:
-                page.wait_for_function(readiness_js, arg={"sel": sel}, timeout=timeout_ms)
-            except PWTimeoutError:
-                page.wait_for_timeout(3000)
-                try:
-                    page.wait_for_function(readiness_js, {"sel": sel}, timeout=5000)
-                except PWTimeoutError:
-                    browser.close()
-                    raise HTTPException(status_code=504, detail={
-                        "status": "fail",
-                        "message": f"Content still loading for selector: {sel}",
-                        "step": "wait_for_function"
-                    })
-
-            if wait_ms > 0:
-                page.wait_for_timeout(wait_ms)
-
-            extract_js = """
-(p) => {
-  const el = document.querySelector(p.sel);
-  if (!el) return { ok: false, reason: "not_found" };
-  if (p.mode === "inner_text") return { ok: true, content: el.innerText };
-  return { ok: true, content: el.innerHTML };
-}
-"""
-            result = page.evaluate(extract_js, {"sel": sel, "mode": mode})
-
-            browser.close()
-
-            if not result or not result.get("ok"):
-                raise HTTPException(status_code=422, detail={
-                    "status": "fail", "message": f"Extraction failed for selector: {sel}",
-                    "step": "evaluate", "reason": result.get("reason") if isinstance(result, dict) else "unknown"
-                })
-
-            content_id = hashlib.sha1(url.encode("utf-8")).hexdigest()
-            return {
-                "status": "success",
-                "id": content_id,
-                "url": url,
-                "selector_used": sel,
-                "mode": mode,
-                "html": result["content"] if mode == "inner_html" else None,
-                "text": result["content"] if mode == "inner_text" else None,
-            }
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail={
-            "status": "fail", "message": f"Unexpected error rendering {url}: {e!r}", "step": "unhandled"
-        })
\ No newline at end of file
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException, Body,Query
+from fastapi import APIRouter, HTTPException, Body,Query, Depends
 from app.models import SurveyItem,ConsoleItem
 from app.models import TextInput,QuestionInput, LogItem
-from app.services.milvus_multilingual_service import MilvusMultilingualService
+from app.services.milvus_multilingual_service import MilvusMultilingualService, get_milvus_multilingual_service
 from app.services.hive_service import fetch_consoles_to_create, fetch_logs, fetch_some_surveys,fetch_surveys_to_create,fetch_surveys_to_delete
 from app.agents.embedder import generate_embedding, generate_embedding_gemini
+from app.base.executor import run_blocking
 from app.exceptions.exceptions import *
 from app.core.responses import *
 from app.agents import *
@@ -21,20 +22,15 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-llm_manager = LLMManager([
-    # OllamaProvider(model="llama3.2"),
-    GeminiProvider(
-        model="gemini-2.5-pro",        # "gemini-2.5-flash"        
-        location="europe-west1"
-    ),
-    # OpenRouterProvider(model="mistralai/mixtral-8x7b", api_key="sk-...")
-])
+# providers, hedging et circuit breakers configurés dans settings (llm_*)
+llm_manager = get_llm_manager()
 
 @router.get("/generate")
 async def generate(
     input: Optional[QuestionInput] = Body(default = None),
     provider: str = Query("vertex-gemini"),
-    temperature: float = Query(0.7)
+    temperature: float = Query(0.7),
+    milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)
 ): 
     try:
         if input is None:
@@ -52,7 +48,7 @@ async def generate(
     }
         ]
 
-        search_results = MilvusMultilingualService().search(input.question,input.user)
+        search_results = await milvus.asearch(input.question,input.user)
         response = search_results
         prompt = PromptFactory.get_navigation_prompt(input.question, search_results)
         response = await llm_manager.generate(prompt, provider_name=provider, temperature=temperature)
@@ -66,9 +62,9 @@ async def generate(
         raise Exception(str(e))
 
 @router.get("/initmilvus")
-async def init_milvus():
+async def init_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        MilvusMultilingualService()
+        milvus.ensure_schema()
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -81,7 +77,7 @@ async def embed(input: Optional[TextInput] = Body(default=None)):
     try:
         if input is None:
             raise BadRequestException("Donnée manquant")
-        data = generate_embedding(input.text)
+        data = await run_blocking("embedding", generate_embedding, input.text)
         return success_response(data=data, status_code=200)
     except HTTPException as he:
         raise he
@@ -96,7 +92,7 @@ async def embed_gemini(input: Optional[TextInput] = Body(default=None)):
     try:
         if input is None:
             raise BadRequestException("Donnée manquant") 
-        data = generate_embedding_gemini(input.text)
+        data = await run_blocking("embedding", generate_embedding_gemini, input.text)
         return success_response(data=data, status_code=200)
     except HTTPException as he:
         raise he
@@ -136,10 +132,10 @@ def read_surveys():
         raise Exception(str(e))
 
 @router.post("/clean_collection")
-def read_surveys():
+def read_surveys(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        MilvusMultilingualService()._clean_collection() 
-        MilvusMultilingualService()
+        milvus._clean_collection() 
+        milvus.ensure_schema()
         return success_response(message="collection cleaned successfully",status_code=201)
     except HTTPException as he:
         raise he
@@ -150,10 +146,10 @@ def read_surveys():
         raise Exception(str(e))
 
 @router.post("/clean_formation_collection")
-def read_surveys():
+def read_surveys(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        MilvusMultilingualService()._clean_formation_collection() 
-        MilvusMultilingualService()
+        milvus._clean_formation_collection() 
+        milvus.ensure_schema()
         return success_response(message="formation collection cleaned successfully",status_code=201)
     except HTTPException as he:
         raise he
@@ -164,9 +160,9 @@ def read_surveys():
         raise Exception(str(e))
     
 @router.post("/surveys_milvus")
-def update_surveys_milvus():
+def update_surveys_milvus(full: bool = False, milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService().bulk_insert_surveys_to_milvus()
+        message = milvus.bulk_insert_surveys_to_milvus(incremental=not full)
         return success_response(message=message,status_code=201)
     except HTTPException as he:
         raise he
@@ -177,9 +173,9 @@ def update_surveys_milvus():
         raise Exception(str(e))
 
 @router.post("/consoles_milvus")
-def update_consoles_milvus():
+def update_consoles_milvus(full: bool = False, milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService().bulk_insert_consoles_to_milvus()
+        message = milvus.bulk_insert_consoles_to_milvus(incremental=not full)
         return success_response(message=message,status_code=201)
     except HTTPException as he:
         raise he
@@ -190,9 +186,9 @@ def update_consoles_milvus():
         raise Exception(str(e))
     
 @router.post("/documents_milvus")
-def update_documents_milvus():
+def update_documents_milvus(full: bool = False, milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService().bulk_insert_documents_to_milvus()
+        message = milvus.bulk_insert_documents_to_milvus(incremental=not full)
         return success_response(message=message,status_code=201)
     except HTTPException as he:
         raise he
@@ -203,9 +199,9 @@ def update_documents_milvus():
         raise Exception(str(e))
 
 @router.post("/pages_milvus")
-def update_pages_milvus():
+def update_pages_milvus(full: bool = False, milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService().bulk_insert_pages_to_milvus()
+        message = milvus.bulk_insert_pages_to_milvus(incremental=not full)
         return success_response(message=message,status_code=201)
     except HTTPException as he:
         raise he
@@ -217,9 +213,9 @@ def update_pages_milvus():
         
 
 @router.get("/surveys_milvus")
-def read_surveys_milvus():
+def read_surveys_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        rows = MilvusMultilingualService().list_surveys()   
+        rows = milvus.list_surveys()   
         return success_response(data = rows,status_code=200)
     except HTTPException as he:
         raise he
@@ -230,9 +226,9 @@ def read_surveys_milvus():
         raise Exception(str(e))
 
 @router.get("/consoles_milvus") 
-def read_consoles_milvus():
+def read_consoles_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try: 
-        rows = MilvusMultilingualService().list_consoles()   
+        rows = milvus.list_consoles()   
         return success_response(data = rows,status_code=200)
     except HTTPException as he:
         raise he
@@ -243,9 +239,9 @@ def read_consoles_milvus():
         raise Exception(str(e))
 
 @router.get("/documents_milvus") 
-def read_documents_milvus():
+def read_documents_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try: 
-        rows = MilvusMultilingualService().list_documents()   
+        rows = milvus.list_documents()   
         return success_response(data = rows,status_code=200)
     except HTTPException as he:
         raise he  
@@ -256,9 +252,9 @@ def read_documents_milvus():
         raise Exception(str(e))
 
 @router.get("/pages_milvus") 
-def read_pages_milvus():
+def read_pages_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try: 
-        rows = MilvusMultilingualService().list_pages()   
+        rows = milvus.list_pages()   
         return success_response(data = rows,status_code=200)
     except HTTPException as he:
         raise he
@@ -269,9 +265,9 @@ def read_pages_milvus():
         raise Exception(str(e))
 
 @router.delete("/surveys_milvus")
-def delete_surveys_milvus():
+def delete_surveys_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService().delete_surveys_milvus()
+        message = milvus.delete_surveys_milvus()
         return success_response(message=message,status_code=200)
     except HTTPException as he:
         raise he
@@ -282,9 +278,9 @@ def delete_surveys_milvus():
         raise Exception(str(e))
 
 @router.delete("/consoles_milvus")
-def delete_consoles_milvus():
+def delete_consoles_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService().delete_consoles_milvus()
+        message = milvus.delete_consoles_milvus()
         return success_response(message=message,status_code=200)
     except HTTPException as he:
         raise he
@@ -295,9 +291,9 @@ def delete_consoles_milvus():
         raise Exception(str(e))
 
 @router.delete("/documents_milvus")
-def delete_documents_milvus():
+def delete_documents_milvus(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService().delete_documents_milvus()
+        message = milvus.delete_documents_milvus()
         return success_response(message=message,status_code=200)
     except HTTPException as he:
         raise he
@@ -308,9 +304,9 @@ def delete_documents_milvus():
         raise Exception(str(e))
 
 @router.delete("/consoles_partition")
-def delete_consoles_partition():
+def delete_consoles_partition(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService()._clean_console_partition()
+        message = milvus._clean_console_partition()
         return success_response(message=message,status_code=200)
     except HTTPException as he:
         raise he
@@ -321,9 +317,9 @@ def delete_consoles_partition():
         raise Exception(str(e))
     
 @router.delete("/documents_partition")
-def delete_documents_partition():
+def delete_documents_partition(milvus: MilvusMultilingualService = Depends(get_milvus_multilingual_service)):
     try:
-        message = MilvusMultilingualService()._clean_document_partition()
+        message = milvus._clean_document_partition()
         return success_response(message=message,status_code=200)
     except HTTPException as he:
         raise he
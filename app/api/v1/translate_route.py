@@ -1,10 +1,15 @@
 from fastapi import APIRouter, HTTPException, Body,Query
-import os, json, re, hashlib
+import os, json, re, hashlib, threading
 from google.cloud import translate_v3 as translate
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from fastapi.responses import FileResponse, JSONResponse
 from pathlib import Path
+from app.services.job_service import JobContext, get_job_manager
+from app.base.clients import get_clients
+from app.core import settings
+from app.utils.translation_memory import NamespaceMemory, TranslationMemory
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -48,7 +53,7 @@ def thaw_tokens(s: str, tokens: List[str]) -> str:
 def g_translate(texts: List[str], target: str, source: str) -> List[str]:
     if not texts:
         return []
-    client = translate.TranslationServiceClient()
+    client = get_clients().translate()
     parent = f"projects/{os.getenv('GCP_PROJECT_ID')}/locations/{os.getenv('GCP_TRANSLATE_LOCATION','global')}"
     resp = client.translate_text(
         contents=texts, mime_type="text/plain",
@@ -57,56 +62,161 @@ def g_translate(texts: List[str], target: str, source: str) -> List[str]:
     )
     return [t.translated_text for t in resp.translations]
 
-def translate_string(value: str, target: str, source: str) -> str:
-    frozen, toks = freeze_tokens(value)
-    out = g_translate([frozen], target, source)[0]
-    return thaw_tokens(out, toks)
+class _Pending:
+    """Feuille à traduire, remplacée par sa traduction au second passage (resolve_translations)."""
+    __slots__ = ("text",)
 
-def deep_merge_translate(fr_obj: Any, tgt_obj: Any, target: str, source: str, mode: str, report: dict):
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _translate_leaf(fr_value: Any, tgt_value: Any, mode: str, report: dict, memory: Optional[NamespaceMemory], path: tuple):
+    """
+    Feuille traduisible (chaîne ou liste de chaînes) :
+    - nouvelle (absente/vide côté cible) -> traduite
+    - stale (hash FR différent de celui mémorisé) -> retraduite
+    - à jour (hash FR identique) -> conservée, même en mode 'all'
+    Sans entrée mémoire, 'missing' garde la traduction existante et 'all' la retraduit.
+    """
+    size = len(fr_value) if isinstance(fr_value, list) else 1
+    if isinstance(fr_value, list):
+        present = isinstance(tgt_value, list) and len(tgt_value) == len(fr_value)
+    else:
+        present = isinstance(tgt_value, str) and bool(tgt_value.strip())
+    h = hash_fr(fr_value)
+    entry = memory.get(path) if memory is not None else None
+
+    if present:
+        if entry is not None and entry[0] == h:
+            report["unchanged_count"] += size
+            return tgt_value
+        if entry is None and mode == "missing":
+            if memory is not None:
+                # traduction antérieure à la mémoire : supposée à jour, sert de référence
+                memory.record(path, h, tgt_value)
+            return tgt_value  # garde la trad existante
+        if entry is not None:
+            report["stale_count"] += size
+    else:
+        report["new_count"] += size
+
+    report["translated_count"] += size
+    pending = [_Pending(x) for x in fr_value] if isinstance(fr_value, list) else _Pending(fr_value)
+    if memory is not None:
+        memory.record(path, h, pending)
+    return pending
+
+
+def deep_merge_translate(fr_obj: Any, tgt_obj: Any, target: str, source: str, mode: str, report: dict,
+                         memory: Optional[NamespaceMemory] = None, path: tuple = ()):
     """
-    mode: 'missing' -> traduit uniquement les clés absentes ou vides
-          'all'     -> retraduit toutes les chaînes (écrase)
+    Premier passage : fusionne FR et cible, les chaînes à traduire deviennent des _Pending.
+    mode: 'missing' -> traduit les clés absentes, vides ou stale
+          'all'     -> retraduit toutes les chaînes, sauf celles à jour d'après la mémoire
+    memory: mémoire de traduction du (namespace, cible), None = pas de détection stale
     report: collecte ce qui a été créé/mis à jour
     """
     if isinstance(fr_obj, dict):
         out = {} if not isinstance(tgt_obj, dict) else dict(tgt_obj)
         for k, v in fr_obj.items():
             cur = tgt_obj.get(k) if isinstance(tgt_obj, dict) else None
-            out[k] = deep_merge_translate(v, cur, target, source, mode, report)
+            out[k] = deep_merge_translate(v, cur, target, source, mode, report, memory, path + (k,))
         return out
 
     if isinstance(fr_obj, list):
-        # On traduit élément par élément si ce sont des chaînes.
+        # liste de chaînes : traduite (ou conservée) d'un bloc
         if all(isinstance(x, str) for x in fr_obj):
-            # garde cible s’il existe en list, sinon traduit tout
-            if isinstance(tgt_obj, list) and len(tgt_obj) == len(fr_obj) and mode == "missing":
-                return tgt_obj
-            translated = [translate_string(x, target, source) for x in fr_obj]
-            report["translated_count"] += len(translated)
-            return translated
+            return _translate_leaf(fr_obj, tgt_obj, mode, report, memory, path)
         # récursif sinon
         res = []
         tgt_list = tgt_obj if isinstance(tgt_obj, list) else [None]*len(fr_obj)
         for i, v in enumerate(fr_obj):
-            res.append(deep_merge_translate(v, tgt_list[i] if i < len(tgt_list) else None, target, source, mode, report))
+            res.append(deep_merge_translate(v, tgt_list[i] if i < len(tgt_list) else None, target, source, mode, report, memory, path + (i,)))
         return res
 
     if isinstance(fr_obj, str):
-        if mode == "missing":
-            if isinstance(tgt_obj, str) and tgt_obj.strip():
-                return tgt_obj  # garde la trad existante
-            translated = translate_string(fr_obj, target, source)
-            report["translated_count"] += 1
-            return translated
-        else:  # mode == "all"
-            translated = translate_string(fr_obj, target, source)
-            report["translated_count"] += 1
-            return translated
+        return _translate_leaf(fr_obj, tgt_obj, mode, report, memory, path)
 
     # types non string (nombre, bool…), on recopie
     return tgt_obj if tgt_obj is not None else fr_obj
 
 
+def collect_pending(obj: Any, out: set) -> set:
+    if isinstance(obj, _Pending):
+        out.add(obj.text)
+    elif isinstance(obj, dict):
+        for v in obj.values():
+            collect_pending(v, out)
+    elif isinstance(obj, list):
+        for v in obj:
+            collect_pending(v, out)
+    return out
+
+
+def resolve_translations(obj: Any, translations: Dict[str, str]) -> Any:
+    """Second passage : remplace chaque _Pending par sa traduction."""
+    if isinstance(obj, _Pending):
+        return translations.get(obj.text, obj.text)
+    if isinstance(obj, dict):
+        return {k: resolve_translations(v, translations) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [resolve_translations(v, translations) for v in obj]
+    return obj
+
+
+def _batches(texts: List[str], max_items: int, max_chars: int) -> List[List[str]]:
+    """Lots maximaux pour translate_text : au plus max_items chaînes et ~max_chars caractères."""
+    batches: List[List[str]] = []
+    current: List[str] = []
+    chars = 0
+    for t in texts:
+        if current and (len(current) >= max_items or chars + len(t) > max_chars):
+            batches.append(current)
+            current, chars = [], 0
+        current.append(t)
+        chars += len(t)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def translate_unique(texts_by_target: Dict[str, set], source: str, on_batch=None) -> Tuple[Dict[str, Dict[str, str]], dict]:
+    """
+    Traduit les chaînes uniques de chaque langue cible : tokens gelés, lots maximaux,
+    lots de toutes les cibles en parallèle. Renvoie {cible: {texte FR: traduction}}.
+    """
+    results: Dict[str, Dict[str, str]] = {tgt: {} for tgt in texts_by_target}
+    jobs = []
+    for tgt, texts in texts_by_target.items():
+        # dédoublonné après gel : "Bonjour {{name}}" et "Bonjour {{user}}" partagent une traduction
+        frozen: Dict[str, List[Tuple[str, List[str]]]] = {}
+        for text in sorted(texts):
+            if not text.strip():
+                results[tgt][text] = text
+                continue
+            f, toks = freeze_tokens(text)
+            frozen.setdefault(f, []).append((text, toks))
+        for batch in _batches(list(frozen), settings.i18n_translate_batch_size, settings.i18n_translate_batch_chars):
+            jobs.append((tgt, [(f, frozen[f]) for f in batch]))
+
+    def _run(tgt, items):
+        out = g_translate([f for f, _ in items], tgt, source)
+        return tgt, {text: thaw_tokens(o, toks) for (_, originals), o in zip(items, out) for text, toks in originals}
+
+    if jobs:
+        with ThreadPoolExecutor(max_workers=min(len(jobs), settings.i18n_translate_concurrency), thread_name_prefix="i18n") as pool:
+            for fut in as_completed([pool.submit(_run, tgt, items) for tgt, items in jobs]):
+                tgt, translated = fut.result()
+                results[tgt].update(translated)
+                if on_batch is not None:
+                    on_batch()
+    stats = {
+        "unique_strings": sum(len(items) for _, items in jobs),
+        "requests": len(jobs),
+    }
+    return results, stats
+
+
 def count_translatable(fr_obj: Any, tgt_obj: Any) -> tuple[int, int]:
     """
     Retourne (total_fr_strings, filled_target_strings).
@@ -157,33 +267,47 @@ def count_translatable(fr_obj: Any, tgt_obj: Any) -> tuple[int, int]:
 
 translate_router = APIRouter()
 
-@translate_router.post("/i18n/translate")
-def translate_namespaces(payload: dict):
+_memory: Optional[TranslationMemory] = None
+_memory_lock = threading.Lock()
+
+def get_translation_memory() -> Optional[TranslationMemory]:
+    global _memory
+    if not settings.i18n_memory_enabled:
+        return None
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                path = Path(settings.i18n_memory_path or LOCALES_DIR / ".translation_memory.sqlite")
+                path.parent.mkdir(parents=True, exist_ok=True)
+                _memory = TranslationMemory(str(path))
+    return _memory
+
+def run_translate(payload: dict, done=(), on_namespace=None, on_batch=None) -> dict:
     """
-    Body:
-    {
-      "namespaces": ["common","topbar"],  // si vide -> tous les fichiers dans locales/fr
-      "from": "fr",
-      "to": ["en","mg"],
-      "mode": "missing" | "all",          // défaut: missing
-      "dry_run": false                    // si true: n’écrit pas, renvoie juste le report
-    }
+    Traduit les namespaces demandés. `done` : paires (ns, cible) déjà traitées (reprise d'un job),
+    `on_namespace(ns, cible, entrée)` est appelé après chaque fichier écrit, `on_batch()` après
+    chaque lot envoyé à Translate.
     """
     ns_list = payload.get("namespaces") or []
     src = payload.get("from") or "fr"
     targets = payload.get("to") or ["en","mg"]
     mode = payload.get("mode") or "missing"
     dry_run = bool(payload.get("dry_run", False))
+    force = bool(payload.get("force", False))
+    memory = get_translation_memory()
 
     src_dir = LOCALES_DIR / src
     if not src_dir.exists():
-        return JSONResponse({"error":"source locale not found"}, status_code=400)
+        raise HTTPException(status_code=400, detail="source locale not found")
  
     # si namespaces non fournis, prends tous les *.json de la source
     if not ns_list:
         ns_list = [p.stem for p in src_dir.glob("*.json")]
 
-    summary = []
+    done = {tuple(d) for d in done}
+    # 1er passage : fusion de tous les fichiers, chaînes à traduire collectées par langue cible
+    planned = []
+    texts_by_target: Dict[str, set] = {tgt: set() for tgt in targets}
     for ns in ns_list:
         src_path = src_dir / f"{ns}.json"
         if not src_path.exists():
@@ -192,24 +316,78 @@ def translate_namespaces(payload: dict):
             fr_json = json.load(f)
 
         for tgt in targets:
+            if (ns, tgt) in done:
+                continue
             tgt_dir = LOCALES_DIR / tgt
-            tgt_dir.mkdir(parents=True, exist_ok=True)
             tgt_path = tgt_dir / f"{ns}.json"
             tgt_json = {}
             if tgt_path.exists():
                 with open(tgt_path, "r", encoding="utf-8") as f:
                     tgt_json = json.load(f)
 
-            report = {"namespace": ns, "target": tgt, "translated_count": 0}
-            merged = deep_merge_translate(fr_json, tgt_json, tgt, src, mode, report)
+            report = {"namespace": ns, "target": tgt, "translated_count": 0,
+                      "new_count": 0, "stale_count": 0, "unchanged_count": 0}
+            ns_memory = NamespaceMemory(memory, ns, tgt, load=not force)
+            merged = deep_merge_translate(fr_json, tgt_json, tgt, src, "all" if force else mode, report, ns_memory)
+            collect_pending(merged, texts_by_target[tgt])
+            planned.append((ns, tgt, tgt_path, merged, report, ns_memory))
 
-            if not dry_run:
-                with open(tgt_path, "w", encoding="utf-8") as f:
-                    json.dump(merged, f, ensure_ascii=False, indent=2)
+    # traduction groupée : chaque chaîne unique une seule fois par cible
+    translations, stats = translate_unique(texts_by_target, src, on_batch)
 
-            summary.append({**report, "path": str(tgt_path)})
+    # 2e passage : écriture des traductions dans chaque arbre
+    summary = []
+    for ns, tgt, tgt_path, merged, report, ns_memory in planned:
+        merged = resolve_translations(merged, translations[tgt])
+        if not dry_run:
+            tgt_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tgt_path, "w", encoding="utf-8") as f:
+                json.dump(merged, f, ensure_ascii=False, indent=2)
+            # mémoire écrite après le fichier : une reprise de job ne voit jamais une clé "à jour" non écrite
+            ns_memory.flush(lambda v: resolve_translations(v, translations[tgt]))
+
+        entry = {**report, "path": str(tgt_path)}
+        summary.append(entry)
+        if on_namespace is not None:
+            on_namespace(ns, tgt, entry)
+
+    totals = {f"{k}_total": sum(e[f"{k}_count"] for e in summary) for k in ("new", "stale", "unchanged")}
+    return {"ok": True, "mode": mode, "dry_run": dry_run, "force": force, "changes": summary, **totals, **stats}
+
+def translate_job(ctx: JobContext) -> dict:
+    """Job "i18n_translate" : checkpoint = paires (namespace, cible) déjà écrites."""
+    done = [tuple(d) for d in ctx.checkpoint.get("done", [])]
+    previous = list(ctx.checkpoint.get("changes", []))
+
+    def on_namespace(ns, tgt, entry):
+        done.append((ns, tgt))
+        previous.append(entry)
+        ctx.save_checkpoint({"done": done, "changes": previous})
+        ctx.raise_if_cancelled()
+
+    result = run_translate(ctx.params, done=done, on_namespace=on_namespace, on_batch=ctx.raise_if_cancelled)
+    return {**result, "changes": previous}
+
+get_job_manager().register("i18n_translate", translate_job)
 
-    return {"ok": True, "mode": mode, "dry_run": dry_run, "changes": summary}
+@translate_router.post("/i18n/translate")
+def translate_namespaces(payload: dict):
+    """
+    Body:
+    {
+      "namespaces": ["common","topbar"],  // si vide -> tous les fichiers dans locales/fr
+      "from": "fr",
+      "to": ["en","mg"],
+      "mode": "missing" | "all",          // défaut: missing ; les clés stale sont retraduites dans les deux cas
+      "dry_run": false,                   // si true: n’écrit pas, renvoie juste le report
+      "force": false                      // si true: ignore la mémoire de traduction et retraduit tout
+    }
+    Pour un gros lot : POST /jobs {"type": "i18n_translate", "params": <body>}.
+    """
+    try:
+        return run_translate(payload)
+    except HTTPException as he:
+        return JSONResponse({"error": he.detail}, status_code=he.status_code)
 
 @translate_router.get("/i18n/locales/{lng}/{ns}.json")
 def get_locale(lng: str, ns: str):
@@ -0,0 +1,157 @@
+from __future__ import annotations
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+
+try:
+    import h2  # noqa: F401  (HTTP/2 de httpx, optionnel)
+    _HTTP2 = True
+except Exception:
+    _HTTP2 = False
+
+try:
+    from google.cloud import translate_v3 as translate
+except Exception:
+    translate = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    """
+    Clients réseau partagés par tout le process, créés une fois (au démarrage ou au
+    premier appel) et réutilisés : pools keep-alive httpx (HTTP/2 si `h2` est installé),
+    un genai.Client par (projet, région) sur son propre pool httpx (délai llm_timeout_seconds),
+    un TranslationServiceClient (canal gRPC).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._http: Optional[httpx.AsyncClient] = None
+        self._http_sync: Optional[httpx.Client] = None
+        self._http_genai: Optional[httpx.Client] = None
+        self._genai: Dict[Tuple[str, str], object] = {}
+        self._translate = None
+        self._translate_async = None
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry_seconds,
+        )
+
+    def http(self) -> httpx.AsyncClient:
+        """Client async (mWater, OpenRouter)."""
+        if self._http is None:
+            with self._lock:
+                if self._http is None:
+                    self._http = httpx.AsyncClient(http2=_HTTP2, limits=self._limits(), timeout=settings.http_timeout_seconds)
+        return self._http
+
+    def http_sync(self) -> httpx.Client:
+        """Client sync, thread-safe, pour les appels HTTP exécutés dans les pools de run_blocking."""
+        if self._http_sync is None:
+            with self._lock:
+                if self._http_sync is None:
+                    self._http_sync = httpx.Client(http2=_HTTP2, limits=self._limits(), timeout=settings.http_timeout_seconds)
+        return self._http_sync
+
+    def http_genai(self) -> httpx.Client:
+        """Client sync des genai.Client : une génération Gemini dépasse largement http_timeout_seconds."""
+        if self._http_genai is None:
+            with self._lock:
+                if self._http_genai is None:
+                    self._http_genai = httpx.Client(http2=_HTTP2, limits=self._limits(), timeout=settings.llm_timeout_seconds)
+        return self._http_genai
+
+    def genai(self, project: Optional[str] = None, location: str = "us-central1"):
+        from google import genai
+        from google.genai.types import HttpOptions
+
+        project = project or os.getenv("GCP_PROJECT_ID")
+        key = (project or "", location)
+        client = self._genai.get(key)
+        if client is None:
+            http_genai = self.http_genai()
+            with self._lock:
+                client = self._genai.get(key)
+                if client is None:
+                    # genai passe HttpOptions.timeout (ms) à chaque requête, il prime sur celui du client httpx
+                    client = genai.Client(
+                        vertexai=True, project=project, location=location,
+                        http_options=HttpOptions(httpx_client=http_genai, timeout=int(settings.llm_timeout_seconds * 1000)),
+                    )
+                    self._genai[key] = client
+        return client
+
+    def ollama_client_kwargs(self) -> dict:
+        """ChatOllama / OllamaEmbeddings créent leur propre client httpx : mêmes limites de pool."""
+        return {"limits": self._limits(), "timeout": settings.http_timeout_seconds}
+
+    def translate(self):
+        if translate is None:
+            return None
+        if self._translate is None:
+            with self._lock:
+                if self._translate is None:
+                    self._translate = translate.TranslationServiceClient()
+        return self._translate
+
+    def translate_async(self):
+        """Client gRPC asyncio : lié à la boucle, à créer depuis une coroutine."""
+        if translate is None:
+            return None
+        if self._translate_async is None:
+            self._translate_async = translate.TranslationServiceAsyncClient()
+        return self._translate_async
+
+    def warm_up(self) -> None:
+        self.http()
+        self.http_sync()
+        self.http_genai()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            http, http_sync, http_genai = self._http, self._http_sync, self._http_genai
+            translate_client, translate_async = self._translate, self._translate_async
+            self._http = self._http_sync = self._http_genai = self._translate = self._translate_async = None
+            self._genai.clear()
+        if http is not None:
+            await http.aclose()
+        for client in (http_sync, http_genai):
+            if client is not None:
+                client.close()
+        async_transport = getattr(translate_async, "transport", None)
+        if async_transport is not None:
+            try:
+                await async_transport.close()
+            except Exception as e:
+                logger.warning(f"Fermeture du client Translate async : {e}")
+        transport = getattr(translate_client, "transport", None)
+        if transport is not None:
+            try:
+                transport.close()
+            except Exception as e:
+                logger.warning(f"Fermeture du client Translate : {e}")
+
+
+_registry: Optional[ClientRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_clients() -> ClientRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ClientRegistry()
+    return _registry
+
+async def close_clients() -> None:
+    if _registry is not None:
+        await _registry.aclose()
@@ -0,0 +1,85 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# nb de threads par famille d'appels bloquants (Vertex, Milvus, Translate, Gemini, jobs de fond)
+_POOL_SIZES = {
+    "embedding": settings.executor_embedding_workers,
+    "milvus": settings.executor_milvus_workers,
+    "translate": settings.executor_translate_workers,
+    "llm": settings.executor_llm_workers,
+    "jobs": settings.executor_jobs_workers,
+}
+
+
+class BoundedExecutor:
+    """
+    Pool de threads dédié + sémaphore : au-delà de max_workers appels en cours,
+    les coroutines attendent sur la sémaphore (sans bloquer la boucle) au lieu
+    de s'empiler dans la file du pool.
+    """
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-io")
+        self._sem: asyncio.Semaphore | None = None
+        self.in_flight = 0
+        self.waiting = 0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_workers)
+        return self._sem
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        self.waiting += 1
+        try:
+            await self._semaphore().acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.in_flight -= 1
+            self._semaphore().release()
+
+    def stats(self) -> Dict[str, int]:
+        return {"max_workers": self.max_workers, "in_flight": self.in_flight, "waiting": self.waiting}
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_executors: Dict[str, BoundedExecutor] = {}
+_executors_lock = threading.Lock()
+
+def get_executor(name: str) -> BoundedExecutor:
+    ex = _executors.get(name)
+    if ex is None:
+        with _executors_lock:
+            ex = _executors.get(name)
+            if ex is None:
+                ex = BoundedExecutor(name, _POOL_SIZES.get(name, 8))
+                _executors[name] = ex
+    return ex
+
+async def run_blocking(pool: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Exécute un appel réseau bloquant (SDK sync) hors de la boucle asyncio, avec limite de concurrence."""
+    return await get_executor(pool).run(fn, *args, **kwargs)
+
+def executors_stats() -> Dict[str, Dict[str, int]]:
+    return {name: ex.stats() for name, ex in _executors.items()}
+
+def shutdown_executors() -> None:
+    with _executors_lock:
+        for ex in _executors.values():
+            ex.shutdown()
+        _executors.clear()
@@ -41,4 +41,7 @@ async def ensure_indexes(db: AsyncIOMotorDatabase) -> None:
         name="admins_username_unique",
         unique=True,
         partialFilterExpression={"username": {"$exists": True}},
-    )
\ No newline at end of file
+    )
+
+    # résultats des jobs render_batch (app/api/v1/render_route.py)
+    await db["render_results"].create_index([("job_id", 1), ("status", 1)], name="render_results_job_status")
@@ -2,6 +2,7 @@ import os
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings, SettingsConfigDict
 import logging
+from typing import Dict, List
 
 logger = logging.getLogger(__name__)
 
@@ -53,6 +54,102 @@ class Settings(BaseSettings):
     mongo_db: str = "chatdb"
     app_env: str = "dev"
     admins_bootstrap_emails: str
+    # pools de threads pour les appels bloquants du chemin RAG (voir app/base/executor.py)
+    executor_embedding_workers: int = 16
+    executor_milvus_workers: int = 16
+    executor_translate_workers: int = 8
+    executor_llm_workers: int = 32
+    executor_jobs_workers: int = 8
+    # jobs de fond (app/services/job_service.py) : surcharge du nb de jobs simultanés par type
+    job_concurrency: Dict[str, int] = {}
+    # cache des embeddings de requêtes (app/agents/embedding_cache.py), chemin sqlite vide = mémoire seule
+    embedding_cache_max_entries: int = 5000
+    embedding_cache_ttl_seconds: int = 86400
+    embedding_cache_path: str = ""
+    # embedding d'ingestion par lots (app/agents/batch_embedder.py)
+    vertex_embed_batch_size: int = 100
+    vertex_embed_batch_tokens: int = 15000
+    ollama_embed_batch_size: int = 32
+    ingestion_embed_concurrency: int = 4
+    ingestion_embed_max_retries: int = 5
+    # limite partagée par fournisseur entre ingestions concurrentes (sync_all), 0 = illimité
+    ingestion_embed_requests_per_minute: int = 0
+    ingestion_embed_max_in_flight: int = 8
+    # store d'embeddings adressé par contenu (app/agents/embedding_store.py), vide = désactivé
+    embedding_store_dir: str = ""
+    # pipeline Hive -> Milvus en flux (app/services/ingestion_pipeline.py)
+    ingestion_hive_batch_size: int = 200
+    ingestion_upsert_batch_size: int = 500
+    ingestion_queue_depth: int = 2
+    ingestion_incremental: bool = True
+    # découpage en chunks dans un pool de processes (app/utils/chunker.py), 0 = dans le thread du pipeline
+    chunker_processes: int = 0
+    chunker_parallel_min_docs: int = 16
+    # cache sémantique des réponses chat sans historique (app/agents/answer_cache.py)
+    answer_cache_enabled: bool = True
+    answer_cache_max_entries: int = 2000
+    answer_cache_ttl_seconds: int = 86400
+    answer_cache_similarity: float = 0.95
+    # recherche chat (app/services/retrieval_service.py) : fusion RRF question originale + traduction MG->FR
+    retrieval_rrf_k: int = 60
+    retrieval_fused_limit: int = 10
+    # cache des traductions MG->FR des questions (app/utils/translation_cache.py), chemin sqlite vide = mémoire seule
+    translation_cache_max_entries: int = 5000
+    translation_cache_ttl_seconds: int = 30 * 86400
+    translation_cache_path: str = ""
+    # /i18n/translate : lots translate_text (max 1024 chaînes, ~30k caractères conseillés), lots en parallèle
+    i18n_translate_batch_size: int = 1024
+    i18n_translate_batch_chars: int = 30000
+    i18n_translate_concurrency: int = 4
+    # mémoire de traduction i18n (app/utils/translation_memory.py), chemin vide = <LOCALES_DIR>/.translation_memory.sqlite
+    i18n_memory_enabled: bool = True
+    i18n_memory_path: str = ""
+    # recalage de l'estimation de tokens (app/utils/tokens.py) sur models.count_tokens, après le premier appel Gemini ;
+    # sans lui les budgets de contexte reposent sur l'heuristique chars/4, imprécise hors anglais (malgache, français)
+    gemini_token_calibration: bool = True
+    # réponses RAG Gemini : "single" (1 candidat), "scored" (N candidats, le plus sourcé gagne), "race" (N appels, le premier gagne)
+    gemini_candidate_strategy: str = "single"
+    gemini_candidate_count: int = 2
+    # routage LLM (app/agents/manager.py) : providers actifs dans l'ordre de préférence, hedging, circuit breaker
+    llm_providers: List[str] = ["vertex-gemini"]
+    llm_gemini_model: str = "gemini-2.5-pro"
+    llm_gemini_location: str = "europe-west1"
+    llm_ollama_model: str = "llama3.2"
+    llm_openrouter_model: str = "mistralai/mixtral-8x7b"
+    llm_hedge_enabled: bool = True
+    llm_hedge_default_delay_seconds: float = 10.0
+    llm_hedge_min_delay_seconds: float = 1.0
+    llm_provider_concurrency: Dict[str, int] = {}
+    llm_breaker_failures: int = 5
+    llm_breaker_cooldown_seconds: float = 30.0
+    # pool Chromium partagé (app/services/browser_pool.py) : navigateurs, pages simultanées, recyclage après N pages
+    browser_pool_enabled: bool = True
+    browser_pool_size: int = 1
+    browser_pool_max_pages: int = 4
+    browser_pool_recycle_after: int = 200
+    # rendu par lots (/render/batch, job "render_batch") : rendus simultanés par lot, limites par hôte pour tout le process
+    render_batch_concurrency: int = 8
+    render_batch_max_jobs: int = 1000
+    render_host_max_concurrency: int = 2
+    render_host_min_interval_ms: int = 250
+    # mode de rendu par défaut ("full" | "light") ; en light : tiers bloqués (sauf hôtes autorisés), contenu stable depuis N ms
+    render_default_mode: str = "full"
+    render_stable_ms: int = 500
+    render_block_third_party: bool = True
+    render_third_party_allow: List[str] = []
+    # cache des rendus (app/services/render_cache.py), chemin sqlite vide = désactivé ; revalidation ETag/Last-Modified après le TTL,
+    # re-rendu forcé après N revalidations (le document d'une SPA ne reflète pas son contenu XHR), 0 = jamais de revalidation
+    render_cache_path: str = ""
+    render_cache_ttl_seconds: int = 86400
+    render_cache_max_entries: int = 20000
+    render_cache_max_revalidations: int = 3
+    # clients HTTP partagés (app/base/clients.py) : pools keep-alive, HTTP/2 si h2 installé
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry_seconds: float = 60.0
+    http_timeout_seconds: float = 30.0
+    # appels genai (Gemini) : client httpx dédié, délai par requête propre aux générations longues
+    llm_timeout_seconds: float = 300.0
 
     model_config = SettingsConfigDict(env_file=dotenv_path)
 
@@ -9,16 +9,28 @@ from app.api.v1 import render_router as render_router_v1
 from app.api.v1.eval_export import router as eval_export_router_v1
 from app.api.v1.eval_export_run import router as eval_export_run_router_v1
 from app.api.v1.multilingual_routes import router as multilingual_router_v1
+from app.api.v1.jobs_route import router as jobs_router_v1
 from app.exceptions import validation_exception_handlers,exception_handlers,http_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
 from app.base.db import get_client, get_db
 from app.base.indexes import ensure_indexes
+from app.base.executor import shutdown_executors
+from app.base.clients import get_clients, close_clients
+from app.utils.chunker import shutdown_chunker_pool
+from app.services.job_service import get_job_manager
+from app.services.browser_pool import get_browser_pool, close_browser_pool
+from app.core import settings
+from app.services.milvus_multilingual_service import get_milvus_multilingual_service, close_milvus_multilingual_service
+from app.services.milvus_service import close_milvus_service
 import os
+import logging
 import sys, asyncio
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="APP", version="1.0.0")
 
 # app.mount("/v1", api_router_v1) # /v1/docs 
@@ -57,6 +69,7 @@ api_v1.include_router(bd_router_v1)
 api_v1.include_router(eval_export_router_v1)
 api_v1.include_router(eval_export_run_router_v1)
 api_v1.include_router(multilingual_router_v1)
+api_v1.include_router(jobs_router_v1)
 
 validation_exception_handlers(app)
 exception_handlers(app)
@@ -67,10 +80,32 @@ app.include_router(api_v1)
 @app.on_event("startup")
 async def on_startup():
     _ = get_client()
+    # pools HTTP partagés (mWater, OpenRouter, genai) ouverts une fois pour toutes
+    get_clients().warm_up()
     db = get_db()
     await ensure_indexes(db)
+    # relance les jobs de fond interrompus par l'arrêt précédent (depuis leur checkpoint)
+    await get_job_manager().start(db)
+    try:
+        await asyncio.to_thread(get_milvus_multilingual_service)
+    except Exception as e:
+        # Milvus indisponible au démarrage : la première requête retentera la connexion
+        logger.warning(f"Milvus non initialisé au démarrage: {e}")
+    if settings.browser_pool_enabled:
+        try:
+            # Chromium chauds pour /render/* (sinon lancés au premier rendu)
+            await get_browser_pool().start()
+        except Exception as e:
+            logger.warning(f"Pool Chromium non démarré: {e}")
 
 @app.on_event("shutdown")
 async def on_shutdown():
+    await get_job_manager().shutdown()
     client = get_client()
-    client.close()
\ No newline at end of file
+    client.close()
+    close_milvus_multilingual_service()
+    close_milvus_service()
+    shutdown_executors()
+    shutdown_chunker_pool()
+    await close_browser_pool()
+    await close_clients()
\ No newline at end of file
@@ -1,4 +1,4 @@
-from typing import List, Literal
+from typing import Any, Dict, List, Literal
 from app.models.question import User
 from pydantic import BaseModel, Field
 from typing import List, Optional
@@ -21,9 +21,11 @@ class ChatRequest(BaseModel):
     max_output_tokens: int = 2048
     max_messages: int | None = 50
     partitions: Optional[List[str]] = None
+    bypass_cache: bool = False  # True : ni lecture ni écriture dans le cache sémantique des réponses
 
 class ChatResponse(BaseModel):
     reply: str
+    usage: Optional[Dict[str, Any]] = None  # latence et tokens de la réponse (absent si servie par le cache)
 
 
 class SourceMeta(BaseModel):
@@ -36,4 +38,5 @@ class SourceMeta(BaseModel):
 
 class TrainingResponse(BaseModel):
     reply: str
-    sources: List[SourceMeta] = []
\ No newline at end of file
+    sources: List[SourceMeta] = []
+    usage: Optional[Dict[str, Any]] = None
\ No newline at end of file
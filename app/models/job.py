@@ -1,7 +1,15 @@
-from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from pydantic import BaseModel, Field, HttpUrl
+from typing import List, Literal, Optional
 
 class Job(BaseModel):
     url: HttpUrl
     wait_ms: Optional[int] = 3500
     timeout_ms: Optional[int] = 20000
+
+class BatchRenderRequest(BaseModel):
+    jobs: List[Job] = Field(..., min_length=1)
+    selector: Optional[str] = None  # défaut : DEFAULT_SELECTOR
+    mode: Literal["inner_html", "inner_text"] = "inner_html"
+    concurrency: Optional[int] = None  # défaut : settings.render_batch_concurrency
+    render: Optional[Literal["full", "light"]] = None  # défaut : settings.render_default_mode
+    refresh: bool = False  # True : ignore le cache des rendus
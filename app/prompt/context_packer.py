@@ -0,0 +1,127 @@
+from __future__ import annotations
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.utils.tokens import TokenCounter, token_counter
+
+_GAP = " […] "
+# en dessous, une coïncidence (ponctuation, mot court) plutôt que l'overlap du découpage
+_MIN_OVERLAP_CHARS = 16
+
+
+def overlap_length(left: str, right: str, max_chars: int = 4000) -> int:
+    """Longueur du plus long préfixe de `right` qui termine `left` (préfixe-fonction KMP, linéaire)."""
+    tail = left[-max_chars:]
+    head = right[:max_chars]
+    if not tail or not head:
+        return 0
+    s = head + "\x00" + tail
+    pi = [0] * len(s)
+    for i in range(1, len(s)):
+        k = pi[i - 1]
+        while k and s[i] != s[k]:
+            k = pi[k - 1]
+        if s[i] == s[k]:
+            k += 1
+        pi[i] = k
+    return pi[-1]
+
+
+def stitch(left: str, right: str) -> str:
+    """Concatène deux chunks consécutifs sans répéter l'overlap du découpage."""
+    n = overlap_length(left, right)
+    rest = (right[n:] if n >= _MIN_OVERLAP_CHARS else right).strip()
+    if not rest:
+        return left
+    return f"{left} {rest}" if left else rest
+
+
+@dataclass
+class _Segment:
+    """Suite de chunks consécutifs d'un même document, overlap retiré."""
+    doc_id: Any
+    first: Dict[str, Any]
+    start: Optional[int]
+    end: Optional[int]
+    content: str
+    score: float
+
+
+def _segments(results: List[Dict[str, Any]]) -> List[_Segment]:
+    by_doc: Dict[Any, List[Dict[str, Any]]] = {}
+    seen = set()
+    for r in results or []:
+        key = r.get("id") if r.get("id") is not None else id(r)
+        if key in seen:
+            continue
+        seen.add(key)
+        by_doc.setdefault(r.get("doc_id") or key, []).append(r)
+
+    segments: List[_Segment] = []
+    for doc_id, hits in by_doc.items():
+        hits.sort(key=lambda h: (h.get("chunk_index") is None, h.get("chunk_index") or 0))
+        current: Optional[_Segment] = None
+        for h in hits:
+            idx = h.get("chunk_index")
+            content = str(h.get("content") or "").strip()
+            score = float(h.get("score") or 0.0)
+            if current is not None and idx is not None and current.end is not None and idx == current.end + 1:
+                current.content = stitch(current.content, content)
+                current.end = idx
+                current.score = max(current.score, score)
+                continue
+            current = _Segment(doc_id, h, idx, idx, content, score)
+            segments.append(current)
+    return segments
+
+
+def pack_context(
+    results: List[Dict[str, Any]],
+    *,
+    budget_tokens: Optional[int] = None,
+    max_items: int = 10,
+    counter: Optional[TokenCounter] = None,
+) -> str:
+    """
+    Contexte RAG compact :
+    - chunks consécutifs d'un même doc_id fusionnés, overlap du découpage retiré
+    - les max_items documents au meilleur score retenus, puis leurs segments choisis
+      gloutonnement par score / token sous budget_tokens (au moins un segment)
+    - un élément par document, dans l'ordre du meilleur score, JSON sans indentation
+    """
+    counter = counter or token_counter
+    segments = _segments(results)
+    costs = {id(s): max(1, counter.count_text(s.content)) for s in segments}
+
+    # la pertinence choisit les documents, la densité seulement ce qui tient dans le budget
+    best: Dict[Any, float] = {}
+    for seg in segments:
+        best[seg.doc_id] = max(best.get(seg.doc_id, seg.score), seg.score)
+    kept = set(sorted(best, key=best.get, reverse=True)[:max_items])
+
+    # un élément par document ; segments non consécutifs reliés par « […] »
+    docs: Dict[Any, List[_Segment]] = {}
+    used = 0
+    for seg in sorted(segments, key=lambda s: s.score / costs[id(s)], reverse=True):
+        cost = costs[id(seg)]
+        if seg.doc_id not in kept:
+            continue
+        if docs and budget_tokens is not None and used + cost > budget_tokens:
+            continue
+        docs.setdefault(seg.doc_id, []).append(seg)
+        used += cost
+
+    items = []
+    for segs in sorted(docs.values(), key=lambda ss: max(s.score for s in ss), reverse=True):
+        segs.sort(key=lambda s: (s.start is None, s.start or 0))
+        first = segs[0].first
+        item = {
+            "nom": first.get("nom") or "",
+            "emplacement": first.get("emplacement") or [],
+            "content": _GAP.join(s.content for s in segs),
+        }
+        if "score" in first:
+            item["score"] = round(max(s.score for s in segs), 4)
+        items.append(item)
+    return json.dumps(items, ensure_ascii=False, separators=(",", ":"))
@@ -1,7 +1,6 @@
 from __future__ import annotations
-import json
-from textwrap import shorten
-from typing import Any, List, Dict
+from typing import Any, List, Dict, Optional
+from .context_packer import pack_context
 from .navigation_prompt import NAVIGATION_PROMPT
 from .prompt import USER_PROMPT, USER_TRAINING_PROMPT
 
@@ -44,28 +43,13 @@ class PromptFactory:
                 search_results=packed_results_json
             )
 
-    @staticmethod    
-    def pack_results_for_prompt(
+    @staticmethod
+    def pack_context(
         results: List[Dict[str, Any]],
         *,
+        budget_tokens: Optional[int] = None,
         max_items: int = 10,
-        max_chars_per_content: int = 1200,
     ) -> str:
-        safe = []
-        for r in (results or [])[:max_items]:
-            item = {
-                "nom": r.get("nom") or "",
-                "emplacement": r.get("emplacement") or [],
-                # "content": shorten(str(r.get("content") or "").strip(),
-                #                    width=max_chars_per_content,
-                #                    placeholder="…")
-                "content": str(r.get("content") or "").strip()
-            }
-            if "score" in r: 
-                try: 
-                    item["score"] = float(r["score"])
-                except Exception: 
-                    pass
-            safe.append(item)
-        return json.dumps(safe, ensure_ascii=False, indent=2)
+        """Chunks fusionnés par document, sans overlap, choisis sous budget de tokens (voir context_packer)."""
+        return pack_context(results, budget_tokens=budget_tokens, max_items=max_items)
 
@@ -0,0 +1,186 @@
+from __future__ import annotations
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.core import settings
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+
+class _BrowserSlot:
+    def __init__(self, browser: Any):
+        self.browser = browser
+        self.pages_served = 0
+        self.active = 0
+        self.retiring = False
+        self.crashed = False
+        browser.on("disconnected", self._on_disconnected)
+
+    def _on_disconnected(self, *_: Any) -> None:
+        self.crashed = True
+
+    @property
+    def usable(self) -> bool:
+        return not (self.retiring or self.crashed)
+
+
+class BrowserPool:
+    """
+    Chromium partagés (playwright async), lancés au démarrage de l'app :
+    - chaque rendu reçoit un BrowserContext neuf (cookies, cache, storage isolés) sur un navigateur chaud
+    - au plus max_pages contextes ouverts en même temps, les suivants attendent (queue mesurée)
+    - un navigateur est remplacé après recycle_after pages, ou dès qu'il se déconnecte (crash)
+    """
+    def __init__(self, size: int = 1, max_pages: int = 4, recycle_after: int = 200, launch_args: Optional[List[str]] = None):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self.recycle_after = recycle_after
+        self.launch_args = launch_args if launch_args is not None else ["--no-sandbox"]
+        self._playwright = None
+        self._slots: List[_BrowserSlot] = []
+        self._lock = asyncio.Lock()
+        self._sem = asyncio.Semaphore(self.max_pages)
+        self.waiting = 0
+        self.in_use = 0
+        self.acquired = 0
+        self.pages_served = 0
+        self.recycled = 0
+        self.crashes = 0
+        self.wait_seconds_total = 0.0
+
+    async def start(self) -> None:
+        from playwright.async_api import async_playwright
+
+        async with self._lock:
+            if self._playwright is not None:
+                return
+            self._playwright = await async_playwright().start()
+            while len(self._slots) < self.size:
+                self._slots.append(await self._launch())
+        logger.info(f"Pool Chromium prêt : {self.size} navigateur(s), {self.max_pages} pages simultanées")
+
+    async def _launch(self) -> _BrowserSlot:
+        return _BrowserSlot(await self._playwright.chromium.launch(headless=True, args=self.launch_args))
+
+    async def _retire(self, slot: _BrowserSlot) -> None:
+        try:
+            await slot.browser.close()
+        except Exception as e:
+            logger.warning(f"Fermeture d'un navigateur du pool : {e}")
+
+    async def _acquire_slot(self) -> _BrowserSlot:
+        async with self._lock:
+            for slot in list(self._slots):
+                if slot.usable:
+                    continue
+                self._slots.remove(slot)
+                if slot.crashed:
+                    self.crashes += 1
+                    logger.warning("Navigateur du pool déconnecté : relance")
+                else:
+                    self.recycled += 1
+                if slot.active == 0:
+                    asyncio.ensure_future(self._retire(slot))
+            while len(self._slots) < self.size:
+                self._slots.append(await self._launch())
+            slot = min(self._slots, key=lambda s: s.active)
+            slot.active += 1
+            slot.pages_served += 1
+            if self.recycle_after and slot.pages_served >= self.recycle_after:
+                # dernière page de ce navigateur : remplacé à la prochaine demande
+                slot.retiring = True
+            return slot
+
+    async def _release_slot(self, slot: _BrowserSlot) -> None:
+        slot.active -= 1
+        if slot.active == 0 and not slot.usable and slot not in self._slots:
+            await self._retire(slot)
+
+    @asynccontextmanager
+    async def context(self, **context_kwargs: Any) -> AsyncIterator[Any]:
+        """BrowserContext isolé sur un navigateur chaud, fermé à la sortie."""
+        if self._playwright is None:
+            await self.start()
+        context_kwargs.setdefault("user_agent", DEFAULT_USER_AGENT)
+        self.waiting += 1
+        queued_at = time.monotonic()
+        try:
+            await self._sem.acquire()
+        finally:
+            self.waiting -= 1
+        self.wait_seconds_total += time.monotonic() - queued_at
+        self.acquired += 1
+        self.in_use += 1
+        slot: Optional[_BrowserSlot] = None
+        context = None
+        try:
+            slot = await self._acquire_slot()
+            context = await slot.browser.new_context(**context_kwargs)
+            self.pages_served += 1
+            yield context
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception:
+                    pass  # navigateur déjà tombé
+            if slot is not None:
+                await self._release_slot(slot)
+            self.in_use -= 1
+            self._sem.release()
+
+    async def close(self) -> None:
+        slots, self._slots = self._slots, []
+        for slot in slots:
+            await self._retire(slot)
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "started": self._playwright is not None,
+            "size": self.size,
+            "max_pages": self.max_pages,
+            "recycle_after": self.recycle_after,
+            "queue_depth": self.waiting,
+            "in_use": self.in_use,
+            "pages_served": self.pages_served,
+            "avg_wait_ms": round(1000 * self.wait_seconds_total / self.acquired, 1) if self.acquired else 0.0,
+            "recycled": self.recycled,
+            "crashes": self.crashes,
+            "browsers": [
+                {"active": s.active, "pages_served": s.pages_served, "retiring": s.retiring, "crashed": s.crashed}
+                for s in self._slots
+            ],
+        }
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+def get_browser_pool() -> BrowserPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BrowserPool(
+                    size=settings.browser_pool_size,
+                    max_pages=settings.browser_pool_max_pages,
+                    recycle_after=settings.browser_pool_recycle_after,
+                )
+    return _pool
+
+async def close_browser_pool() -> None:
+    if _pool is not None:
+        await _pool.close()
@@ -2,7 +2,7 @@ from pyhive import hive
 from TCLIService.ttypes import TApplicationException
 from contextlib import contextmanager
 import json
-from typing import List, Type, TypeVar
+from typing import Iterator, List, Optional, Sequence, Type, TypeVar
 from pydantic import BaseModel
 from app.models import SurveyItem,ConsoleItem,PageItem, DocumentItem, LogItem
 import logging
@@ -16,47 +16,38 @@ HIVE_PORT = settings.hive_port
 HIVE_USER = "vagrant" 
 T = TypeVar("T", bound=BaseModel) 
 
-def hive_rows_to_models(cursor, model_class: Type[T]) -> List[T]:
-    def clean_column(col: str) -> str:
-        return col.split('.')[-1]  
-
-    columns = [clean_column(desc[0]) for desc in cursor.description]
-    results = []
-    list = cursor.fetchall()
-    for row in list:
-        data = dict(zip(columns, row))
-       
-        for field in ["emplacement", "accessright", "breadcrumbs"]:
-            if field in data and isinstance(data[field], str):
-                try:
-                    data[field] = json.loads(data[field])
-                except json.JSONDecodeError:
-                    pass  
-
-        results.append(model_class(**data))
-
-    return results
-
-def hive_rows_to_json_models(cursor, model_class: Type[T]) -> List[T]:
-    def clean_column(col: str) -> str:
-        return col.split('.')[-1]
+SEARCH_JSON_FIELDS = ("emplacement", "accessright", "breadcrumbs")
+PAGE_JSON_FIELDS = ("breadcrumbs", "images", "gifs", "videos")
 
-    columns = [clean_column(desc[0]) for desc in cursor.description]
-    results: List[T] = []
+def _clean_column(col: str) -> str:
+    return col.split('.')[-1]
 
-    for row in cursor.fetchall():
-        data = dict(zip(columns, row))
+def _row_to_model(columns: List[str], row, model_class: Type[T], json_fields: Sequence[str]) -> T:
+    data = dict(zip(columns, row))
+    for field in json_fields:
+        if field in data and isinstance(data[field], str):
+            try:
+                data[field] = json.loads(data[field])
+            except json.JSONDecodeError:
+                pass
+    return model_class(**data)
 
-        for field in [ "breadcrumbs","images", "gifs", "videos"]:
-            if field in data and isinstance(data[field], str):
-                try:
-                    data[field] = json.loads(data[field])
-                except json.JSONDecodeError:
-                    pass 
-
-        results.append(model_class(**data))
+def hive_rows_to_models(cursor, model_class: Type[T]) -> List[T]:
+    columns = [_clean_column(desc[0]) for desc in cursor.description]
+    return [_row_to_model(columns, row, model_class, SEARCH_JSON_FIELDS) for row in cursor.fetchall()]
 
-    return results
+def hive_rows_to_json_models(cursor, model_class: Type[T]) -> List[T]:
+    columns = [_clean_column(desc[0]) for desc in cursor.description]
+    return [_row_to_model(columns, row, model_class, PAGE_JSON_FIELDS) for row in cursor.fetchall()]
+
+def iter_hive_models(cursor, model_class: Type[T], batch_size: int, json_fields: Sequence[str] = SEARCH_JSON_FIELDS) -> Iterator[List[T]]:
+    """Lit le résultat par fetchmany(batch_size) : la mémoire dépend de la taille du lot, pas du corpus."""
+    columns = [_clean_column(desc[0]) for desc in cursor.description]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield [_row_to_model(columns, row, model_class, json_fields) for row in rows]
 
 @contextmanager
 def hive_cursor():
@@ -146,4 +137,42 @@ def fetch_pages_with_content(limit=210):
 def fetch_documents_with_content(limit=150):
     with hive_cursor() as cursor:
         cursor.execute(f"SELECT *  FROM documents_with_content where content is not null order by id asc limit {limit}")
-        return hive_rows_to_models(cursor, DocumentItem)
\ No newline at end of file
+        return hive_rows_to_models(cursor, DocumentItem)
+
+def stream_query(query: str, model_class: Type[T], batch_size: int, json_fields: Sequence[str] = SEARCH_JSON_FIELDS) -> Iterator[List[T]]:
+    with hive_cursor() as cursor:
+        cursor.execute(query)
+        yield from iter_hive_models(cursor, model_class, batch_size, json_fields)
+
+def _limit_clause(limit: Optional[int]) -> str:
+    return f" limit {int(limit)}" if limit else ""
+
+def _after_clause(after_id: Optional[str], prefix: str) -> str:
+    """Reprise après le dernier id traité (checkpoint) : les flux sont triés par id."""
+    if not after_id:
+        return ""
+    return f" {prefix} id > '{str(after_id).replace(chr(39), chr(39) * 2)}'"
+
+def stream_surveys_with_content(batch_size: int, after_id: Optional[str] = None, limit: Optional[int] = 180) -> Iterator[List[SurveyItem]]:
+    return stream_query(f"SELECT *  FROM surveys_with_content where content is not null{_after_clause(after_id, 'and')} order by id asc{_limit_clause(limit)}", SurveyItem, batch_size)
+
+def stream_consoles_with_content(batch_size: int, after_id: Optional[str] = None, limit: Optional[int] = 60) -> Iterator[List[ConsoleItem]]:
+    return stream_query(f"SELECT *  FROM consoles_with_content where content is not null{_after_clause(after_id, 'and')} order by id asc{_limit_clause(limit)}", ConsoleItem, batch_size)
+
+def stream_documents_with_content(batch_size: int, after_id: Optional[str] = None, limit: Optional[int] = 150) -> Iterator[List[DocumentItem]]:
+    return stream_query(f"SELECT *  FROM documents_with_content where content is not null{_after_clause(after_id, 'and')} order by id asc{_limit_clause(limit)}", DocumentItem, batch_size)
+
+def stream_pages_with_content(batch_size: int, after_id: Optional[str] = None, limit: Optional[int] = 210) -> Iterator[List[PageItem]]:
+    return stream_query(f"SELECT *  FROM pages_with_content{_after_clause(after_id, 'where')} order by id asc{_limit_clause(limit)}", PageItem, batch_size)
+
+def stream_surveys_to_create(batch_size: int, after_id: Optional[str] = None) -> Iterator[List[SurveyItem]]:
+    return stream_query(f"SELECT * FROM surveys_to_insert_or_update{_after_clause(after_id, 'where')} order by id asc", SurveyItem, batch_size)
+
+def stream_consoles_to_create(batch_size: int, after_id: Optional[str] = None) -> Iterator[List[ConsoleItem]]:
+    return stream_query(f"SELECT * FROM consoles_to_insert_or_update{_after_clause(after_id, 'where')} order by id asc", ConsoleItem, batch_size)
+
+def stream_documents_to_create(batch_size: int, after_id: Optional[str] = None) -> Iterator[List[DocumentItem]]:
+    return stream_query(f"SELECT * FROM documents_to_insert_or_update{_after_clause(after_id, 'where')} order by id asc", DocumentItem, batch_size)
+
+def stream_pages_to_create(batch_size: int, after_id: Optional[str] = None) -> Iterator[List[PageItem]]:
+    return stream_query(f"SELECT * FROM pages_with_content{_after_clause(after_id, 'where')} order by id asc", PageItem, batch_size, PAGE_JSON_FIELDS)
@@ -0,0 +1,365 @@
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from app.agents.answer_cache import get_answer_cache
+from app.agents.batch_embedder import IngestionEmbedder
+from app.core import settings
+from app.utils import utf8_truncate
+from app.utils.chunker import chunk_many
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# (document, index du chunk, texte du chunk, vecteur du chunk, vecteur du titre) -> ligne Milvus
+RowBuilder = Callable[[Dict[str, Any], int, str, List[float], List[float]], Dict[str, Any]]
+
+
+VECTOR_FIELDS = ("vector", "vector_title")
+_QUERY_GROUP = 50  # doc_ids par requête Milvus (limite de résultats d'une query)
+
+
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else []
+
+
+def _quoted(ids: List[str]) -> str:
+    return ",".join(f"'{id_}'" for id_ in ids)
+
+
+def row_fingerprint(row: Dict[str, Any], fields: List[str]) -> str:
+    """Hash des champs scalaires d'un chunk (contenu, rev, métadonnées) pour détecter un changement."""
+    payload = json.dumps({k: row.get(k) for k in fields}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def search_row_builder(default_accessright: List[str]) -> RowBuilder:
+    """Ligne de la collection de recherche (surveys / consoles / documents)."""
+    def build(doc, idx, chunk_text, vector, title_vector):
+        accessright = doc.get("accessright", default_accessright)
+        return {
+            "id": f"{doc['id']}_{idx}",
+            "doc_id": doc["id"],
+            "chunk_index": idx,
+            "rev": doc.get("rev") or 0,
+            "nom": doc.get("nom") or "",
+            "langue": doc.get("langue") or "",
+            "emplacement": _as_list(doc.get("emplacement")),
+            "accessright": accessright if isinstance(accessright, list) else [],
+            "content": utf8_truncate(chunk_text, 10_000),
+            "vector": vector,
+            "vector_title": title_vector,
+        }
+    return build
+
+
+def page_row(doc, idx, chunk_text, vector, title_vector) -> Dict[str, Any]:
+    """Ligne de la collection de formation (pages)."""
+    return {
+        "id": f"{doc['id']}_{idx}",
+        "doc_id": doc["id"],
+        "chunk_index": idx,
+        "title": doc.get("title") or "",
+        "url": doc.get("url") or "",
+        "breadcrumbs": _as_list(doc.get("breadcrumbs")),
+        "images": doc.get("images"),
+        "gifs": doc.get("gifs"),
+        "videos": doc.get("videos"),
+        "content": utf8_truncate(chunk_text, 10_000),
+        "vector": vector,
+        "vector_title": title_vector,
+    }
+
+
+@dataclass
+class IngestionSource:
+    """Une source Hive à indexer et sa destination Milvus."""
+    name: str                                        # "survey", "console", "document", "page"
+    stream: Callable[[int, Optional[str]], Iterable[List[Any]]]  # (batch_size, after_id) -> lots de modèles triés par id
+    collection_name: str
+    partition_name: Optional[str]
+    title_field: str
+    build_row: RowBuilder
+
+
+@dataclass
+class BatchPlan:
+    """Écritures à faire pour un lot Hive."""
+    doc_ids: List[str]
+    rows: List[Dict[str, Any]] = field(default_factory=list)   # lignes complètes à upserter
+    delete_ids: List[str] = field(default_factory=list)        # chunks orphelins
+    replace_docs: bool = False                                 # mode complet : delete par doc_id
+    skipped: int = 0
+    unchanged: int = 0
+    reused: int = 0
+    embedded: int = 0
+    error: Optional[str] = None                                # chunking / lecture Milvus / embedding en échec
+
+
+@dataclass
+class IngestionReport:
+    source: str
+    documents: int = 0
+    chunks: int = 0
+    batches: int = 0
+    skipped: int = 0
+    unchanged: int = 0
+    reused: int = 0
+    embedded: int = 0
+    deleted: int = 0
+    last_doc_id: Optional[str] = None   # checkpoint : dernier document écrit avant le premier lot en échec
+    errors: List[str] = field(default_factory=list)
+
+    def message(self) -> str:
+        if not self.documents:
+            return f"Aucun {self.source} à insérer."
+        msg = (
+            f"{self.chunks} chunks insérés dans Milvus ({self.documents} {self.source}s, {self.batches} lots, "
+            f"{self.embedded} embeddés, {self.reused} vecteurs réutilisés, {self.unchanged} inchangés, "
+            f"{self.deleted} orphelins supprimés)."
+        )
+        if self.errors:
+            msg += f" {len(self.errors)} lots en erreur."
+        return msg
+
+
+_END = object()
+
+def prefetch(items: Iterable[T], depth: int, name: str = "prefetch") -> Iterator[T]:
+    """
+    Consomme `items` dans un thread et les expose via une file bornée à `depth` éléments :
+    l'étape amont avance pendant que l'aval travaille, mais s'arrête (put bloquant)
+    dès que l'aval a `depth` lots de retard.
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in items:
+                if not _put(item):
+                    return
+            _put(_END)
+        except BaseException as e:
+            _put(e)
+        finally:
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+
+    worker = threading.Thread(target=_produce, name=name, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+class IngestionPipeline:
+    """
+    Ingestion Hive -> Milvus en flux :
+      fetchmany (thread) -> parsing modèle -> chunking -> embedding (thread) -> upsert par lots
+    Chaque étape avance en parallèle avec au plus `queue_depth` lots d'avance, la mémoire
+    dépend donc de hive_batch_size / upsert_batch_size et pas de la taille du corpus.
+    En mode incrémental seuls les chunks modifiés sont embeddés et écrits (voir plan_batch),
+    sinon chaque lot remplace tous les chunks de ses documents.
+    """
+    def __init__(
+        self,
+        client,
+        embedder: IngestionEmbedder,
+        *,
+        incremental: Optional[bool] = None,
+        hive_batch_size: Optional[int] = None,
+        upsert_batch_size: Optional[int] = None,
+        queue_depth: Optional[int] = None,
+    ):
+        self.client = client
+        self.embedder = embedder
+        self.incremental = settings.ingestion_incremental if incremental is None else incremental
+        self.hive_batch_size = hive_batch_size or settings.ingestion_hive_batch_size
+        self.upsert_batch_size = upsert_batch_size or settings.ingestion_upsert_batch_size
+        self.queue_depth = queue_depth or settings.ingestion_queue_depth
+
+    def chunk_batch(self, models: List[Any]) -> Tuple[List[Tuple[Dict[str, Any], List[str]]], int]:
+        docs = [model.dict() for model in models]
+        all_chunks = chunk_many(
+            [doc.get("content") or "" for doc in docs],
+            processes=settings.chunker_processes,
+            min_parallel=settings.chunker_parallel_min_docs,
+        )
+        out, skipped = [], 0
+        for doc, content_chunks in zip(docs, all_chunks):
+            if not content_chunks:
+                logger.warning(f"Aucun chunk généré pour {doc.get('id')}")
+                skipped += 1
+                continue
+            out.append((doc, content_chunks))
+        return out, skipped
+
+    def fetch_existing(self, source: IngestionSource, doc_ids: List[str], fields: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Chunks déjà indexés pour ces documents (champs scalaires seulement, sans vecteurs)."""
+        existing: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(doc_ids), _QUERY_GROUP):
+            group = doc_ids[start:start + _QUERY_GROUP]
+            for row in self._query(source, "doc_id in [" + _quoted(group) + "]", fields):
+                existing[row["id"]] = row
+        return existing
+
+    def fetch_vectors(self, source: IngestionSource, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        vectors: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(ids), _QUERY_GROUP):
+            group = ids[start:start + _QUERY_GROUP]
+            for row in self._query(source, "id in [" + _quoted(group) + "]", ["id", *VECTOR_FIELDS]):
+                vectors[row["id"]] = row
+        return vectors
+
+    def _query(self, source: IngestionSource, filter: str, output_fields: List[str]) -> List[Dict[str, Any]]:
+        kwargs = {"partition_names": [source.partition_name]} if source.partition_name else {}
+        return self.client.query(collection_name=source.collection_name, filter=filter, output_fields=output_fields, **kwargs)
+
+    def plan_batch(self, source: IngestionSource, models: List[Any]) -> BatchPlan:
+        """
+        Chunk un lot puis, en mode incrémental, le compare à Milvus :
+        - chunk identique (rev, contenu, métadonnées) : ignoré
+        - même contenu et même titre mais rev / métadonnées modifiées : vecteurs existants réutilisés
+        - chunk nouveau ou modifié : ré-embeddé
+        - chunk présent dans Milvus mais plus produit (document raccourci ou vidé) : supprimé
+        """
+        docs, skipped = self.chunk_batch(models)
+        plan = BatchPlan(doc_ids=[str(m.id) for m in models], skipped=skipped, replace_docs=not self.incremental)
+        pending = []  # (ligne sans vecteurs, texte du chunk, titre)
+        for doc, content_chunks in docs:
+            title = doc.get(source.title_field) or ""
+            for idx, chunk_text in enumerate(content_chunks):
+                pending.append((source.build_row(doc, idx, chunk_text, None, None), chunk_text, title))
+
+        to_embed = pending
+        if self.incremental:
+            fields = [k for k in pending[0][0] if k not in VECTOR_FIELDS] if pending else ["id"]
+            existing = self.fetch_existing(source, plan.doc_ids, fields)
+            new_ids = {row["id"] for row, _, _ in pending}
+            plan.delete_ids = [id_ for id_ in existing if id_ not in new_ids]
+            to_embed, to_reuse = [], []
+            for item in pending:
+                row = item[0]
+                old = existing.get(row["id"])
+                if old is None:
+                    to_embed.append(item)
+                elif row_fingerprint(old, fields) == row_fingerprint(row, fields):
+                    plan.unchanged += 1
+                elif old.get("content") == row["content"] and old.get(source.title_field) == row.get(source.title_field):
+                    to_reuse.append(item)
+                else:
+                    to_embed.append(item)
+            if to_reuse:
+                stored = self.fetch_vectors(source, [row["id"] for row, _, _ in to_reuse])
+                for item in to_reuse:
+                    vectors = stored.get(item[0]["id"])
+                    if vectors is None:
+                        to_embed.append(item)
+                        continue
+                    item[0].update({k: vectors[k] for k in VECTOR_FIELDS})
+                    plan.rows.append(item[0])
+                    plan.reused += 1
+
+        if to_embed:
+            chunk_vectors = self.embedder.embed([chunk_text for _, chunk_text, _ in to_embed], "RETRIEVAL_DOCUMENT")
+            # les titres étaient embeddés comme des requêtes (generate_embedding*), on garde le même task_type
+            title_vectors = self.embedder.embed([title for _, _, title in to_embed], "RETRIEVAL_QUERY")
+            for (row, _, _), vector, title_vector in zip(to_embed, chunk_vectors, title_vectors):
+                row["vector"], row["vector_title"] = vector, title_vector
+                plan.rows.append(row)
+            plan.embedded = len(to_embed)
+        return plan
+
+    def _planned(self, source: IngestionSource, batches: Iterable[List[Any]]) -> Iterator[BatchPlan]:
+        for models in batches:
+            try:
+                yield self.plan_batch(source, models)
+            except Exception as e:
+                # même traitement qu'un upsert en échec : le lot est signalé, l'ingestion continue
+                yield BatchPlan(doc_ids=[str(m.id) for m in models], error=str(e))
+
+    def write_batch(self, source: IngestionSource, plan: BatchPlan) -> None:
+        """Supprime les chunks obsolètes (doc_id entier en mode complet, ids orphelins sinon) puis upsert par paquets."""
+        kwargs = {"partition_name": source.partition_name} if source.partition_name else {}
+        if plan.replace_docs and plan.doc_ids:
+            self.client.delete(collection_name=source.collection_name, filter="doc_id in [" + _quoted(plan.doc_ids) + "]", **kwargs)
+        elif plan.delete_ids:
+            self.client.delete(collection_name=source.collection_name, filter="id in [" + _quoted(plan.delete_ids) + "]", **kwargs)
+        for start in range(0, len(plan.rows), self.upsert_batch_size):
+            self.client.upsert(
+                collection_name=source.collection_name,
+                data=plan.rows[start:start + self.upsert_batch_size],
+                **kwargs,
+            )
+        # les réponses en cache construites sur ces documents ne sont plus valides
+        changed = set(plan.doc_ids) if plan.replace_docs else (
+            {row["doc_id"] for row in plan.rows} | {id_.rsplit("_", 1)[0] for id_ in plan.delete_ids}
+        )
+        if changed:
+            get_answer_cache().invalidate_docs(changed)
+
+    def run(
+        self,
+        source: IngestionSource,
+        progress: Optional[Callable[[IngestionReport], None]] = None,
+        after_id: Optional[str] = None,
+    ) -> IngestionReport:
+        """
+        `progress` est appelé après chaque lot avec le rapport courant ; `after_id`
+        (report.last_doc_id d'un run interrompu ou en échec partiel) reprend l'ingestion après ce document.
+        """
+        report = IngestionReport(source=source.name)
+        fetched = prefetch(source.stream(self.hive_batch_size, after_id), self.queue_depth, name=f"hive-{source.name}")
+        planned = prefetch(self._planned(source, fetched), self.queue_depth, name=f"embed-{source.name}")
+        for plan in planned:
+            report.batches += 1
+            report.documents += len(plan.doc_ids)
+            report.skipped += plan.skipped
+            error = plan.error
+            if error is None:
+                try:
+                    self.write_batch(source, plan)
+                    report.chunks += len(plan.rows)
+                    report.unchanged += plan.unchanged
+                    report.reused += plan.reused
+                    report.embedded += plan.embedded
+                    report.deleted += len(plan.delete_ids)
+                    # après un échec le checkpoint ne bouge plus : une reprise repasse par le lot raté
+                    if plan.doc_ids and not report.errors:
+                        report.last_doc_id = plan.doc_ids[-1]
+                except Exception as e:
+                    error = str(e)
+            if error is not None:
+                # un lot en échec n'arrête pas l'ingestion : les autres documents restent indexés
+                logger.error(f"Lot {report.batches} ({source.name}) échoué : {error}")
+                report.errors.append(error)
+            logger.info(f"{source.name}: lot {report.batches}, {report.documents} documents, {report.chunks} chunks écrits, {report.unchanged} inchangés")
+            if progress is not None:
+                progress(report)
+        logger.info(report.message())
+        return report
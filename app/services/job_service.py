@@ -0,0 +1,237 @@
+from __future__ import annotations
+import asyncio
+import inspect
+import logging
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.base.executor import run_blocking
+from app.core import settings
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = "jobs"
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED, INTERRUPTED = (
+    "queued", "running", "succeeded", "failed", "cancelled", "interrupted",
+)
+FINAL_STATUSES = {SUCCEEDED, FAILED, CANCELLED}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """
+    Passé au handler d'un job. Utilisable depuis la boucle (handler async) ou depuis
+    un thread (handler sync) : les écritures Mongo sont renvoyées sur la boucle.
+    """
+    def __init__(self, manager: "JobManager", record: Dict[str, Any]):
+        self.manager = manager
+        self.job_id: str = record["_id"]
+        self.type: str = record["type"]
+        self.params: Dict[str, Any] = record.get("params") or {}
+        self.checkpoint: Dict[str, Any] = record.get("checkpoint") or {}
+        self._cancelled = threading.Event()
+        self._interrupted = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def _write(self, fields: Dict[str, Any]) -> None:
+        if self._interrupted:
+            # arrêt du process : la boucle ne traitera plus d'écriture
+            raise JobCancelled()
+        coro = self.manager._update(self.job_id, fields)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.manager.loop:
+            asyncio.ensure_future(coro)
+        else:
+            asyncio.run_coroutine_threadsafe(coro, self.manager.loop).result(timeout=30)
+
+    def save_checkpoint(self, checkpoint: Dict[str, Any]) -> None:
+        """Point de reprise : relu par le handler si le job est relancé après un arrêt du process."""
+        self.checkpoint = checkpoint
+        self._write({"checkpoint": checkpoint})
+
+    def set_progress(self, progress: Any) -> None:
+        self._write({"progress": progress})
+
+
+JobHandler = Callable[[JobContext], Union[Any, Awaitable[Any]]]
+
+
+@dataclass
+class JobType:
+    name: str
+    handler: JobHandler          # async -> exécuté sur la boucle, sync -> pool "jobs"
+    max_concurrency: int = 1
+
+
+class JobManager:
+    """
+    Jobs de fond en process : une tâche asyncio par job, un enregistrement Mongo
+    (collection `jobs`) pour le statut, la progression, le checkpoint et le résultat.
+    La concurrence est bornée par type (sémaphore) ; au démarrage les jobs laissés
+    en cours par un process précédent sont relancés depuis leur checkpoint.
+    """
+    def __init__(self):
+        self.types: Dict[str, JobType] = {}
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._contexts: Dict[str, JobContext] = {}
+
+    def register(self, name: str, handler: JobHandler, max_concurrency: int = 1) -> None:
+        cap = settings.job_concurrency.get(name, max_concurrency)
+        self.types[name] = JobType(name, handler, max(1, cap))
+
+    @property
+    def collection(self):
+        return self.db[JOBS_COLLECTION]
+
+    async def start(self, db: AsyncIOMotorDatabase) -> None:
+        self.db = db
+        self.loop = asyncio.get_running_loop()
+        await self.collection.create_index([("type", 1), ("status", 1)], name="jobs_type_status")
+        await self.collection.create_index([("created_at", -1)], name="jobs_created_desc")
+        pending = self.collection.find({"status": {"$in": [QUEUED, RUNNING, INTERRUPTED]}}).sort("created_at", 1)
+        async for record in pending:
+            if record["type"] not in self.types:
+                continue
+            logger.info(f"Reprise du job {record['_id']} ({record['type']})")
+            await self._update(record["_id"], {"status": QUEUED})
+            self._launch(record)
+
+    async def shutdown(self) -> None:
+        for job_id, ctx in list(self._contexts.items()):
+            ctx._interrupted = True
+            ctx._cancelled.set()
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def _update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        await self.collection.update_one({"_id": job_id}, {"$set": {**fields, "updated_at": _now()}})
+
+    async def submit(self, job_type: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if job_type not in self.types:
+            raise HTTPException(status_code=400, detail=f"Type de job inconnu : {job_type}")
+        now = _now()
+        record = {
+            "_id": uuid.uuid4().hex,
+            "type": job_type,
+            "params": params or {},
+            "status": QUEUED,
+            "progress": None,
+            "checkpoint": None,
+            "result": None,
+            "error": None,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+            "started_at": None,
+            "finished_at": None,
+        }
+        await self.collection.insert_one(record)
+        self._launch(record)
+        return record
+
+    def _launch(self, record: Dict[str, Any]) -> None:
+        ctx = JobContext(self, record)
+        self._contexts[ctx.job_id] = ctx
+        task = asyncio.create_task(self._run(ctx), name=f"job-{ctx.job_id[:8]}")
+        self._tasks[ctx.job_id] = task
+        task.add_done_callback(lambda _: (self._tasks.pop(ctx.job_id, None), self._contexts.pop(ctx.job_id, None)))
+
+    def _semaphore(self, job_type: JobType) -> asyncio.Semaphore:
+        sem = self._semaphores.get(job_type.name)
+        if sem is None:
+            sem = self._semaphores[job_type.name] = asyncio.Semaphore(job_type.max_concurrency)
+        return sem
+
+    async def _run(self, ctx: JobContext) -> None:
+        job_type = self.types[ctx.type]
+        try:
+            async with self._semaphore(job_type):
+                ctx.raise_if_cancelled()
+                await self.collection.update_one(
+                    {"_id": ctx.job_id},
+                    {"$set": {"status": RUNNING, "started_at": _now(), "updated_at": _now()}, "$inc": {"attempts": 1}},
+                )
+                if inspect.iscoroutinefunction(job_type.handler):
+                    result = await job_type.handler(ctx)
+                else:
+                    result = await run_blocking("jobs", job_type.handler, ctx)
+            await self._update(ctx.job_id, {"status": SUCCEEDED, "result": result, "finished_at": _now()})
+            logger.info(f"Job {ctx.job_id} ({ctx.type}) terminé")
+        except (JobCancelled, asyncio.CancelledError):
+            status = INTERRUPTED if ctx._interrupted else CANCELLED
+            await self._update(ctx.job_id, {"status": status, "finished_at": _now()})
+            logger.info(f"Job {ctx.job_id} ({ctx.type}) {status}")
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.exception(f"Job {ctx.job_id} ({ctx.type}) échoué")
+            await self._update(ctx.job_id, {"status": FAILED, "error": detail, "finished_at": _now()})
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": job_id})
+
+    async def list(self, job_type: Optional[str] = None, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {}
+        if job_type:
+            query["type"] = job_type
+        if status:
+            query["status"] = status
+        cursor = self.collection.find(query, {"result": 0}).sort("created_at", -1).limit(limit)
+        return [doc async for doc in cursor]
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Annulation coopérative : le handler s'arrête au prochain raise_if_cancelled()."""
+        record = await self.get(job_id)
+        if record is None or record["status"] in FINAL_STATUSES:
+            return record
+        ctx = self._contexts.get(job_id)
+        if ctx is not None:
+            ctx._cancelled.set()
+            task = self._tasks.get(job_id)
+            if task is not None and record["status"] == QUEUED:
+                task.cancel()
+        else:
+            # job d'un autre process / jamais relancé : on le marque directement
+            await self._update(job_id, {"status": CANCELLED, "finished_at": _now()})
+        return await self.get(job_id)
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+def get_job_manager() -> JobManager:
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = JobManager()
+    return _manager
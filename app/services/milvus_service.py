@@ -1,15 +1,15 @@
 from typing import Optional, Sequence
 from app.models.question import User
-from pymilvus import MilvusClient,Collection, CollectionSchema, FieldSchema, DataType, connections,utility
-from app.models.survey import SurveyItem
+from pymilvus import MilvusClient,Collection, DataType, connections,utility
 from app.services.hive_service import *
-from app.agents.embedder import embed_query_batch,generate_embedding
-from app.utils import clean_string_list,clean_milvus_results,split_into_chunks
-from app.utils import to_jsonable, utf8_truncate
-import pandas as pd
+from app.agents.embedder import generate_embedding
+from app.utils import clean_milvus_results
+from app.utils import to_jsonable
 import logging
-import os
+import threading
 from app.core import settings
+from app.agents.batch_embedder import ollama_ingestion_embedder
+from app.services.ingestion_pipeline import IngestionPipeline, IngestionReport, IngestionSource, page_row, search_row_builder
 from pymilvus import WeightedRanker,AnnSearchRequest
 
 
@@ -19,20 +19,87 @@ logger = logging.getLogger(__name__)
 
 class MilvusService:
     def __init__(self):
-        connections.connect(alias="default",uri=f"https://{settings.milvus_host}",token=settings.milvus_apikey ) #host=settings.milvus_host,port=settings.milvus_port
         self.collection_name = "search_collection"
         self.formation_collection_name = "formation_collection"
         # self.server_addr = f"http://{settings.milvus_host}:{settings.milvus_port}"
         self.server_addr = f"https://{settings.milvus_host}" 
+        self._lock = threading.RLock()
+        self._collections: set = set()
+        self._partitions: set = set()
+        self._descriptions: dict = {}
+        self._connect()
+        self.ensure_schema()
+
+    def _connect(self):
+        # MilvusClient suffit : l'état du schéma est mis en cache, plus besoin de connections/utility
         self.client = MilvusClient(uri=self.server_addr,token=settings.milvus_apikey)
-        self._create_collection_if_not_exist()
-        self._create_formation_collection_if_not_exist()
-        self._create_survey_partition_if_not_exist()
-        self._create_console_partition_if_not_exist()
-        self._create_document_partition_if_not_exist()
+
+    def ensure_schema(self):
+        """Crée collections/partitions manquantes puis met leur état en cache (un seul aller-retour par démarrage)."""
+        with self._lock:
+            self._collections = set(self.client.list_collections())
+            self._create_collection_if_not_exist()
+            self._create_formation_collection_if_not_exist()
+            self._partitions = set(self.client.list_partitions(collection_name=self.collection_name))
+            self._create_survey_partition_if_not_exist()
+            self._create_console_partition_if_not_exist()
+            self._create_document_partition_if_not_exist()
+            self._descriptions = {}
+
+    def _has_collection(self, name: str) -> bool:
+        return name in self._collections
+
+    def _has_partition(self, name: str) -> bool:
+        return name in self._partitions
+
+    def _create_partition_if_not_exist(self, name: str):
+        if not self._has_partition(name):
+            self.client.create_partition(
+                collection_name = self.collection_name,
+                partition_name = name,
+            )
+            self._partitions.add(name)
+
+    def _drop_partition(self, name: str):
+        with self._lock:
+            if self._has_partition(name):
+                self.client.release_partitions(
+                    collection_name=self.collection_name,
+                    partition_names=[name]
+                )
+                self.client.drop_partition(
+                    collection_name=self.collection_name,
+                    partition_name=name
+                )
+                self._partitions.discard(name)
+            # service partagé par le process : la partition vidée doit rester utilisable (upsert/delete suivants)
+            self._create_partition_if_not_exist(name)
+
+    def health(self) -> dict:
+        try:
+            collections = self.client.list_collections()
+            return {
+                "status": "ok",
+                "collections": {name: name in collections for name in (self.collection_name, self.formation_collection_name)},
+                "partitions": sorted(self._partitions),
+            }
+        except Exception as e:
+            return {"status": "fail", "message": str(e)}
+
+    def reconnect(self):
+        with self._lock:
+            self.close()
+            self._connect()
+            self.ensure_schema()
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception:
+            pass
         
     def _create_collection_if_not_exist(self):
-        if not utility.has_collection(self.collection_name):
+        if not self._has_collection(self.collection_name):
             print("Collection non trouvée, creation ....")
             schema = self.client.create_schema(
                 auto_id=False,
@@ -84,8 +151,10 @@ class MilvusService:
                 properties = {"mmap.enabled":True},
                 # dimension=1024
             )
+            self._collections.add(self.collection_name)
+            
     def _create_formation_collection_if_not_exist(self):
-        if not utility.has_collection(self.formation_collection_name):
+        if not self._has_collection(self.formation_collection_name):
             print("Collection Formation non trouvée, creation ....")
             schema = self.client.create_schema(
                 auto_id=False,
@@ -133,44 +202,34 @@ class MilvusService:
                 properties = {"mmap.enabled":True},
                 # dimension=1024
             )
+            self._collections.add(self.formation_collection_name)
     
             
     def _create_survey_partition_if_not_exist(self):
-        if not self.client.has_partition(collection_name = self.collection_name,partition_name = "surveys_vector"):            
-            self.client.create_partition(
-                collection_name = self.collection_name,
-                partition_name = "surveys_vector",                
-            )
+        self._create_partition_if_not_exist("surveys_vector")
     
     def _create_console_partition_if_not_exist(self):
-        if not self.client.has_partition(collection_name = self.collection_name,partition_name = "consoles_vector"):            
-            self.client.create_partition(
-                collection_name = self.collection_name,
-                partition_name = "consoles_vector",                
-            )
+        self._create_partition_if_not_exist("consoles_vector")
 
     def _create_document_partition_if_not_exist(self):
-        if not self.client.has_partition(collection_name = self.collection_name,partition_name = "documents_vector"):            
-            self.client.create_partition(
-                collection_name = self.collection_name,
-                partition_name = "documents_vector",                
-            )
+        self._create_partition_if_not_exist("documents_vector")
 
     def _description_collection(self):
-        if utility.has_collection(self.collection_name):
-            res = self.client.describe_collection(
-                collection_name=self.collection_name
-            )
-            return res
+        if self._has_collection(self.collection_name):
+            if self.collection_name not in self._descriptions:
+                self._descriptions[self.collection_name] = self.client.describe_collection(
+                    collection_name=self.collection_name
+                )
+            return self._descriptions[self.collection_name]
         
     def _collection_load_state(self):
-        if utility.has_collection(self.collection_name):
+        if self._has_collection(self.collection_name):
             res = self.client.get_load_state(
                 collection_name=self.collection_name
             )
             return res
     def _survey_partition_load_state(self):
-        if self.client.has_partition(collection_name = self.collection_name,partition_name = "surveys_vector"):
+        if self._has_partition("surveys_vector"):
             res = self.client.get_load_state(
                 collection_name=self.collection_name,
                 partition_name="surveys_vector"
@@ -178,7 +237,7 @@ class MilvusService:
             return res
         
     def _console_partition_load_state(self):
-        if self.client.has_partition(collection_name = self.collection_name,partition_name = "consoles_vector"):
+        if self._has_partition("consoles_vector"):
             res = self.client.get_load_state(
                 collection_name=self.collection_name,
                 partition_name="consoles_vector"
@@ -186,53 +245,38 @@ class MilvusService:
             return res
             
     def _clean_survey_partition(self):
-        if self.client.has_partition(collection_name = self.collection_name,partition_name = "surveys_vector"):
-            self.client.release_partitions(
-                collection_name=self.collection_name,
-                partition_names=["surveys_vector"]
-            )
-            self.client.drop_partition(
-                collection_name=self.collection_name,
-                partition_name="surveys_vector"
-            )
+        self._drop_partition("surveys_vector")
+
     def _clean_console_partition(self):
-        if self.client.has_partition(collection_name = self.collection_name,partition_name = "consoles_vector"):
-            self.client.release_partitions(
-                collection_name=self.collection_name,
-                partition_names=["consoles_vector"]
-            )
-            self.client.drop_partition(
-                collection_name=self.collection_name,
-                partition_name="consoles_vector"
-            )
+        self._drop_partition("consoles_vector")
 
     def _clean_document_partition(self):
-        if self.client.has_partition(collection_name = self.collection_name,partition_name = "documents_vector"):
-            self.client.release_partitions(
-                collection_name=self.collection_name,
-                partition_names=["documents_vector"]
-            )
-            self.client.drop_partition(
-                collection_name=self.collection_name,
-                partition_name="documents_vector"
-            )
+        self._drop_partition("documents_vector")
             
     def _clean_collection(self):
-        if utility.has_collection(self.collection_name):
-            self.client.release_collection(
-                collection_name=self.collection_name
-            )
-            self.client.drop_collection(
-                collection_name=self.collection_name
-            )
+        with self._lock:
+            if self._has_collection(self.collection_name):
+                self.client.release_collection(
+                    collection_name=self.collection_name
+                )
+                self.client.drop_collection(
+                    collection_name=self.collection_name
+                )
+            self._collections.discard(self.collection_name)
+            self._partitions = set()
+            self._descriptions.pop(self.collection_name, None)
+
     def _clean_formation_collection(self):
-        if utility.has_collection(self.formation_collection_name):
-            self.client.release_collection(
-                collection_name=self.formation_collection_name
-            )
-            self.client.drop_collection(
-                collection_name=self.formation_collection_name
-            )
+        with self._lock:
+            if self._has_collection(self.formation_collection_name):
+                self.client.release_collection(
+                    collection_name=self.formation_collection_name
+                )
+                self.client.drop_collection(
+                    collection_name=self.formation_collection_name
+                )
+            self._collections.discard(self.formation_collection_name)
+            self._descriptions.pop(self.formation_collection_name, None)
     
     def list_surveys(self):
         filter = 'id is not null'
@@ -362,220 +406,32 @@ class MilvusService:
         
         return message
     
-    def bulk_insert_surveys_to_milvus(self):
-        surveys = fetch_surveys_to_create()
-        message = ""
-        if not surveys:
-            message = "Aucun survey à insérer."
-            logger.info(message)
-            return message
-        df = pd.DataFrame([survey.dict() for survey in surveys])
-        df['emplacement'] = df['emplacement'].apply(lambda x: x if isinstance(x, list) else [])
-        df['accessright'] = df['accessright'].apply(lambda x: x if isinstance(x, list) else [])
-        # vectors = embed_query_batch(df["content"].tolist())         
-        # delete ids 
-        ids = [survey.id for survey in surveys]
-        logger.warning(ids)
-        id_string = ",".join(f"'{id_}'" for id_ in ids)
-        self.delete_ids(id_string,"survey")
-        logger.warning(f"{len(ids)} surveys supprimés dans Milvus.")
-        insert_data = []
-        for i, row in df.iterrows():
-            doc_id = row["id"]
-            content_chunks = split_into_chunks(row["content"])
-            if not content_chunks:
-                logger.warning(f"Aucun chunk généré pour {doc_id}")
-                continue
-            chunk_vectors = embed_query_batch(content_chunks) 
-            title_vectors = generate_embedding(row["nom"])
-            logger.warning(f"doc {doc_id} ")
-            for idx, chunk_text in enumerate(content_chunks):
-                logger.warning(f"chunk {idx} ")
-                insert_data.append({
-                    "id": f"{doc_id}_{idx}",
-                    "doc_id": doc_id,
-                    "chunk_index": idx,
-                    "rev": row.get("rev", 0),
-                    "nom": row.get("nom", ""), 
-                    "langue": row.get("langue", ""),
-                    "emplacement": row.get("emplacement", []),
-                    "accessright": row.get("accessright", []),
-                    "content": chunk_text[:10000],  # Truncation sécurité
-                    "vector": chunk_vectors[idx],  
-                    "vector_title": title_vectors,
-                })
-        if not insert_data:
-            logger.warning("Aucune donnée insérée dans Milvus (tous les contenus vides ?)")
-            return "Aucun insert réalisé"                       
-        logger.warning(f"Insertion de {len(insert_data)} chunks dans Milvus.")
-        self.client.upsert(
-            collection_name=self.collection_name,
-            partition_name="surveys_vector",
-            data=insert_data
-        )
-        message = f"{len(insert_data)} chunks insérés dans Milvus."
-        logger.info(message)
-        return message
+    def _ingestion_pipeline(self, incremental: Optional[bool] = None) -> IngestionPipeline:
+        return IngestionPipeline(self.client, ollama_ingestion_embedder(), incremental=incremental)
 
-    def bulk_insert_consoles_to_milvus(self):
-        consoles = fetch_consoles_to_create()
-        message = ""
-        if not consoles:
-            message = "Aucun console à insérer."
-            logger.info(message)
-            return message
-        df = pd.DataFrame([console.dict() for console in consoles])
-        df['emplacement'] = df['emplacement'].apply(lambda x: x if isinstance(x, list) else [])    
-        # delete ids 
-        ids = [console.id for console in consoles]
-        id_string = ",".join(f"'{id_}'" for id_ in ids)
-        self.delete_ids(id_string,"console")
-        logger.warning(f"{len(ids)} consoles supprimés dans Milvus.")
-        insert_data = []
-        for i, row in df.iterrows():
-            doc_id = row["id"]
-            content_chunks = split_into_chunks(row["content"])
-            if not content_chunks:
-                logger.warning(f"Aucun chunk généré pour {doc_id}")
-                continue
-            chunk_vectors = embed_query_batch(content_chunks) 
-            title_vectors = generate_embedding(row["nom"])
-            logger.warning(f"doc {doc_id} ")
-            for idx, chunk_text in enumerate(content_chunks):
-                logger.warning(f"chunk {idx} ")
-                insert_data.append({
-                    "id": f"{doc_id}_{idx}",
-                    "doc_id": doc_id,
-                    "chunk_index": idx,
-                    "rev": row.get("rev", 0),
-                    "nom": row.get("nom", ""),
-                    "langue": row.get("langue", ""),
-                    "emplacement": row.get("emplacement", []),
-                    "accessright": row.get("accessright", ["all"]),
-                    "content": chunk_text[:10000], 
-                    "vector": chunk_vectors[idx],
-                    "vector_title": title_vectors,
-                })
-        if not insert_data:
-            logger.warning("Aucune donnée insérée dans Milvus (tous les contenus vides ?)")
-            return "Aucun insert réalisé"                       
-        logger.warning(f"Insertion de {len(insert_data)} chunks dans Milvus.")
-        self.client.upsert(
-            collection_name=self.collection_name,
-            partition_name="consoles_vector",
-            data=insert_data
-        )
-        message = f"{len(insert_data)} chunks insérés dans Milvus."
-        logger.info(message)
-        return message
+    def _ingestion_sources(self) -> dict:
+        return {
+            "survey": IngestionSource("survey", stream_surveys_to_create, self.collection_name, "surveys_vector", "nom", search_row_builder([])),
+            "console": IngestionSource("console", stream_consoles_to_create, self.collection_name, "consoles_vector", "nom", search_row_builder(["all"])),
+            "document": IngestionSource("document", stream_documents_to_create, self.collection_name, "documents_vector", "nom", search_row_builder(["all"])),
+            "page": IngestionSource("page", stream_pages_to_create, self.formation_collection_name, None, "title", page_row),
+        }
 
-    def bulk_insert_documents_to_milvus(self):
-        documents = fetch_documents_to_create()
-        message = ""
-        if not documents:
-            message = "Aucun document à insérer."
-            logger.info(message)
-            return message
-        df = pd.DataFrame([document.dict() for document in documents])
-        df['emplacement'] = df['emplacement'].apply(lambda x: x if isinstance(x, list) else [])    
-        # delete ids 
-        ids = [document.id for document in documents]
-        id_string = ",".join(f"'{id_}'" for id_ in ids)
-        self.delete_ids(id_string,"document")
-        logger.warning(f"{len(ids)} documents supprimés dans Milvus.")
-        insert_data = []
-        for i, row in df.iterrows():
-            doc_id = row["id"]
-            content_chunks = split_into_chunks(row["content"])
-            if not content_chunks:
-                logger.warning(f"Aucun chunk généré pour {doc_id}")
-                continue
-            chunk_vectors = embed_query_batch(content_chunks) 
-            title_vectors = generate_embedding(row["nom"])
-            for idx, chunk_text in enumerate(content_chunks):
-                insert_data.append({
-                    "id": f"{doc_id}_{idx}",
-                    "doc_id": doc_id,
-                    "chunk_index": idx,
-                    "rev": row.get("rev", 0),
-                    "nom": row.get("nom", ""),
-                    "langue": row.get("langue", ""),
-                    "emplacement": row.get("emplacement", []),
-                    "accessright": row.get("accessright", ["all"]),
-                    "content": utf8_truncate(chunk_text, 10_000),
-                    "vector": chunk_vectors[idx],
-                    "vector_title": title_vectors,
-                })
-
-        if not insert_data:
-            logger.warning("Aucune donnée insérée dans Milvus (tous les contenus vides ?)")
-            return "Aucun insert réalisé"                       
-        logger.warning(f"Insertion de {len(insert_data)} chunks dans Milvus.")
-        self.client.upsert(
-            collection_name=self.collection_name,
-            partition_name="documents_vector",
-            data=insert_data
-        )
-        message = f"{len(insert_data)} chunks insérés dans Milvus."
-        logger.info(message)
-        return message
-    
+    def ingest(self, source_name: str, incremental: Optional[bool] = None, progress=None, after_id: Optional[str] = None) -> IngestionReport:
+        """Indexe une source Hive lot par lot (fetchmany -> chunk -> embed -> upsert), par défaut en incrémental."""
+        return self._ingestion_pipeline(incremental).run(self._ingestion_sources()[source_name], progress, after_id)
 
-    def bulk_insert_pages_to_milvus(self):
-        pages = fetch_pages_to_create()
-        logger.warning(pages)
-        message = ""
-        if not pages:
-            message = "Aucun page à insérer."
-            logger.info(message)
-            return message
-        df = pd.DataFrame([page.dict() for page in pages])
-        df['breadcrumbs'] = df['breadcrumbs'].apply(lambda x: x if isinstance(x, list) else [])    
-        # delete ids 
-        ids = [page.id for page in pages]
-        logger.warning(ids)
-        id_string = ",".join(f"'{id_}'" for id_ in ids)
-        self.delete_page_ids(id_string)
-        logger.warning(f"{len(ids)} pages supprimés dans Milvus.")
-        insert_data = []
-        for i, row in df.iterrows():
-            doc_id = row["id"]
-            content_chunks = split_into_chunks(row["content"])
-            if not content_chunks:
-                logger.warning(f"Aucun chunk généré pour {doc_id}")
-                continue
-            chunk_vectors = embed_query_batch(content_chunks) 
-            title_vectors = generate_embedding(row["title"])
-            logger.warning(f"doc {doc_id} ")
-            for idx, chunk_text in enumerate(content_chunks):
-                logger.warning(f"chunk {idx} ")
-                insert_data.append({
-                    "id": f"{doc_id}_{idx}",
-                    "doc_id": doc_id,
-                    "chunk_index": idx,
-                    "title": row.get("title", ""),
-                    "url": row.get("url", ""),
-                    "breadcrumbs": row.get("breadcrumbs", []),
-                    "images": row.get("images", []),
-                    "gifs": row.get("gifs", []),
-                    "videos": row.get("videos", []),
-                    "content": chunk_text[:10000], 
-                    "vector": chunk_vectors[idx],
-                    "vector_title": title_vectors,
-                })
-        if not insert_data:
-            logger.warning("Aucune donnée insérée dans Milvus (tous les contenus vides ?)")
-            return "Aucun insert réalisé"                       
-        logger.warning(f"Insertion de {len(insert_data)} chunks dans Milvus.")
-        self.client.upsert(
-            collection_name=self.formation_collection_name,
-            data=insert_data
-        )
-        message = f"{len(insert_data)} chunks insérés dans Milvus."
-        logger.info(message)
-        return message
+    def bulk_insert_surveys_to_milvus(self, incremental: Optional[bool] = None):
+        return self.ingest("survey", incremental).message()
 
+    def bulk_insert_consoles_to_milvus(self, incremental: Optional[bool] = None):
+        return self.ingest("console", incremental).message()
 
+    def bulk_insert_documents_to_milvus(self, incremental: Optional[bool] = None):
+        return self.ingest("document", incremental).message()
+
+    def bulk_insert_pages_to_milvus(self, incremental: Optional[bool] = None):
+        return self.ingest("page", incremental).message()
 
     def delete_surveys_milvus(self):
         ids = fetch_surveys_to_delete()
@@ -592,7 +448,9 @@ class MilvusService:
 
     def search(self,query,user: User, partitions: Optional[Sequence[str]] = None,
 ):
-        query_multimodal_vector = generate_embedding(query)
+        return self.search_by_vector(generate_embedding(query), user, partitions)
+
+    def search_by_vector(self, query_multimodal_vector, user: User, partitions: Optional[Sequence[str]] = None):
         # logger.info(",".join(f"'{group}'" for group in user.groups))
         expr="ARRAY_CONTAINS(accessright,'all') or ARRAY_CONTAINS_ANY(accessright, ["+",".join(f"'{group}'" for group in user.groups)+"])"
         search_param_1 = {
@@ -650,7 +508,9 @@ class MilvusService:
         return res
     
     def formation(self,query):
-        query_multimodal_vector = generate_embedding(query)
+        return self.formation_by_vector(generate_embedding(query))
+
+    def formation_by_vector(self, query_multimodal_vector):
         # logger.info(",".join(f"'{group}'" for group in user.groups))
         search_param_1 = {
         "data": [query_multimodal_vector],
@@ -699,5 +559,24 @@ class MilvusService:
         res = clean_data
         
         return res
-    
-    
\ No newline at end of file
+
+
+
+_service: MilvusService | None = None
+_service_lock = threading.Lock()
+
+def get_milvus_service() -> MilvusService:
+    """Instance partagée par le process (connexion + état du schéma en cache), utilisable avec Depends."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = MilvusService()
+    return _service
+
+def close_milvus_service() -> None:
+    global _service
+    with _service_lock:
+        if _service is not None:
+            _service.close()
+            _service = None
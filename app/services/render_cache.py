@@ -0,0 +1,131 @@
+from __future__ import annotations
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from app.core import settings
+
+
+@dataclass
+class CachedRender:
+    result: Dict[str, Any]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+    fresh: bool
+    revalidations: int = 0   # 304 successifs depuis le dernier rendu
+
+
+class RenderCache:
+    """
+    Cache disque des rendus Playwright, clé (url, sélecteur, mode, rendu) :
+    - résultat compressé (zlib) dans sqlite, avec ETag / Last-Modified du document
+    - frais pendant ttl_seconds ; au-delà, revalidé par requête conditionnelle avant tout re-rendu
+    - le nombre de 304 depuis le dernier rendu est compté : le document d'une SPA peut rester
+      inchangé alors que le contenu chargé en XHR change, l'appelant borne donc les revalidations
+    - au plus max_entries entrées, les plus anciennes sont retirées
+    """
+    def __init__(self, path: str, ttl_seconds: float = 86400, max_entries: int = 20_000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS renders ("
+            " key TEXT PRIMARY KEY, url TEXT NOT NULL, result BLOB NOT NULL, content_hash TEXT,"
+            " etag TEXT, last_modified TEXT, stored_at REAL NOT NULL, revalidations INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(renders)")}
+        if "revalidations" not in columns:
+            # fichier créé avant le comptage des revalidations
+            self._conn.execute("ALTER TABLE renders ADD COLUMN revalidations INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS renders_stored ON renders(stored_at)")
+        self._conn.commit()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(url: str, sel: str, mode: str, render: str) -> str:
+        return hashlib.sha1("\x1f".join((url, sel, mode, render)).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedRender]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, etag, last_modified, stored_at, revalidations FROM renders WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        blob, etag, last_modified, stored_at, revalidations = row
+        result = json.loads(zlib.decompress(blob).decode("utf-8"))
+        fresh = not self.ttl_seconds or time.time() - stored_at <= self.ttl_seconds
+        return CachedRender(result, etag, last_modified, stored_at, fresh, revalidations)
+
+    def put(self, key: str, result: Dict[str, Any], etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        blob = zlib.compress(json.dumps(result, ensure_ascii=False).encode("utf-8"), 6)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO renders(key, url, result, content_hash, etag, last_modified, stored_at, revalidations)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, result.get("url") or "", blob, result.get("content_hash"), etag, last_modified, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM renders WHERE key IN ("
+                " SELECT key FROM renders ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def touch(self, key: str) -> None:
+        """Origine inchangée (304) : l'entrée redevient fraîche, une revalidation de plus."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE renders SET stored_at = ?, revalidations = revalidations + 1 WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM renders")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(result)), 0) FROM renders").fetchone()
+        lookups = self.hits + self.revalidated + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "compressed_bytes": size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.revalidated) / lookups, 4) if lookups else 0.0,
+        }
+
+
+_cache: Optional[RenderCache] = None
+_cache_lock = threading.Lock()
+
+def get_render_cache() -> Optional[RenderCache]:
+    """None si render_cache_path est vide (cache désactivé)."""
+    global _cache
+    if not settings.render_cache_path:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RenderCache(
+                    settings.render_cache_path,
+                    ttl_seconds=settings.render_cache_ttl_seconds,
+                    max_entries=settings.render_cache_max_entries,
+                )
+    return _cache
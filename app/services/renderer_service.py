@@ -1,14 +1,24 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
 import traceback
-from typing import Optional, Dict, Any
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, AsyncIterator, Callable, List
+from urllib.parse import urlsplit
+from fastapi import HTTPException
+from playwright.async_api import TimeoutError as PWTimeoutError
+from app.core import settings
 from app.exceptions import RenderError
+from app.base.clients import get_clients
+from app.services.browser_pool import DEFAULT_USER_AGENT, get_browser_pool
+from app.services.render_cache import CachedRender, get_render_cache
 
-DEFAULT_USER_AGENT = (
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
-def _wait_for_spa(page, wait_ms: int, extra_selector: Optional[str] = None):
+async def _wait_for_spa(page, wait_ms: int, extra_selector: Optional[str] = None):
     """
     Stabilise les SPA:
     - attend DOMContentLoaded + networkidle
@@ -16,9 +26,9 @@ def _wait_for_spa(page, wait_ms: int, extra_selector: Optional[str] = None):
     - attend en plus wait_ms si demandé
     """
     # 1) États de charge
-    page.wait_for_load_state("domcontentloaded")
+    await page.wait_for_load_state("domcontentloaded")
     try:
-        page.wait_for_load_state("networkidle", timeout=5000)
+        await page.wait_for_load_state("networkidle", timeout=5000)
     except PWTimeoutError:
         # Certaines apps ne déclenchent jamais "networkidle": on tolère
         pass
@@ -26,36 +36,35 @@ def _wait_for_spa(page, wait_ms: int, extra_selector: Optional[str] = None):
     # 2) Un sélecteur "garde-fou" pour le contenu (adapte si tu connais la cible)
     selector = extra_selector or "main, #root, #app, body"
     try:
-        page.wait_for_selector(selector, state="attached", timeout=10000)
+        await page.wait_for_selector(selector, state="attached", timeout=10000)
     except PWTimeoutError as e:
         # On ne stoppe pas forcément, certaines pages rendent dans body sans sous-sélecteurs
         pass
 
     # 3) Attente additionnelle
     if wait_ms and wait_ms > 0:
-        page.wait_for_timeout(wait_ms)
+        await page.wait_for_timeout(wait_ms)
 
-def render_page(url: str, wait_ms: int = 3500, timeout_ms: int = 20000, extra_selector: Optional[str] = None) -> Dict[str, Any]:
+async def render_page(url: str, wait_ms: int = 3500, timeout_ms: int = 20000, extra_selector: Optional[str] = None) -> Dict[str, Any]:
     url = str(url)  
     console_logs = []
     req_errors = []
 
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True, args=["--no-sandbox"])
-            context = browser.new_context(
-                user_agent=DEFAULT_USER_AGENT,
-                viewport={"width": 1366, "height": 768}
-            )
-            page = context.new_page()
+        # contexte isolé sur un Chromium chaud du pool partagé (app/services/browser_pool.py)
+        async with get_browser_pool().context(
+            user_agent=DEFAULT_USER_AGENT,
+            viewport={"width": 1366, "height": 768}
+        ) as context:
+            page = await context.new_page()
 
             # Collecte console & erreurs réseau pour debug
-            page.on("console", lambda msg: console_logs.append({"type": msg.type(), "text": msg.text()}))
-            page.on("requestfailed", lambda req: req_errors.append({"url": req.url, "failure": (req.failure() or {}).get("errorText")}))
+            page.on("console", lambda msg: console_logs.append({"type": msg.type, "text": msg.text}))
+            page.on("requestfailed", lambda req: req_errors.append({"url": req.url, "failure": req.failure}))
 
             # GOTO
             try:
-                resp = page.goto(url, timeout=timeout_ms, wait_until="domcontentloaded")
+                resp = await page.goto(url, timeout=timeout_ms, wait_until="domcontentloaded")
                 
             except PWTimeoutError as e:
                 raise RenderError(
@@ -79,24 +88,22 @@ def render_page(url: str, wait_ms: int = 3500, timeout_ms: int = 20000, extra_se
             # Attendre un conteneur stable (SPA)
             selector = extra_selector or "#main_pane_container, .resource-guide-content-area, main, #root, #app, body"
             try:
-                page.wait_for_selector(selector, state="attached", timeout=10000)
+                await page.wait_for_selector(selector, state="attached", timeout=10000)
             except PWTimeoutError:
                 pass
 
             # Attente additionnelle optionnelle
             if wait_ms and wait_ms > 0:
-                page.wait_for_timeout(wait_ms)
+                await page.wait_for_timeout(wait_ms)
 
             # >>> Remplace l'extraction HTML <<<
             # Évite page.content() pour contourner "'str' object is not callable"
             try:
                 # Méthode Playwright standard (si elle marche dans ton env)
-                html = page.content()
+                html = await page.content()
             except TypeError:
                 # Fallback robuste : récupère l’HTML via le DOM
-                html = page.evaluate("() => document.documentElement.outerHTML")
-
-            browser.close()
+                html = await page.evaluate("() => document.documentElement.outerHTML")
 
             return {
                 "url": url,
@@ -117,3 +124,341 @@ def render_page(url: str, wait_ms: int = 3500, timeout_ms: int = 20000, extra_se
             code="UNHANDLED",
             stack=traceback.format_exc(),
         )
+
+
+DEFAULT_SELECTOR = ".resource-guide-content-area, #main_pane_container"
+
+READINESS_JS = r"""
+(p) => {
+  const el = document.querySelector(p.sel);
+  if (!el) return false;
+  const text = el.innerText || "";
+  const html = el.innerHTML || "";
+  const hasLoadingText = /loading\.\.\./i.test(text);
+  const hasSpinner = html.includes("<svg") && html.toLowerCase().includes("animate");
+  if (hasLoadingText || hasSpinner) return false;
+  const hasBlocks = el.querySelector("h1,h2,h3,p,article,section") !== null;
+  const hasLinks = el.querySelectorAll("a").length >= 3;
+  const htmlLongEnough = html.replace(/\s+/g, "").length > 2000;
+  return hasBlocks || hasLinks || htmlLongEnough;
+}
+"""
+
+EXTRACT_JS = """
+(p) => {
+  const el = document.querySelector(p.sel);
+  if (!el) return { ok: false, reason: "not_found" };
+  if (p.mode === "inner_text") return { ok: true, content: el.innerText };
+  return { ok: true, content: el.innerHTML };
+}
+"""
+
+# rendu "light" : prêt quand READINESS_JS passe et que le sous-arbre du sélecteur
+# n'a plus muté depuis p.stable ms (MutationObserver) ; false à l'échéance p.timeout
+STABLE_JS = "(p) => { const ready = " + READINESS_JS.strip() + """;
+  return new Promise((resolve) => {
+    const deadline = Date.now() + p.timeout;
+    let observer = null, timer = null;
+    const finish = (ok) => {
+      if (observer) observer.disconnect();
+      clearTimeout(timer);
+      clearInterval(poll);
+      resolve(ok);
+    };
+    const arm = () => {
+      clearTimeout(timer);
+      timer = setTimeout(() => (ready(p) ? finish(true) : arm()), p.stable);
+    };
+    const poll = setInterval(() => {
+      if (Date.now() > deadline) return finish(false);
+      const el = document.querySelector(p.sel);
+      if (!el || observer) return;
+      observer = new MutationObserver(arm);
+      observer.observe(el, { subtree: true, childList: true, characterData: true, attributes: true });
+      arm();
+    }, 50);
+  });
+}"""
+
+# ressources inutiles pour innerHTML / innerText
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+
+
+def _site(host: str) -> str:
+    """Domaine "enregistrable" approché : deux derniers labels (app.mwater.co -> mwater.co)."""
+    return ".".join((host or "").lower().split(".")[-2:])
+
+
+def _is_third_party(url: str, site: str) -> bool:
+    host = (urlsplit(url).hostname or "").lower()
+    if not host or _site(host) == site:
+        return False
+    return not any(host == h or host.endswith("." + h) for h in settings.render_third_party_allow)
+
+
+async def _block_resources(context, url: str, blocked: List[str]) -> None:
+    """Intercepte les requêtes du contexte : images, médias, polices et tiers (analytics, CDN vidéo…) sont annulés."""
+    site = _site(urlsplit(url).hostname or "")
+
+    async def handler(route) -> None:
+        request = route.request
+        if request.resource_type in BLOCKED_RESOURCE_TYPES or (
+            settings.render_block_third_party and _is_third_party(request.url, site)
+        ):
+            blocked.append(request.url)
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await context.route("**/*", handler)
+
+
+async def extract_page(
+    url: str,
+    sel: str,
+    mode: str,
+    wait_ms: int,
+    timeout_ms: int,
+    render: str = "full",
+    validators: Optional[Dict[str, Optional[str]]] = None,
+) -> dict:
+    """
+    Rendu de `url` sur le pool Chromium partagé et extraction du sélecteur (HTTPException en cas d'échec).
+    render="full" : toutes les ressources, sélecteur + readiness + wait_ms ;
+    render="light" : ressources bloquées, attente remplacée par "contenu stable depuis render_stable_ms".
+    validators (optionnel) reçoit l'ETag / Last-Modified du document.
+    """
+    blocked: List[str] = []
+    try:
+        async with get_browser_pool().context(user_agent=DEFAULT_USER_AGENT, viewport={"width": 1366, "height": 900}) as context:
+            if render == "light":
+                await _block_resources(context, url, blocked)
+            page = await context.new_page()
+
+            try:
+                resp = await page.goto(url, timeout=timeout_ms, wait_until="domcontentloaded")
+            except PWTimeoutError:
+                raise HTTPException(status_code=504, detail={
+                    "status": "fail", "message": f"Timeout during navigation to {url}", "step": "goto"
+                })
+            if validators is not None and resp is not None:
+                validators["etag"] = resp.headers.get("etag")
+                validators["last_modified"] = resp.headers.get("last-modified")
+
+            if render == "light":
+                stable = await page.evaluate(STABLE_JS, {"sel": sel, "stable": settings.render_stable_ms, "timeout": timeout_ms})
+                if not stable:
+                    raise HTTPException(status_code=504, detail={
+                        "status": "fail",
+                        "message": f"Content not stable for selector: {sel}",
+                        "step": "wait_for_stable"
+                    })
+            else:
+                try:
+                    await page.wait_for_selector(sel, state="attached", timeout=15000)
+                except PWTimeoutError:
+                    raise HTTPException(status_code=504, detail={
+                        "status": "fail", "message": f"Selector not found: {sel}", "step": "wait_for_selector"
+                    })
+
+                try:
+                    await page.wait_for_function(READINESS_JS, arg={"sel": sel}, timeout=timeout_ms)
+                except PWTimeoutError:
+                    await page.wait_for_timeout(3000)
+                    try:
+                        await page.wait_for_function(READINESS_JS, arg={"sel": sel}, timeout=5000)
+                    except PWTimeoutError:
+                        raise HTTPException(status_code=504, detail={
+                            "status": "fail",
+                            "message": f"Content still loading for selector: {sel}",
+                            "step": "wait_for_function"
+                        })
+
+                if wait_ms > 0:
+                    await page.wait_for_timeout(wait_ms)
+
+            result = await page.evaluate(EXTRACT_JS, {"sel": sel, "mode": mode})
+
+        if not result or not result.get("ok"):
+            raise HTTPException(status_code=422, detail={
+                "status": "fail", "message": f"Extraction failed for selector: {sel}",
+                "step": "evaluate", "reason": result.get("reason") if isinstance(result, dict) else "unknown"
+            })
+
+        return {
+            "status": "success",
+            "id": content_id(url),
+            "url": url,
+            "selector_used": sel,
+            "mode": mode,
+            "render": render,
+            "blocked_requests": len(blocked),
+            # hash du contenu extrait : l'ingestion ignore les pages inchangées
+            "content_hash": hashlib.sha256((result["content"] or "").encode("utf-8")).hexdigest(),
+            "html": result["content"] if mode == "inner_html" else None,
+            "text": result["content"] if mode == "inner_text" else None,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail={
+            "status": "fail", "message": f"Unexpected error rendering {url}: {e!r}", "step": "unhandled"
+        })
+
+
+class HostRateLimiter:
+    """Par hôte : au plus max_concurrency rendus simultanés et min_interval secondes entre deux démarrages."""
+    def __init__(self, max_concurrency: int = 2, min_interval: float = 0.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_interval = min_interval
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+        self._next_start: Dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        host = urlsplit(url).hostname or ""
+        sem = self._sems.setdefault(host, asyncio.Semaphore(self.max_concurrency))
+        async with sem:
+            if self.min_interval:
+                # créneau réservé avant d'attendre : les démarrages restent espacés
+                now = time.monotonic()
+                start = max(now, self._next_start.get(host, 0.0))
+                self._next_start[host] = start + self.min_interval
+                if start > now:
+                    await asyncio.sleep(start - now)
+            yield
+
+
+_host_limiter: Optional[HostRateLimiter] = None
+_host_limiter_lock = threading.Lock()
+
+def get_host_limiter() -> HostRateLimiter:
+    """Partagé par tous les lots : les limites par hôte valent pour le process entier."""
+    global _host_limiter
+    if _host_limiter is None:
+        with _host_limiter_lock:
+            if _host_limiter is None:
+                _host_limiter = HostRateLimiter(
+                    settings.render_host_max_concurrency,
+                    settings.render_host_min_interval_ms / 1000,
+                )
+    return _host_limiter
+
+
+def content_id(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+@asynccontextmanager
+async def _no_gate() -> AsyncIterator[None]:
+    yield
+
+
+async def _not_modified(url: str, entry: CachedRender) -> bool:
+    """Requête conditionnelle (If-None-Match / If-Modified-Since) : True si l'origine répond 304."""
+    headers = {"User-Agent": DEFAULT_USER_AGENT}
+    if entry.etag:
+        headers["If-None-Match"] = entry.etag
+    if entry.last_modified:
+        headers["If-Modified-Since"] = entry.last_modified
+    try:
+        # stream : le corps d'une réponse 200 n'est pas téléchargé, la page sera rendue de toute façon
+        async with get_clients().http().stream("GET", url, headers=headers, follow_redirects=True, timeout=10) as resp:
+            return resp.status_code == 304
+    except Exception as e:
+        logger.warning(f"Revalidation impossible pour {url} : {e}")
+        return False
+
+
+async def extract_cached(
+    url: str,
+    sel: str,
+    mode: str,
+    wait_ms: int,
+    timeout_ms: int,
+    render: str = "full",
+    *,
+    refresh: bool = False,
+    gate: Optional[Callable[[], Any]] = None,
+) -> dict:
+    """
+    extract_page derrière le cache de rendus (app/services/render_cache.py) :
+    entrée fraîche -> "hit" ; périmée -> requête conditionnelle, "revalidated" sur 304 tant que
+    l'entrée a moins de render_cache_max_revalidations revalidations (le shell d'une SPA reste en 304
+    quand son contenu XHR change) ; sinon rendu ("miss"), avec content_changed par rapport au rendu précédent.
+    Les accès sqlite passent par un thread pour ne pas bloquer la boucle.
+    `gate()` encadre les accès réseau (limites par hôte du rendu par lots), refresh=True force le rendu.
+    """
+    gate = gate or _no_gate
+    cache = get_render_cache()
+    if cache is None:
+        async with gate():
+            return await extract_page(url, sel, mode, wait_ms, timeout_ms, render)
+
+    key = cache.make_key(url, sel, mode, render)
+    entry = await asyncio.to_thread(cache.get, key)
+    if entry is not None and not refresh:
+        if entry.fresh:
+            cache.hits += 1
+            return {**entry.result, "cache": "hit", "content_changed": False}
+        if (entry.etag or entry.last_modified) and entry.revalidations < settings.render_cache_max_revalidations:
+            async with gate():
+                unchanged = await _not_modified(url, entry)
+            if unchanged:
+                await asyncio.to_thread(cache.touch, key)
+                cache.revalidated += 1
+                return {**entry.result, "cache": "revalidated", "content_changed": False}
+
+    cache.misses += 1
+    validators: Dict[str, Optional[str]] = {}
+    async with gate():
+        result = await extract_page(url, sel, mode, wait_ms, timeout_ms, render, validators=validators)
+    await asyncio.to_thread(cache.put, key, result, validators.get("etag"), validators.get("last_modified"))
+    changed = entry.result.get("content_hash") != result["content_hash"] if entry is not None else None
+    return {**result, "cache": "miss", "content_changed": changed}
+
+
+async def render_many(
+    jobs: List[Any],
+    sel: str,
+    mode: str,
+    *,
+    render: str = "full",
+    refresh: bool = False,
+    concurrency: Optional[int] = None,
+    limiter: Optional[HostRateLimiter] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Rend une liste de Job (url, wait_ms, timeout_ms) sur le pool Chromium, résultats dans
+    l'ordre d'arrivée : même forme que /render/extract, ou {"status": "fail", "url", "status_code", ...}.
+    Les rendus encore en cours sont annulés si l'itération s'arrête (client déconnecté, job annulé).
+    """
+    limiter = limiter or get_host_limiter()
+    sem = asyncio.Semaphore(max(1, concurrency or settings.render_batch_concurrency))
+
+    async def _one(job) -> Dict[str, Any]:
+        url = str(job.url)
+
+        @asynccontextmanager
+        async def gate() -> AsyncIterator[None]:
+            # hôte d'abord : un hôte lent n'occupe pas les places des autres ; rien à attendre si le cache répond
+            async with limiter.slot(url), sem:
+                yield
+
+        try:
+            return await extract_cached(
+                url, sel, mode, int(job.wait_ms or 0), int(job.timeout_ms or 100000), render,
+                refresh=refresh, gate=gate,
+            )
+        except HTTPException as he:
+            detail = he.detail if isinstance(he.detail, dict) else {"message": str(he.detail)}
+            return {**detail, "status": "fail", "id": content_id(url), "url": url, "status_code": he.status_code}
+
+    tasks = [asyncio.ensure_future(_one(job)) for job in jobs]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
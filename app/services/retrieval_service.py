@@ -0,0 +1,69 @@
+from __future__ import annotations
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from app.agents.embedder import generate_embedding_gemini
+from app.base.executor import run_blocking
+from app.core import settings
+from app.utils.langue import LangInfo, atranslate_mg_to_fr, detect_lang
+from app.utils.utils import rrf_fuse
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# recherche Milvus synchrone à partir d'un embedding de question (search_by_vector, formation_by_vector)
+VectorSearch = Callable[[List[float]], List[Dict[str, Any]]]
+
+
+@dataclass
+class Retrieval:
+    question: str
+    lang: LangInfo
+    query_vector: List[float]                 # embedding de la question originale
+    results: List[Dict[str, Any]]
+    translated: Optional[str] = None          # question traduite en FR si malagasy
+
+
+async def _embed_and_search(text: str, search: VectorSearch):
+    vector = await run_blocking("embedding", generate_embedding_gemini, text)
+    results = await run_blocking("milvus", search, vector)
+    return vector, results
+
+
+async def _translate_embed_and_search(text: str, search: VectorSearch):
+    try:
+        translated = await atranslate_mg_to_fr(text)
+    except Exception as e:
+        # la branche sur la question originale suffit à répondre
+        logger.warning(f"Traduction MG->FR échouée, recherche sur la question originale seule : {e}")
+        return None, []
+    if not translated or translated == text:
+        return None, []
+    _, results = await _embed_and_search(translated, search)
+    return translated, results
+
+
+async def retrieve(question: str, search: VectorSearch) -> Retrieval:
+    """
+    Détecte la langue une seule fois, puis en parallèle :
+    - embedding + recherche sur la question originale
+    - si malagasy : traduction MG->FR, puis embedding + recherche sur la traduction
+    Les deux listes sont fusionnées par RRF (chunks trouvés par les deux branches en tête).
+    Toutes les branches renvoient au plus retrieval_fused_limit résultats.
+    """
+    limit = settings.retrieval_fused_limit
+    lang = detect_lang(question)
+    if not lang.translate_to_fr:
+        vector, results = await _embed_and_search(question, search)
+        return Retrieval(question, lang, vector, results[:limit])
+
+    (vector, original), (translated, from_translation) = await asyncio.gather(
+        _embed_and_search(question, search),
+        _translate_embed_and_search(question, search),
+    )
+    results = original[:limit]
+    if from_translation:
+        results = rrf_fuse([from_translation, original], k=settings.retrieval_rrf_k, limit=limit)
+    return Retrieval(question, lang, vector, results, translated)
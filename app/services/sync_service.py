@@ -0,0 +1,98 @@
+from __future__ import annotations
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Any, Callable, Dict, Optional
+
+from app.services.ingestion_pipeline import IngestionReport
+from app.services.job_service import JobCancelled, JobContext
+from app.services.milvus_multilingual_service import get_milvus_multilingual_service
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SYNC_SOURCES = ("survey", "console", "document", "page")
+
+# un verrou par source, partagé par les jobs "ingest" et "sync_all"
+_source_locks = {name: threading.Lock() for name in SYNC_SOURCES}
+
+
+def ingest_source(
+    name: str,
+    incremental: Optional[bool] = None,
+    progress: Optional[Callable[[IngestionReport], None]] = None,
+    after_id: Optional[str] = None,
+) -> IngestionReport:
+    """Ingestion d'une source sous son verrou : deux jobs n'indexent jamais la même source en même temps."""
+    if name not in SYNC_SOURCES:
+        raise ValueError(f"Source inconnue : {name}")
+    lock = _source_locks[name]
+    if not lock.acquire(blocking=False):
+        raise RuntimeError(f"Ingestion {name} déjà en cours")
+    try:
+        return get_milvus_multilingual_service().ingest(name, incremental, progress=progress, after_id=after_id)
+    finally:
+        lock.release()
+
+
+def sync_all_job(ctx: JobContext) -> Dict[str, Any]:
+    """
+    Job "sync_all" (params: sources, full) : lance les pipelines d'ingestion des sources en parallèle
+    (un thread par source). Les embedders sont partagés, donc leur RateLimiter borne le débit total vers
+    le fournisseur : la durée d'un sync complet est celle de la source la plus lente.
+    Checkpoint = after_id de chaque source et sources terminées sans erreur, ignorées à la reprise.
+    """
+    sources = list(ctx.params.get("sources") or SYNC_SOURCES)
+    unknown = [s for s in sources if s not in SYNC_SOURCES]
+    if unknown:
+        raise ValueError(f"Sources inconnues : {unknown}")
+    incremental = not ctx.params.get("full", False)
+    checkpoint: Dict[str, Dict[str, Any]] = {name: dict(state) for name, state in (ctx.checkpoint.get("sources") or {}).items()}
+    states: Dict[str, Dict[str, Any]] = {
+        name: {"status": "pending", "report": None, "error": None} for name in sources
+    }
+    lock = threading.Lock()
+
+    def publish(save: bool = False) -> None:
+        with lock:
+            ctx.set_progress({name: dict(state) for name, state in states.items()})
+            if save:
+                ctx.save_checkpoint({"sources": {name: dict(state) for name, state in checkpoint.items()}})
+
+    def run_source(name: str) -> None:
+        done = checkpoint.get(name, {})
+        if done.get("done"):
+            states[name].update(status="done", report=done.get("report"))
+            return
+        states[name]["status"] = "running"
+        publish()
+
+        def progress(report: IngestionReport) -> None:
+            states[name]["report"] = asdict(report)
+            if report.last_doc_id:
+                checkpoint[name] = {"after_id": report.last_doc_id}
+            publish(save=True)
+            ctx.raise_if_cancelled()
+
+        try:
+            report = ingest_source(name, incremental, progress=progress, after_id=done.get("after_id"))
+            states[name].update(status="done" if not report.errors else "partial", report=asdict(report))
+            if not report.errors:
+                checkpoint[name] = {"done": True, "report": asdict(report)}
+        except JobCancelled:
+            raise
+        except Exception as e:
+            logger.exception(f"Sync {ctx.job_id} : ingestion {name} échouée")
+            states[name].update(status="failed", error=str(e))
+        publish(save=True)
+
+    with ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="sync") as pool:
+        futures = [pool.submit(run_source, name) for name in sources]
+    for fut in futures:
+        fut.result()  # toutes les sources sont arrêtées, relance JobCancelled
+
+    statuses = {state["status"] for state in states.values()}
+    status = "done" if statuses == {"done"} else "failed" if statuses == {"failed"} else "partial"
+    logger.info(f"Sync {ctx.job_id} terminé : {status}")
+    return {"status": status, "sources": states}
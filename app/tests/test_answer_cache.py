@@ -0,0 +1,36 @@
+from app.agents.answer_cache import SemanticAnswerCache
+
+
+RESULTS = [{"id": "1", "doc_id": "d1", "rev": 3, "content": "a"}, {"id": "2", "doc_id": "d2", "rev": 1, "content": "b"}]
+
+
+def test_hit_above_threshold_only():
+    cache = SemanticAnswerCache(threshold=0.95)
+    bucket = cache.bucket_key("search", "fr", ["p"], RESULTS)
+    cache.store(bucket, [1.0, 0.0], "reponse", RESULTS)
+    assert cache.lookup(bucket, [0.99, 0.05]) == "reponse"
+    assert cache.lookup(bucket, [0.0, 1.0]) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_context_rev_and_partitions_change_bucket():
+    cache = SemanticAnswerCache()
+    bucket = cache.bucket_key("search", "fr", ["p"], RESULTS)
+    cache.store(bucket, [1.0, 0.0], "reponse", RESULTS)
+    changed = [dict(RESULTS[0], rev=4), RESULTS[1]]
+    assert cache.lookup(cache.bucket_key("search", "fr", ["p"], changed), [1.0, 0.0]) is None
+    assert cache.lookup(cache.bucket_key("search", "fr", ["q"], RESULTS), [1.0, 0.0]) is None
+    assert cache.lookup(cache.bucket_key("search", "fr", ["p"], list(reversed(RESULTS))), [1.0, 0.0]) == "reponse"
+
+
+def test_invalidate_docs_and_lru_eviction():
+    cache = SemanticAnswerCache(max_entries=2)
+    buckets = [cache.bucket_key("search", "fr", None, [{"id": str(i), "doc_id": f"d{i}", "rev": 1}]) for i in range(3)]
+    for i, bucket in enumerate(buckets[:2]):
+        cache.store(bucket, [1.0, 0.0], f"r{i}", [{"id": str(i), "doc_id": f"d{i}", "rev": 1}])
+    assert cache.lookup(buckets[0], [1.0, 0.0]) == "r0"
+    cache.store(buckets[2], [1.0, 0.0], "r2", [{"id": "2", "doc_id": "d2", "rev": 1}])
+    assert cache.lookup(buckets[1], [1.0, 0.0]) is None
+    assert cache.invalidate_docs(["d0"]) == 1
+    assert cache.lookup(buckets[0], [1.0, 0.0]) is None
+    assert cache.lookup(buckets[2], [1.0, 0.0]) == "r2"
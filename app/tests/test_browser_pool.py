@@ -0,0 +1,97 @@
+import asyncio
+
+from app.services.browser_pool import BrowserPool, _BrowserSlot
+
+
+class FakeContext:
+    async def close(self):
+        pass
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.closed = False
+        self._on_disconnected = None
+
+    def on(self, event, callback):
+        self._on_disconnected = callback
+
+    def crash(self):
+        self._on_disconnected(self)
+
+    async def new_context(self, **kwargs):
+        return FakeContext()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakePool(BrowserPool):
+    """Navigateurs factices : pas de playwright, lancements observables."""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._playwright = object()
+        self.launched = []
+
+    async def _launch(self):
+        browser = FakeBrowser()
+        self.launched.append(browser)
+        return _BrowserSlot(browser)
+
+
+def test_browser_recycled_after_n_pages_and_closed_once_idle():
+    async def main():
+        pool = FakePool(size=1, max_pages=2, recycle_after=2)
+        first = await pool._acquire_slot()
+        second = await pool._acquire_slot()
+        assert second is first and first.retiring
+        third = await pool._acquire_slot()
+        assert third is not first and pool.recycled == 1
+        # pages encore ouvertes sur l'ancien navigateur : fermé à la dernière libération
+        await pool._release_slot(first)
+        assert not first.browser.closed
+        await pool._release_slot(second)
+        assert first.browser.closed
+        await pool._release_slot(third)
+        assert len(pool.launched) == 2 and not third.browser.closed
+
+    asyncio.run(main())
+
+
+def test_crashed_browser_replaced_on_next_acquire():
+    async def main():
+        pool = FakePool(size=1, max_pages=2, recycle_after=0)
+        slot = await pool._acquire_slot()
+        await pool._release_slot(slot)
+        slot.browser.crash()
+        replacement = await pool._acquire_slot()
+        await asyncio.sleep(0)  # fermeture de l'ancien navigateur planifiée
+        assert replacement is not slot and pool.crashes == 1 and slot.browser.closed
+        assert pool.stats()["browsers"] == [{"active": 1, "pages_served": 1, "retiring": False, "crashed": False}]
+
+    asyncio.run(main())
+
+
+def test_queue_accounting_bounded_by_max_pages():
+    async def main():
+        pool = FakePool(size=1, max_pages=2, recycle_after=0)
+        release = asyncio.Event()
+        peak = 0
+
+        async def render():
+            nonlocal peak
+            async with pool.context():
+                peak = max(peak, pool.in_use)
+                await release.wait()
+
+        tasks = [asyncio.ensure_future(render()) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        stats = pool.stats()
+        assert stats["in_use"] == 2 and stats["queue_depth"] == 3
+        release.set()
+        await asyncio.gather(*tasks)
+        stats = pool.stats()
+        assert peak == 2 and stats["in_use"] == 0 and stats["queue_depth"] == 0
+        assert stats["pages_served"] == 5 and pool.acquired == 5
+
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+import re
+
+from app.utils.chunker import Chunker, chunk_many, encoding, split_text
+
+
+def reference_split(text, max_tokens=500, overlap=100):
+    """Ancien split_into_chunks (ré-encode les phrases), pour vérifier que la sortie ne change pas."""
+    sentences = re.split(r'(?<=[.?!])\s+', text.strip())
+    chunks, current_chunk, current_tokens = [], [], 0
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        token_count = len(encoding.encode(sentence))
+        if current_tokens + token_count > max_tokens:
+            chunk_text = " ".join(current_chunk).strip()
+            if chunk_text:
+                chunks.append(chunk_text)
+            overlap_tokens, overlap_chunk = 0, []
+            for s in reversed(current_chunk):
+                s_tokens = len(encoding.encode(s))
+                if overlap_tokens + s_tokens <= overlap:
+                    overlap_chunk.insert(0, s)
+                    overlap_tokens += s_tokens
+                else:
+                    break
+            current_chunk = overlap_chunk.copy()
+            current_tokens = sum(len(encoding.encode(s)) for s in current_chunk)
+        current_chunk.append(sentence)
+        current_tokens += token_count
+    if current_chunk:
+        chunk_text = " ".join(current_chunk).strip()
+        if chunk_text:
+            chunks.append(chunk_text)
+    return chunks
+
+
+TEXT = " ".join(
+    f"Phrase numéro {i} du questionnaire, avec quelques mots de plus pour varier la longueur{'!' if i % 3 else '.'}" * (1 + i % 4)
+    for i in range(120)
+)
+
+
+def test_same_output_as_previous_algorithm():
+    assert split_text(TEXT) == reference_split(TEXT)
+    longest = max(len(encoding.encode(s)) for s in re.split(r'(?<=[.?!])\s+', TEXT))
+    assert split_text(TEXT, max_tokens=longest, overlap=50) == reference_split(TEXT, max_tokens=longest, overlap=50)
+
+
+def test_oversized_sentence_is_split_on_token_boundaries():
+    sentence = "mot " * 1300
+    n_tokens = len(encoding.encode(sentence.strip()))
+    chunks = Chunker(max_tokens=500, overlap=0).split(sentence)
+    assert len(chunks) == -(-n_tokens // 500)
+    assert all(len(encoding.encode(c)) <= 500 for c in chunks)
+    assert " ".join(chunks).split() == sentence.split()
+
+
+def test_chunks_respect_byte_limit():
+    chunks = Chunker(max_tokens=5000, overlap=0, max_bytes=100).split("é" * 1000)
+    assert chunks and all(len(c.encode("utf-8")) <= 100 for c in chunks)
+
+
+def test_chunk_many_inline_matches_split():
+    texts = [TEXT, "", "Une seule phrase."]
+    assert chunk_many(texts) == [split_text(t) for t in texts]
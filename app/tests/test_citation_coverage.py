@@ -0,0 +1,13 @@
+from app.utils.utils import citation_coverage
+
+
+def test_coverage_counts_each_document_once():
+    results = [
+        {"doc_id": "d1", "nom": "Créer un formulaire", "emplacement": ["Formulaires", "Création"]},
+        {"doc_id": "d1", "nom": "Créer un formulaire", "emplacement": ["Formulaires", "Création"]},
+        {"doc_id": "d2", "nom": "Exporter les données", "emplacement": "https://docs.example/export"},
+    ]
+    assert citation_coverage("Voir « créer un   formulaire ».", results) == 0.5
+    assert citation_coverage("Références : https://docs.example/export, Créer un formulaire", results) == 1.0
+    assert citation_coverage("Aucune référence.", results) == 0.0
+    assert citation_coverage("Créer un formulaire", []) == 0.0
@@ -0,0 +1,47 @@
+import json
+
+from app.prompt.context_packer import overlap_length, pack_context, stitch
+from app.utils.tokens import TokenCounter
+
+
+def _hit(id, doc_id, chunk_index, content, score=0.9, nom="n"):
+    return {"id": id, "doc_id": doc_id, "chunk_index": chunk_index, "content": content, "score": score, "nom": nom, "emplacement": ["e"]}
+
+
+def test_stitch_removes_chunker_overlap():
+    left = "Première phrase du document. Deuxième phrase qui se répète."
+    right = "Deuxième phrase qui se répète. Troisième phrase."
+    assert overlap_length(left, right) == len("Deuxième phrase qui se répète.")
+    assert stitch(left, right) == "Première phrase du document. Deuxième phrase qui se répète. Troisième phrase."
+    assert stitch("Fin.", ". Début") == "Fin. . Début"
+
+
+def test_adjacent_chunks_merged_and_gaps_marked():
+    hits = [
+        _hit("b", "d1", 1, "Deuxième phrase assez longue. Suite du texte.", 0.95),
+        _hit("a", "d1", 0, "Début du texte. Deuxième phrase assez longue.", 0.90),
+        _hit("c", "d1", 5, "Partie lointaine.", 0.86),
+        _hit("a", "d1", 0, "Début du texte. Deuxième phrase assez longue.", 0.90),
+    ]
+    items = json.loads(pack_context(hits, counter=TokenCounter()))
+    assert len(items) == 1
+    assert items[0]["content"] == "Début du texte. Deuxième phrase assez longue. Suite du texte. […] Partie lointaine."
+    assert items[0]["score"] == 0.95
+
+
+def test_budget_greedy_by_score_per_token_and_compact_json():
+    long_text = " ".join(["mot"] * 200)
+    hits = [_hit("1", "d1", 0, long_text, 0.99, "long"), _hit("2", "d2", 0, "Court et utile.", 0.90, "court")]
+    packed = pack_context(hits, budget_tokens=50, counter=TokenCounter())
+    assert "\n" not in packed
+    assert [i["nom"] for i in json.loads(packed)] == ["court"]
+    # au moins un segment même si rien ne tient
+    assert len(json.loads(pack_context(hits[:1], budget_tokens=5, counter=TokenCounter()))) == 1
+    assert len(json.loads(pack_context(hits, max_items=1, counter=TokenCounter()))) == 1
+
+
+def test_max_items_keeps_best_scored_documents():
+    long_text = " ".join(["mot"] * 200)
+    hits = [_hit("1", "d1", 0, long_text, 0.99, "pertinent"), _hit("2", "d2", 0, "Court.", 0.40, "court")]
+    # la densité du document court ne doit pas évincer le plus pertinent
+    assert [i["nom"] for i in json.loads(pack_context(hits, max_items=1, counter=TokenCounter()))] == ["pertinent"]
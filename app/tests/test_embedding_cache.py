@@ -0,0 +1,72 @@
+import numpy as np
+
+from app.agents.embedding_cache import EmbeddingCache, SqliteEmbeddingTier
+
+
+def test_normalized_hit_and_counters():
+    cache = EmbeddingCache(max_entries=10, ttl_seconds=None)
+    calls = []
+
+    def compute(text):
+        calls.append(text)
+        return [0.1, 0.2, 0.3]
+
+    v1 = cache.get_or_compute("m", "RETRIEVAL_QUERY", "Comment créer un formulaire", compute)
+    v2 = cache.get_or_compute("m", "RETRIEVAL_QUERY", "  comment   CRÉER un formulaire ", compute)
+    assert len(calls) == 1
+    assert v1.dtype == np.float32
+    assert np.array_equal(v1, v2)
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_key_includes_model_and_task_type():
+    cache = EmbeddingCache(max_entries=10, ttl_seconds=None)
+    cache.put("m1", "RETRIEVAL_QUERY", "texte", [1.0])
+    assert cache.get("m2", "RETRIEVAL_QUERY", "texte") is None
+    assert cache.get("m1", "RETRIEVAL_DOCUMENT", "texte") is None
+
+
+def test_lru_eviction():
+    cache = EmbeddingCache(max_entries=2, ttl_seconds=None)
+    cache.put("m", "q", "a", [1.0])
+    cache.put("m", "q", "b", [2.0])
+    cache.get("m", "q", "a")
+    cache.put("m", "q", "c", [3.0])
+    assert cache.get("m", "q", "b") is None
+    assert cache.get("m", "q", "a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiration(monkeypatch):
+    import app.agents.embedding_cache as mod
+    now = [1000.0]
+    monkeypatch.setattr(mod.time, "time", lambda: now[0])
+    cache = EmbeddingCache(max_entries=10, ttl_seconds=60)
+    cache.put("m", "q", "a", [1.0])
+    now[0] += 61
+    assert cache.get("m", "q", "a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_disk_tier_survives_new_memory_tier(tmp_path):
+    path = str(tmp_path / "emb.sqlite")
+    first = EmbeddingCache(max_entries=10, ttl_seconds=None, disk=SqliteEmbeddingTier(path))
+    first.put("m", "q", "a", [1.0, 2.0])
+    second = EmbeddingCache(max_entries=10, ttl_seconds=None, disk=SqliteEmbeddingTier(path))
+    vec = second.get("m", "q", "a")
+    assert vec is not None and vec.tolist() == [1.0, 2.0]
+    assert second.stats()["disk_hits"] == 1
+
+
+def test_disk_hit_keeps_original_age(tmp_path, monkeypatch):
+    import app.agents.embedding_cache as mod
+    now = [1000.0]
+    monkeypatch.setattr(mod.time, "time", lambda: now[0])
+    path = str(tmp_path / "emb.sqlite")
+    EmbeddingCache(max_entries=10, ttl_seconds=60, disk=SqliteEmbeddingTier(path)).put("m", "q", "a", [1.0])
+    now[0] += 50
+    cache = EmbeddingCache(max_entries=10, ttl_seconds=60, disk=SqliteEmbeddingTier(path))
+    assert cache.get("m", "q", "a") is not None
+    now[0] += 20
+    assert cache.get("m", "q", "a") is None
@@ -0,0 +1,30 @@
+import numpy as np
+
+from app.agents.embedding_store import EmbeddingStore
+
+
+def test_roundtrip_and_misses(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.put_many("m", "RETRIEVAL_DOCUMENT", ["a", "b"], [[1.0, 2.0], [3.0, 4.0]])
+    a, missing, b = store.get_many("m", "RETRIEVAL_DOCUMENT", ["a", "c", "b"])
+    assert a.dtype == np.float32 and a.tolist() == [1.0, 2.0]
+    assert missing is None
+    assert b.tolist() == [3.0, 4.0]
+    assert store.stats()["hits"] == 2 and store.stats()["misses"] == 1
+
+
+def test_key_includes_model_and_task_type(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.put_many("m1", "RETRIEVAL_DOCUMENT", ["a"], [[1.0]])
+    assert store.get_many("m2", "RETRIEVAL_DOCUMENT", ["a"]) == [None]
+    assert store.get_many("m1", "RETRIEVAL_QUERY", ["a"]) == [None]
+
+
+def test_persists_across_instances(tmp_path):
+    first = EmbeddingStore(str(tmp_path))
+    first.put_many("m", "q", ["a"], [[1.0, 2.0, 3.0]])
+    first.put_many("m", "q", ["b"], [[4.0, 5.0, 6.0]])
+    first.close()
+    second = EmbeddingStore(str(tmp_path))
+    assert [v.tolist() for v in second.get_many("m", "q", ["b", "a"])] == [[4.0, 5.0, 6.0], [1.0, 2.0, 3.0]]
+    assert second.stats()["models"]["m"] == {"dim": 3, "vectors": 2}
@@ -0,0 +1,39 @@
+from app.api.v1 import translate_route
+from app.api.v1.translate_route import _batches, translate_unique
+
+
+def test_batches_respect_item_and_char_limits():
+    assert _batches(["a"] * 5, max_items=2, max_chars=100) == [["a", "a"], ["a", "a"], ["a"]]
+    assert _batches(["aaaa", "bbbb", "cc"], max_items=10, max_chars=8) == [["aaaa", "bbbb"], ["cc"]]
+    # une chaîne plus longue que la limite part seule plutôt que d'être perdue
+    assert _batches(["x" * 20, "y"], max_items=10, max_chars=8) == [["x" * 20], ["y"]]
+    assert _batches([], max_items=10, max_chars=8) == []
+
+
+def test_translate_unique_dedups_after_freezing_tokens(monkeypatch):
+    calls = []
+
+    def fake_translate(texts, target, source):
+        calls.append((target, list(texts)))
+        return [t.replace("Bonjour", "Hello").replace("Merci", "Thanks") for t in texts]
+
+    monkeypatch.setattr(translate_route, "g_translate", fake_translate)
+    results, stats = translate_unique({"en": {"Bonjour {{name}}", "Bonjour {{user}}", "Merci", "  "}}, "fr")
+
+    assert results["en"] == {
+        "Bonjour {{name}}": "Hello {{name}}",
+        "Bonjour {{user}}": "Hello {{user}}",
+        "Merci": "Thanks",
+        "  ": "  ",
+    }
+    # "Bonjour __PH_0__" envoyé une seule fois, la chaîne vide jamais
+    assert calls == [("en", ["Bonjour __PH_0__", "Merci"])]
+    assert stats == {"unique_strings": 2, "requests": 1}
+
+
+def test_translate_unique_splits_requests_by_settings(monkeypatch):
+    monkeypatch.setattr(translate_route, "g_translate", lambda texts, target, source: [t.upper() for t in texts])
+    monkeypatch.setattr(translate_route.settings, "i18n_translate_batch_size", 2)
+    results, stats = translate_unique({"en": {"a", "b", "c"}, "mg": {"d"}}, "fr")
+    assert results == {"en": {"a": "A", "b": "B", "c": "C"}, "mg": {"d": "D"}}
+    assert stats == {"unique_strings": 4, "requests": 3}
@@ -0,0 +1,69 @@
+import asyncio
+
+from app.agents.manager import CircuitBreaker, LLMManager
+from app.agents.providers.base import BaseLLMProvider
+
+
+class FakeProvider(BaseLLMProvider):
+    def __init__(self, name, delay=0.0, fail=False):
+        self._name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def name(self):
+        return self._name
+
+    async def generate(self, prompt, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("panne")
+        return f"{self._name}:{prompt}"
+
+
+def test_breaker_opens_then_half_open_probe():
+    breaker = CircuitBreaker(failures=2, cooldown=0)
+    breaker.failure()
+    assert breaker.state == "closed"
+    breaker.failure()
+    assert breaker.state == "open"
+    assert breaker.allow() and breaker.state == "half-open"
+    assert not breaker.allow()  # un seul appel d'essai
+    breaker.success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_cancelled_probe_releases_half_open_slot():
+    slow = FakeProvider("slow", delay=1.0)
+    manager = LLMManager([slow], hedge=False, breaker_failures=1, breaker_cooldown=0)
+    breaker = manager._slots["slow"].breaker
+    breaker.failure()
+    assert breaker.state == "open"
+
+    async def main():
+        task = asyncio.ensure_future(manager.generate("q"))
+        await asyncio.sleep(0.01)
+        assert breaker.state == "half-open" and not breaker.allow()
+        task.cancel()  # client déconnecté pendant l'essai
+        await asyncio.gather(task, return_exceptions=True)
+        assert breaker.allow()
+        breaker.release_probe()
+        slow.delay = 0.0
+        assert await manager.generate("q") == "slow:q"
+
+    asyncio.run(main())
+    assert breaker.state == "closed" and slow.calls == 2
+
+
+def test_hedge_first_answer_wins_and_failover():
+    slow, fast = FakeProvider("slow", delay=0.5), FakeProvider("fast", delay=0.0)
+    manager = LLMManager([slow, fast], hedge_default_delay=0.01, hedge_min_delay=0.01)
+    assert asyncio.run(manager.generate("q", provider_name="slow")) == "fast:q"
+    assert manager.stats()["slow"]["hedges"] == 0 and manager.stats()["fast"]["hedges"] == 1
+    assert manager.stats()["fast"]["wins"] == 1
+
+    broken = FakeProvider("broken", fail=True)
+    manager = LLMManager([broken, fast], hedge=False)
+    assert asyncio.run(manager.generate("q", provider_name="broken")) == "fast:q"
+    assert manager.stats()["broken"]["errors"] == 1
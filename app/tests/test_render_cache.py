@@ -0,0 +1,31 @@
+import time
+
+from app.services.render_cache import RenderCache
+
+
+def test_put_get_expiry_and_touch(tmp_path):
+    cache = RenderCache(str(tmp_path / "renders.sqlite"), ttl_seconds=60, max_entries=1)
+    key = RenderCache.make_key("https://a.example/x", ".content", "inner_html", "full")
+    assert key != RenderCache.make_key("https://a.example/x", ".content", "inner_text", "full")
+    assert cache.get(key) is None
+
+    cache.put(key, {"url": "https://a.example/x", "html": "<p>é</p>" * 500, "content_hash": "h"}, etag='"e1"')
+    entry = cache.get(key)
+    assert entry.fresh and entry.etag == '"e1"' and entry.result["html"].startswith("<p>é</p>")
+    assert cache.stats()["compressed_bytes"] < len("<p>é</p>" * 500)
+
+    cache.ttl_seconds = 0.01
+    time.sleep(0.02)
+    assert not cache.get(key).fresh
+    cache.touch(key)
+    cache.ttl_seconds = 60
+    entry = cache.get(key)
+    assert entry.fresh and entry.revalidations == 1
+    cache.touch(key)
+    assert cache.get(key).revalidations == 2
+    cache.put(key, {"url": "https://a.example/x", "content_hash": "h2"})
+    assert cache.get(key).revalidations == 0
+
+    other = RenderCache.make_key("https://a.example/y", ".content", "inner_html", "full")
+    cache.put(other, {"url": "https://a.example/y"})
+    assert cache.get(key) is None and cache.get(other) is not None
@@ -0,0 +1,16 @@
+from app.utils.utils import rrf_fuse
+
+
+def test_chunks_found_by_both_lists_rank_first():
+    translated = [{"id": "a", "score": 0.90}, {"id": "b", "score": 0.88}]
+    original = [{"id": "c", "score": 0.95}, {"id": "b", "score": 0.91}]
+    fused = rrf_fuse([translated, original], k=60)
+    assert [h["id"] for h in fused] == ["b", "a", "c"]
+    assert fused[0]["score"] == 0.91
+    assert fused[0]["rrf_score"] == round(1 / 62 + 1 / 62, 6)
+
+
+def test_limit_and_empty_lists():
+    assert rrf_fuse([[], None]) == []
+    fused = rrf_fuse([[{"id": str(i)} for i in range(5)]], limit=2)
+    assert [h["id"] for h in fused] == ["0", "1"]
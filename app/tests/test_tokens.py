@@ -0,0 +1,38 @@
+import random
+
+from app.utils.tokens import TokenCounter, count_contents_tokens, prune_by_tokens
+
+
+def _msg(n_words):
+    return {"role": "user", "parts": [{"text": " ".join(["mot"] * n_words)}]}
+
+
+def _reference_prune(contents, max_tokens_ctx, garde_last_n=2):
+    # ancien algorithme : recompte toute la liste après chaque pop(0)
+    pruned = list(contents)
+    min_len = min(len(pruned), garde_last_n)
+    while len(pruned) > min_len and count_contents_tokens(pruned) > max_tokens_ctx:
+        pruned.pop(0)
+    return pruned
+
+
+def test_prune_matches_reference():
+    rng = random.Random(7)
+    for _ in range(200):
+        contents = [_msg(rng.randint(0, 40)) for _ in range(rng.randint(0, 12))]
+        budget = rng.randint(1, 300)
+        keep = rng.randint(0, 3)
+        assert prune_by_tokens(contents, budget, garde_last_n=keep, counter=TokenCounter()) == _reference_prune(contents, budget, keep)
+
+
+def test_calibrate_caches_exact_counts():
+    counter = TokenCounter()
+    calls = []
+    def exact(text):
+        calls.append(text)
+        return 2 * counter.estimate(text)
+    texts = ["un deux trois quatre", "cinq six"]
+    assert counter.calibrate(texts, exact) == 2.0
+    assert counter.calibrate(texts, exact) == 2.0
+    assert len(calls) == 2
+    assert counter.count_text("un deux trois quatre") == 2 * counter.estimate("un deux trois quatre")
@@ -0,0 +1,81 @@
+import asyncio
+
+from app.utils.translation_cache import SqliteTranslationTier, TranslationCache
+
+
+def test_normalized_hit_and_pair_in_key():
+    cache = TranslationCache(max_entries=10, ttl_seconds=None)
+    calls = []
+
+    def compute(text):
+        calls.append(text)
+        return "Comment créer un formulaire ?"
+
+    assert cache.translate("Ahoana ny famoronana  formulaire ?", "mg", "fr", compute) == "Comment créer un formulaire ?"
+    assert cache.translate("ahoana ny famoronana formulaire ?", "mg", "fr", compute) == "Comment créer un formulaire ?"
+    assert len(calls) == 1
+    assert cache.get("ahoana ny famoronana formulaire ?", "mg", "en") is None
+
+
+def test_concurrent_identical_questions_share_one_call():
+    cache = TranslationCache(max_entries=10, ttl_seconds=None)
+    calls = []
+
+    async def compute(text):
+        calls.append(text)
+        await asyncio.sleep(0.05)
+        return "traduit"
+
+    async def main():
+        return await asyncio.gather(*[cache.atranslate("Inona no vaovao", "mg", "fr", compute) for _ in range(5)])
+
+    assert asyncio.run(main()) == ["traduit"] * 5
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_errors_propagate_to_coalesced_callers_and_are_not_cached():
+    cache = TranslationCache(max_entries=10, ttl_seconds=None)
+
+    async def failing(text):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("quota")
+
+    async def main():
+        return await asyncio.gather(*[cache.atranslate("x y z", "mg", "fr", failing) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(main()))
+    assert cache.get("x y z", "mg", "fr") is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "tr.sqlite")
+    TranslationCache(disk=SqliteTranslationTier(path)).put("Salama", "mg", "fr", "Bonjour")
+    cache = TranslationCache(disk=SqliteTranslationTier(path))
+    assert cache.get("salama", "mg", "fr") == "Bonjour"
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_atranslate_reads_disk_tier_before_computing(tmp_path):
+    path = str(tmp_path / "tr.sqlite")
+    TranslationCache(disk=SqliteTranslationTier(path)).put("Salama", "mg", "fr", "Bonjour")
+    cache = TranslationCache(disk=SqliteTranslationTier(path))
+
+    async def compute(text):
+        raise AssertionError("traduction en cache disque")
+
+    assert asyncio.run(cache.atranslate("salama", "mg", "fr", compute)) == "Bonjour"
+    assert cache.stats()["disk_hits"] == 1 and cache.stats()["misses"] == 0
+
+
+def test_disk_hit_keeps_original_age(tmp_path, monkeypatch):
+    import app.utils.translation_cache as mod
+    now = [1000.0]
+    monkeypatch.setattr(mod.time, "time", lambda: now[0])
+    path = str(tmp_path / "tr.sqlite")
+    TranslationCache(ttl_seconds=60, disk=SqliteTranslationTier(path)).put("Salama", "mg", "fr", "Bonjour")
+    now[0] += 50
+    cache = TranslationCache(ttl_seconds=60, disk=SqliteTranslationTier(path))
+    assert cache.get("salama", "mg", "fr") == "Bonjour"
+    now[0] += 20
+    assert cache.get("salama", "mg", "fr") is None
@@ -0,0 +1,83 @@
+from app.api.v1.translate_route import _Pending, collect_pending, deep_merge_translate, hash_fr, resolve_translations
+from app.utils.translation_memory import NamespaceMemory, TranslationMemory
+
+
+def test_flush_then_reload_by_namespace_and_target(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "tm.sqlite"))
+    ns = NamespaceMemory(memory, "common", "en")
+    assert ns.get(("a",)) is None
+    ns.record(("a",), "h1", "pending-a")
+    ns.record(("b", 0), "h2", ["x", "y"])
+    ns.flush(lambda v: "Hello" if v == "pending-a" else v)
+
+    reloaded = NamespaceMemory(memory, "common", "en")
+    assert reloaded.get(("a",)) == ("h1", "Hello")
+    assert reloaded.get(("b", 0)) == ("h2", ["x", "y"])
+    assert NamespaceMemory(memory, "common", "mg").get(("a",)) is None
+    assert NamespaceMemory(memory, "common", "en", load=False).get(("a",)) is None
+
+
+class StubMemory:
+    """NamespaceMemory en mémoire : entrées initiales par chemin, enregistrements observables."""
+    def __init__(self, entries=None):
+        self.entries = dict(entries or {})
+        self.recorded = {}
+
+    def get(self, path):
+        return self.entries.get(path)
+
+    def record(self, path, source_hash, value):
+        self.recorded[path] = (source_hash, value)
+
+
+def _report():
+    return {"translated_count": 0, "new_count": 0, "stale_count": 0, "unchanged_count": 0}
+
+
+def _merge(fr, tgt, mode, memory):
+    report = _report()
+    return deep_merge_translate(fr, tgt, "en", "fr", mode, report, memory), report
+
+
+def test_new_stale_and_unchanged_leaves():
+    fr = {"title": "Titre", "intro": "Nouvelle intro", "items": ["Un", "Deux"], "added": "Ajouté", "n": 3}
+    tgt = {"title": "Title", "intro": "Old intro", "items": ["One", "Two"]}
+    memory = StubMemory({
+        ("title",): (hash_fr("Titre"), "Title"),
+        ("intro",): (hash_fr("Ancienne intro"), "Old intro"),
+        ("items",): (hash_fr(["Un", "Deux"]), ["One", "Two"]),
+    })
+    merged, report = _merge(fr, tgt, "missing", memory)
+
+    assert merged["title"] == "Title" and merged["items"] == ["One", "Two"] and merged["n"] == 3
+    assert isinstance(merged["intro"], _Pending) and isinstance(merged["added"], _Pending)
+    assert report == {"translated_count": 2, "new_count": 1, "stale_count": 1, "unchanged_count": 3}
+    assert collect_pending(merged, set()) == {"Nouvelle intro", "Ajouté"}
+    # les feuilles retraduites sont mémorisées avec le hash FR courant
+    assert memory.recorded[("intro",)][0] == hash_fr("Nouvelle intro")
+    assert set(memory.recorded) == {("intro",), ("added",)}
+
+    resolved = resolve_translations(merged, {"Nouvelle intro": "New intro", "Ajouté": "Added"})
+    assert resolved == {"title": "Title", "intro": "New intro", "items": ["One", "Two"], "added": "Added", "n": 3}
+
+
+def test_missing_mode_seeds_memory_with_existing_translations():
+    fr = {"a": "Bonjour", "b": "Au revoir"}
+    memory = StubMemory()
+    merged, report = _merge(fr, {"a": "Hello"}, "missing", memory)
+
+    assert merged["a"] == "Hello"
+    assert report == {"translated_count": 1, "new_count": 1, "stale_count": 0, "unchanged_count": 0}
+    assert memory.recorded[("a",)] == (hash_fr("Bonjour"), "Hello")
+
+
+def test_all_mode_skips_up_to_date_keys_only():
+    fr = {"a": "Bonjour", "b": "Merci"}
+    tgt = {"a": "Hello", "b": "Thanks"}
+    merged, report = _merge(fr, tgt, "all", StubMemory({("a",): (hash_fr("Bonjour"), "Hello")}))
+    assert merged["a"] == "Hello" and isinstance(merged["b"], _Pending)
+    assert report["unchanged_count"] == 1 and report["translated_count"] == 1 and report["stale_count"] == 0
+
+    # sans mémoire (force), tout est retraduit
+    merged, report = _merge(fr, tgt, "all", None)
+    assert all(isinstance(v, _Pending) for v in merged.values()) and report["translated_count"] == 2
@@ -0,0 +1,139 @@
+from __future__ import annotations
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import tiktoken
+
+# un encoding proche de celui de ton modèle (ici on prend cl100k_base, très courant)
+encoding = tiktoken.get_encoding("cl100k_base")
+
+MILVUS_CONTENT_MAX_BYTES = 10_000
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.?!])\s+')
+
+
+def utf8_truncate(text: str, max_bytes: int) -> str:
+    if not isinstance(text, str):
+        text = str(text) if text is not None else ""
+    b = text.encode("utf-8")
+    if len(b) <= max_bytes:
+        return text
+    b = b[:max_bytes]
+    while b and (b[-1] & 0xC0) == 0x80:
+        b = b[:-1]
+    return b.decode("utf-8", "ignore")
+
+
+class Chunker:
+    """
+    Découpage en chunks de max_tokens avec overlap, par phrases.
+    Chaque phrase est encodée une seule fois : l'overlap et le total courant
+    utilisent les nombres de tokens déjà calculés. Une phrase plus longue que
+    max_tokens est coupée sur des frontières de tokens, et chaque chunk est
+    borné à max_bytes (limite VARCHAR de `content` dans Milvus).
+    """
+    def __init__(self, max_tokens: int = 500, overlap: int = 100, max_bytes: int = MILVUS_CONTENT_MAX_BYTES):
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.max_bytes = max_bytes
+
+    def sentences(self, text: str) -> List[Tuple[str, int]]:
+        """Phrases (ou morceaux de phrase) avec leur nombre de tokens."""
+        units: List[Tuple[str, int]] = []
+        for sentence in _SENTENCE_SPLIT.split((text or "").strip()):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            tokens = encoding.encode(sentence)
+            if len(tokens) <= self.max_tokens:
+                units.append((sentence, len(tokens)))
+                continue
+            # phrase trop longue : coupe tous les max_tokens tokens, aux offsets caractère du décodage
+            _, offsets = encoding.decode_with_offsets(tokens)
+            for start in range(0, len(tokens), self.max_tokens):
+                end = start + self.max_tokens
+                piece = sentence[offsets[start]:offsets[end] if end < len(tokens) else len(sentence)].strip()
+                if piece:
+                    units.append((piece, min(end, len(tokens)) - start))
+        return units
+
+    def split(self, text: str) -> List[str]:
+        chunks: List[str] = []
+        current: List[Tuple[str, int]] = []
+        current_tokens = 0
+
+        for sentence, token_count in self.sentences(text):
+            # Si ajout de cette phrase dépasse max_tokens
+            if current_tokens + token_count > self.max_tokens:
+                self._emit(chunks, current)
+                # Overlap : on garde les dernières phrases
+                overlap_tokens = 0
+                keep = 0
+                for _, s_tokens in reversed(current):
+                    if overlap_tokens + s_tokens <= self.overlap:
+                        overlap_tokens += s_tokens
+                        keep += 1
+                    else:
+                        break
+                current = current[len(current) - keep:] if keep else []
+                current_tokens = overlap_tokens
+
+            current.append((sentence, token_count))
+            current_tokens += token_count
+
+        # Ajouter le dernier chunk
+        self._emit(chunks, current)
+        return chunks
+
+    def _emit(self, chunks: List[str], current: List[Tuple[str, int]]) -> None:
+        chunk_text = " ".join(s for s, _ in current).strip()
+        if chunk_text:
+            chunks.append(utf8_truncate(chunk_text, self.max_bytes))
+
+
+_default = Chunker()
+
+def split_text(text: str, max_tokens: int = 500, overlap: int = 100) -> List[str]:
+    chunker = _default if (max_tokens, overlap) == (_default.max_tokens, _default.overlap) else Chunker(max_tokens, overlap)
+    return chunker.split(text)
+
+
+def _split_worker(args: Tuple[str, int, int]) -> List[str]:
+    text, max_tokens, overlap = args
+    return split_text(text, max_tokens, overlap)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool(processes: int) -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn : pas de fork d'un process qui a déjà des threads (uvicorn, pipeline)
+                _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def chunk_many(
+    texts: Sequence[str],
+    max_tokens: int = 500,
+    overlap: int = 100,
+    processes: int = 0,
+    min_parallel: int = 16,
+) -> List[List[str]]:
+    """Découpe plusieurs documents ; dans un pool de processes si processes > 0 et le lot est assez gros."""
+    if processes <= 0 or len(texts) < min_parallel:
+        return [split_text(t, max_tokens, overlap) for t in texts]
+    chunksize = max(1, len(texts) // (processes * 4))
+    return list(_get_pool(processes).map(_split_worker, [(t, max_tokens, overlap) for t in texts], chunksize=chunksize))
+
+def shutdown_chunker_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
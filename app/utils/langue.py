@@ -1,6 +1,7 @@
 from __future__ import annotations
 from typing import Tuple, Dict
 import re
+from dataclasses import dataclass
 from langid.langid import LanguageIdentifier, model
 from typing import Optional
 import os
@@ -11,6 +12,10 @@ try:
 except Exception:
     translate = None
 
+from app.base.clients import get_clients
+from app.core import settings
+from app.utils.translation_cache import SqliteTranslationTier, TranslationCache
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -39,7 +44,9 @@ def _rank_probs(text: str) -> Dict[str, float]:
     return out
 
 def detect_dominant_lang(text: str) -> Tuple[str, float]:
-    probs = _rank_probs(text)  
+    return _dominant(text, _rank_probs(text))
+
+def _dominant(text: str, probs: Dict[str, float]) -> Tuple[str, float]:
     if not any(probs.values()):
         return ("und", 0.0)
     lang = max(probs.items(), key=lambda kv: kv[1])[0]
@@ -55,12 +62,14 @@ def detect_lang_distribution(text: str) -> Dict[str, float]:
 
 # def should_translate_to_fr(lang: str, conf: float, text: str) -> bool:
 def should_translate_to_fr(text: str) -> bool:
+    return _mg_in_top2(text, detect_lang_distribution(text))
+
+def _mg_in_top2(text: str, probs: Dict[str, float]) -> bool:
     t = _normalize_text(text)
     if not t or len(t) < 8:
         return False
 
     # if rang 'mg' is 0 or 1
-    probs = detect_lang_distribution(text) 
     ranking = sorted(probs.items(), key=lambda kv: kv[1], reverse=True)
     mg_rank = next((i for i, (k, _) in enumerate(ranking) if k == 'mg'), None)
     return mg_rank is not None and mg_rank <= 1
@@ -68,29 +77,84 @@ def should_translate_to_fr(text: str) -> bool:
     # # 0.70 à 0.80
     # return bool(t and len(t) >= 8 and lang == "mg" and conf >= 0.70)
 
+@dataclass(frozen=True)
+class LangInfo:
+    """Résultat d'une seule passe langid : langue dominante + besoin de traduction MG->FR."""
+    lang: str
+    conf: float
+    translate_to_fr: bool
+
+    @property
+    def answer_lang(self) -> str:
+        return self.lang if self.lang != "und" else "fr"
+
+def detect_lang(text: str) -> LangInfo:
+    probs = _rank_probs(text)
+    lang, conf = _dominant(text, probs)
+    return LangInfo(lang, conf, _mg_in_top2(text, probs))
+
+
 def translate_to_fr_if_malagasy(text: str, project_id: Optional[str] = os.getenv("GCP_PROJECT_ID")) -> str:
     should_translate = should_translate_to_fr(text)
 
     if not should_translate:
         return text
 
+    return translate_mg_to_fr(text, project_id)
+
+# questions MG déjà traduites (équipes terrain : mêmes questions très fréquentes)
+translation_cache = TranslationCache(
+    max_entries=settings.translation_cache_max_entries,
+    ttl_seconds=settings.translation_cache_ttl_seconds,
+    disk=SqliteTranslationTier(settings.translation_cache_path) if settings.translation_cache_path else None,
+)
+
+def _first_translation(resp, text: str) -> str:
+    for tr in resp.translations:
+        if tr.translated_text:
+            return tr.translated_text
+    return text
+
+def translate_mg_to_fr(text: str, project_id: Optional[str] = os.getenv("GCP_PROJECT_ID")) -> str:
+    """Traduction MG->FR sans re-détection de langue (l'appelant a déjà décidé)."""
+    if not translate:
+        return text
+
+    if not project_id:
+        return text
+
+    def _call(t: str) -> str:
+        logger.info("Traduction MG->FR")
+        client = get_clients().translate()
+        parent = f"projects/{project_id}/locations/global"
+        resp = client.translate_text(
+            contents=[t],
+            target_language_code="fr",
+            source_language_code="mg",
+            parent=parent,
+            mime_type="text/plain",
+        )
+        return _first_translation(resp, t)
+
+    return translation_cache.translate(text, "mg", "fr", _call)
+
+async def atranslate_mg_to_fr(text: str, project_id: Optional[str] = os.getenv("GCP_PROJECT_ID")) -> str:
+    """Version async : cache, puis client gRPC asyncio ; les questions identiques simultanées partagent l'appel."""
     if not translate:
         return text
 
     if not project_id:
         return text
 
-    logger.info("Traduction MG->FR")
-    client = translate.TranslationServiceClient()
-    parent = f"projects/{project_id}/locations/global"
-    resp = client.translate_text(
-        contents=[text],
-        target_language_code="fr",
-        source_language_code="mg",
-        parent=parent,
-        mime_type="text/plain",
-    )
-    for tr in resp.translations:
-        if tr.translated_text:
-            return tr.translated_text
-    return text
\ No newline at end of file
+    async def _call(t: str) -> str:
+        logger.info("Traduction MG->FR")
+        resp = await get_clients().translate_async().translate_text(
+            contents=[t],
+            target_language_code="fr",
+            source_language_code="mg",
+            parent=f"projects/{project_id}/locations/global",
+            mime_type="text/plain",
+        )
+        return _first_translation(resp, t)
+
+    return await translation_cache.atranslate(text, "mg", "fr", _call)
\ No newline at end of file
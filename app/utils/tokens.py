@@ -1,5 +1,8 @@
+import hashlib
 import math
-from typing import Dict, Any, List
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
 #  ~1 token ≈ 4 caractères 
 def _count_text_tokens(txt: str) -> int:
@@ -18,3 +21,93 @@ def count_message_tokens(msg: Dict[str, Any]) -> int:
 
 def count_contents_tokens(contents: List[Dict[str, Any]]) -> int:
     return sum(count_message_tokens(m) for m in contents)
+
+
+class TokenCounter:
+    """
+    Compteur de tokens avec cache par texte (sha1 -> estimation) : un message
+    de l'historique n'est compté qu'une fois, quel que soit le nombre de
+    requêtes qui le renvoient. `ratio` corrige l'heuristique chars/4 ; il est
+    mis à jour par calibrate() à partir des comptes exacts du modèle.
+    """
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.ratio = 1.0
+        self._lock = threading.Lock()
+        self._estimates: "OrderedDict[str, int]" = OrderedDict()
+        self._exact: Dict[str, int] = {}
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def estimate(self, text: str) -> int:
+        if not text:
+            return 0
+        key = self._key(text)
+        with self._lock:
+            cached = self._estimates.get(key)
+            if cached is not None:
+                self._estimates.move_to_end(key)
+                return cached
+        value = _count_text_tokens(text)
+        with self._lock:
+            self._estimates[key] = value
+            while len(self._estimates) > self.max_entries:
+                self._estimates.popitem(last=False)
+        return value
+
+    def count_text(self, text: str) -> int:
+        return math.ceil(self.estimate(text) * self.ratio)
+
+    def count_message(self, msg: Dict[str, Any]) -> int:
+        return sum(self.count_text(str(p.get("text", ""))) for p in (msg.get("parts") or [])) + 3
+
+    def calibrate(self, texts: Iterable[str], exact_count: Callable[[str], int]) -> float:
+        """
+        Ajuste `ratio` = tokens exacts / estimation sur un échantillon de textes.
+        exact_count (ex. models.count_tokens de Gemini) n'est appelé qu'une fois par texte.
+        """
+        exact_total, estimate_total = 0, 0
+        for text in texts:
+            if not text:
+                continue
+            key = self._key(text)
+            with self._lock:
+                exact = self._exact.get(key)
+            if exact is None:
+                exact = int(exact_count(text))
+                with self._lock:
+                    self._exact[key] = exact
+                    if len(self._exact) > self.max_entries:
+                        self._exact.pop(next(iter(self._exact)))
+            exact_total += exact
+            estimate_total += self.estimate(text)
+        if exact_total and estimate_total:
+            with self._lock:
+                self.ratio = exact_total / estimate_total
+        return self.ratio
+
+
+token_counter = TokenCounter()
+
+
+def prune_by_tokens(
+    contents: List[Dict[str, Any]],
+    max_tokens_ctx: Optional[int],
+    *,
+    garde_last_n: int = 2,
+    counter: Optional[TokenCounter] = None,
+) -> List[Dict[str, Any]]:
+    """Retire les plus anciens messages jusqu'à tenir dans max_tokens_ctx (garde toujours les garde_last_n derniers). O(n)."""
+    if not max_tokens_ctx:
+        return contents
+    counter = counter or token_counter
+    sizes = [counter.count_message(m) for m in contents]
+    total = sum(sizes)
+    removable = len(contents) - min(len(contents), garde_last_n)
+    start = 0
+    while start < removable and total > max_tokens_ctx:
+        total -= sizes[start]
+        start += 1
+    return contents[start:] if start else contents
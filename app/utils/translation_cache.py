@@ -0,0 +1,225 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+CacheKey = Tuple[str, str, str]  # (langue source, langue cible, texte normalisé)
+
+
+def normalize_source(text: str) -> str:
+    """Même règle que normalize_query (app/agents/embedding_cache.py), sans importer app.agents (import circulaire via langue)."""
+    t = unicodedata.normalize("NFKC", text or "")
+    t = t.replace("’", "'").replace("\u200b", "")
+    return " ".join(t.split()).casefold()
+
+
+class SqliteTranslationTier:
+    """Tier disque optionnel : traductions conservées entre redémarrages."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " key TEXT PRIMARY KEY, translated TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS translations_created ON translations(created_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def _digest(key: CacheKey) -> str:
+        return hashlib.sha1("\x1f".join(key).encode("utf-8")).hexdigest()
+
+    def get(self, key: CacheKey, ttl_seconds: Optional[float]) -> Optional[Tuple[str, float]]:
+        """(traduction, created_at) : l'âge de la ligne suit la traduction dans le tier mémoire."""
+        digest = self._digest(key)
+        with self._lock:
+            row = self._conn.execute("SELECT translated, created_at FROM translations WHERE key = ?", (digest,)).fetchone()
+            if row is None:
+                return None
+            translated, created_at = row
+            if ttl_seconds and time.time() - created_at > ttl_seconds:
+                self._conn.execute("DELETE FROM translations WHERE key = ?", (digest,))
+                self._conn.commit()
+                return None
+        return translated, created_at
+
+    def put(self, key: CacheKey, translated: str, max_entries: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations(key, translated, created_at) VALUES (?, ?, ?)",
+                (self._digest(key), translated, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM translations WHERE key IN ("
+                " SELECT key FROM translations ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM translations")
+            self._conn.commit()
+
+
+class TranslationCache:
+    """
+    Cache des traductions de questions, clé (source, cible, texte normalisé).
+    - tier mémoire LRU borné avec TTL, tier sqlite optionnel
+    - atranslate() regroupe les appels concurrents sur la même question :
+      un seul aller-retour Translate, les autres attendent son résultat
+    """
+    def __init__(
+        self,
+        max_entries: int = 5000,
+        ttl_seconds: Optional[float] = 30 * 86400,
+        disk: Optional[SqliteTranslationTier] = None,
+        disk_max_entries: int = 100_000,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk = disk
+        self.disk_max_entries = disk_max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(text: str, source: str, target: str) -> CacheKey:
+        return (source or "", target or "", normalize_source(text))
+
+    def _put_memory(self, key: CacheKey, translated: str, created_at: float) -> None:
+        self._entries[key] = (created_at, translated)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _get_memory(self, key: CacheKey) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, translated = entry
+                if not (self.ttl_seconds and time.time() - created_at > self.ttl_seconds):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return translated
+                del self._entries[key]
+        return None
+
+    def _get_disk(self, key: CacheKey) -> Optional[str]:
+        if self.disk is None:
+            return None
+        row = self.disk.get(key, self.ttl_seconds)
+        if row is None:
+            return None
+        translated, created_at = row
+        with self._lock:
+            self.disk_hits += 1
+            # date d'origine conservée : un passage par le disque ne prolonge pas le TTL
+            self._put_memory(key, translated, created_at)
+        return translated
+
+    def _get(self, key: CacheKey) -> Optional[str]:
+        translated = self._get_memory(key)
+        return translated if translated is not None else self._get_disk(key)
+
+    def get(self, text: str, source: str, target: str) -> Optional[str]:
+        translated = self._get(self.make_key(text, source, target))
+        if translated is None:
+            with self._lock:
+                self.misses += 1
+        return translated
+
+    def _put_disk(self, key: CacheKey, translated: str) -> None:
+        if self.disk is not None:
+            self.disk.put(key, translated, self.disk_max_entries)
+
+    def put(self, text: str, source: str, target: str, translated: str) -> None:
+        key = self.make_key(text, source, target)
+        with self._lock:
+            self._put_memory(key, translated, time.time())
+        self._put_disk(key, translated)
+
+    def translate(self, text: str, source: str, target: str, compute: Callable[[str], str]) -> str:
+        cached = self.get(text, source, target)
+        if cached is not None:
+            return cached
+        translated = compute(text)
+        self.put(text, source, target, translated)
+        return translated
+
+    async def atranslate(self, text: str, source: str, target: str, compute: Callable[[str], Awaitable[str]]) -> str:
+        """Comme translate ; le tier sqlite est lu et écrit dans un thread pour ne pas bloquer la boucle."""
+        key = self.make_key(text, source, target)
+        cached = self._get_memory(key)
+        if cached is not None:
+            return cached
+        pending = self._inflight.get(key)
+        if pending is not None:
+            with self._lock:
+                self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # requête d'origine annulée (client déconnecté) : on traduit nous-mêmes
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            translated = await asyncio.to_thread(self._get_disk, key) if self.disk is not None else None
+            if translated is None:
+                with self._lock:
+                    self.misses += 1
+                translated = await compute(text)
+                with self._lock:
+                    self._put_memory(key, translated, time.time())
+                if self.disk is not None:
+                    await asyncio.to_thread(self._put_disk, key, translated)
+            future.set_result(translated)
+            return translated
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # les appelants regroupés reçoivent l'erreur ; on évite "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "disk": self.disk.path if self.disk is not None else None,
+            }
@@ -0,0 +1,81 @@
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+KeyPath = Tuple[Any, ...]
+
+
+def encode_path(path: Sequence[Any]) -> str:
+    return json.dumps(list(path), ensure_ascii=False)
+
+
+class TranslationMemory:
+    """
+    Mémoire de traduction i18n (sqlite) : pour chaque (namespace, chemin de clé, cible),
+    le hash de la source FR traduite (hash_fr) et la traduction produite.
+    Permet de ne retraduire que les clés nouvelles ou dont le FR a changé.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translation_memory ("
+            " namespace TEXT NOT NULL, key_path TEXT NOT NULL, target TEXT NOT NULL,"
+            " source_hash TEXT NOT NULL, translation TEXT NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key_path, target))"
+        )
+        self._conn.commit()
+
+    def load(self, namespace: str, target: str) -> Dict[str, Tuple[str, Any]]:
+        """{chemin encodé: (hash source, traduction)} d'un fichier cible."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key_path, source_hash, translation FROM translation_memory WHERE namespace = ? AND target = ?",
+                (namespace, target),
+            ).fetchall()
+        return {key: (source_hash, json.loads(translation)) for key, source_hash, translation in rows}
+
+    def save(self, namespace: str, target: str, entries: List[Tuple[str, str, Any]]) -> None:
+        """entries : (chemin encodé, hash source, traduction)."""
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO translation_memory(namespace, key_path, target, source_hash, translation, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(namespace, key, target, h, json.dumps(value, ensure_ascii=False), now) for key, h, value in entries],
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class NamespaceMemory:
+    """Vue d'un (namespace, cible) pendant un run : lectures en mémoire, écritures regroupées."""
+    def __init__(self, memory: Optional[TranslationMemory], namespace: str, target: str, load: bool = True):
+        self.memory = memory
+        self.namespace = namespace
+        self.target = target
+        # load=False : entrées ignorées (retraduction forcée), la mémoire est tout de même réécrite
+        self.entries = memory.load(namespace, target) if memory is not None and load else {}
+        self.updates: List[Tuple[str, str, Any]] = []
+
+    def get(self, path: KeyPath) -> Optional[Tuple[str, Any]]:
+        return self.entries.get(encode_path(path))
+
+    def record(self, path: KeyPath, source_hash: str, value: Any) -> None:
+        self.updates.append((encode_path(path), source_hash, value))
+
+    def flush(self, resolve) -> None:
+        """Écrit les entrées du run, `resolve` remplace les traductions en attente par leur texte."""
+        if self.memory is not None:
+            self.memory.save(self.namespace, self.target, [(k, h, resolve(v)) for k, h, v in self.updates])
+        self.updates = []
@@ -1,9 +1,10 @@
 from __future__ import annotations
 import hashlib
-import tiktoken
 import re
 from typing import Any, Dict, Iterable, List
 
+from app.utils.chunker import encoding, split_text, utf8_truncate
+
 
 def clean_string_list(l):
     if isinstance(l, list):
@@ -25,54 +26,9 @@ def clean_milvus_results(raw_results: list) -> list:
                     print("Erreur lors du nettoyage d'un item Milvus:", e)
         return cleaned
 
-# un encoding proche de celui de ton modèle (ici on prend cl100k_base, très courant)
-encoding = tiktoken.get_encoding("cl100k_base")
-
 def split_into_chunks(text, max_tokens=500, overlap=100):
-    # Étape 1 : découper en phrases
-    sentences = re.split(r'(?<=[.?!])\s+', text.strip())
-    
-    chunks = []
-    current_chunk = []
-    current_tokens = 0
-
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-        token_count = len(encoding.encode(sentence))
-
-        # Si ajout de cette phrase dépasse max_tokens
-        if current_tokens + token_count > max_tokens:
-            chunk_text = " ".join(current_chunk).strip()
-            if chunk_text:
-                chunks.append(chunk_text)
-            
-            # Overlap : on garde les dernières phrases
-            overlap_tokens = 0
-            overlap_chunk = []
-            for s in reversed(current_chunk):
-                s_tokens = len(encoding.encode(s))
-                if overlap_tokens + s_tokens <= overlap:
-                    overlap_chunk.insert(0, s)
-                    overlap_tokens += s_tokens
-                else:
-                    break
-            
-            current_chunk = overlap_chunk.copy()
-            current_tokens = sum(len(encoding.encode(s)) for s in current_chunk)
-
-        # Ajouter la phrase en cours
-        current_chunk.append(sentence)
-        current_tokens += token_count
-
-    # Ajouter le dernier chunk
-    if current_chunk:
-        chunk_text = " ".join(current_chunk).strip()
-        if chunk_text:
-            chunks.append(chunk_text)
-
-    return chunks
+    # chaque phrase n'est encodée qu'une fois, voir app/utils/chunker.py
+    return split_text(text, max_tokens, overlap)
 
 
 
@@ -82,19 +38,6 @@ def md5_hex(parts: Iterable[str]) -> str:
         m.update(p.encode("utf-8"))
     return m.hexdigest()
 
-def utf8_truncate(text: str, max_bytes: int) -> str:
-        if not isinstance(text, str):
-            text = str(text) if text is not None else ""
-        b = text.encode("utf-8")
-        if len(b) <= max_bytes:
-            return text
-        b = b[:max_bytes]
-        while b and (b[-1] & 0xC0) == 0x80:  
-            b = b[:-1]
-        return b.decode("utf-8", "ignore")
-    
-
-
 def _item_url(it):
     if isinstance(it, dict):
         return it.get("url")
@@ -145,3 +88,60 @@ def group_training_metadata(search_results: List[Dict[str, Any]], limit_per_medi
             m["videos"] = m["videos"][:limit_per_media]
 
     return metas
+
+def group_search_sources(search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Une source par doc_id (meilleur score), sans le contenu des chunks."""
+    grouped: Dict[str, Dict[str, Any]] = {}
+    for hit in search_results or []:
+        doc_id = hit.get("doc_id")
+        if not doc_id or doc_id in grouped:
+            continue
+        grouped[doc_id] = {
+            "doc_id": doc_id,
+            "nom": hit.get("nom"),
+            "emplacement": hit.get("emplacement"),
+            "score": hit.get("score"),
+        }
+    return list(grouped.values())
+
+def rrf_fuse(result_lists: Iterable[List[Dict[str, Any]]], k: int = 60, limit: int | None = None, key: str = "id") -> List[Dict[str, Any]]:
+    """
+    Reciprocal-rank fusion : score(d) = somme sur les listes de 1 / (k + rang).
+    Un chunk présent dans plusieurs listes garde la version de meilleur score Milvus ;
+    le score fusionné est ajouté dans `rrf_score`.
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results or [], start=1):
+            ident = hit.get(key)
+            entry = fused.get(ident)
+            if entry is None:
+                entry = fused[ident] = {"hit": hit, "rrf": 0.0}
+            elif (hit.get("score") or 0) > (entry["hit"].get("score") or 0):
+                entry["hit"] = hit
+            entry["rrf"] += 1.0 / (k + rank)
+    ranked = sorted(fused.values(), key=lambda e: e["rrf"], reverse=True)
+    if limit is not None:
+        ranked = ranked[:limit]
+    return [{**e["hit"], "rrf_score": round(e["rrf"], 6)} for e in ranked]
+
+def citation_coverage(text: str, search_results: List[Dict[str, Any]]) -> float:
+    """
+    Part des documents récupérés (un par doc_id) cités dans la réponse :
+    un document est cité si son doc_id, son nom ou un de ses emplacements apparaît dans le texte.
+    """
+    haystack = " ".join((text or "").split()).casefold()
+    sources = group_search_sources(search_results)
+    if not sources:
+        return 0.0
+    cited = 0
+    for src in sources:
+        emplacement = src.get("emplacement") or []
+        if isinstance(emplacement, str):
+            emplacement = [emplacement]
+        needles = [src.get("doc_id"), src.get("nom"), *emplacement]
+        needles = [" ".join(str(n).split()).casefold() for n in needles if n]
+        # noms trop courts : coïncidence plutôt que citation
+        if any(len(n) >= 4 and n in haystack for n in needles):
+            cited += 1
+    return cited / len(sources)